@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Analysis of a sweep of hybrid MPI x OpenMP configurations of an
+# application. The runtime and CPU, MPI and I/O times of the runs are placed
+# on a grid of process counts by thread counts, with one layer per time, and
+# the configurations which were not run are interpolated. All of the analysis
+# is done on the whole grid at once
+#
+import argparse
+import json
+import numpy as np
+from profile_session import ProfileSession
+from map_json_common import load_profile
+from plot_data_common import *
+from scaling_models import timeNames, get_profile_times, \
+        get_parallel_efficiency, get_karp_flatt
+
+optimalFields = ["nodes", "processes", "threads", "cores", "runtime",
+        "efficiency", "measured"]
+
+def read_hybrid_runs(fileList, loadFunc=load_profile):
+    """
+    Reads the configuration and times of each run of a sweep
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP or Performance
+            Reports profiles
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of tuples (number of processes, number of threads, number of
+        nodes, list of the times in seconds in the order of timeNames)
+    """
+    return [get_profile_times(loadFunc(filename)) for filename in fileList]
+#### End of function read_hybrid_runs
+
+def build_grid(runs):
+    """
+    Places the times of the runs on a grid of process counts by thread counts.
+    Repeated runs of a configuration are averaged
+
+    Args:
+        runs (list): List of tuples as returned by read_hybrid_runs
+
+    Returns:
+        Tuple of (NumPy array of the process counts, NumPy array of the
+        thread counts, 3-D NumPy array of the times indexed by [time,
+        processes, threads] with NaN for the configurations not run, 2-D
+        boolean NumPy array of the configurations which were run)
+    """
+    procs = np.array([run[0] for run in runs])
+    threads = np.array([run[1] for run in runs])
+    times = np.array([run[3] for run in runs], dtype=np.float64)
+    procsAxis, procInds = np.unique(procs, return_inverse=True)
+    threadsAxis, threadInds = np.unique(threads, return_inverse=True)
+
+    shape = (len(procsAxis), len(threadsAxis))
+    sums = np.zeros((len(timeNames),) + shape)
+    counts = np.zeros(shape)
+    for timeInd in range(len(timeNames)):
+        np.add.at(sums[timeInd], (procInds, threadInds), times[:, timeInd])
+    np.add.at(counts, (procInds, threadInds), 1)
+    measured = counts > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grid = np.where(measured, sums / counts, np.nan)
+    return procsAxis, threadsAxis, grid, measured
+#### End of function build_grid
+
+def __neighbour_mean(values):
+    """
+    Returns the mean of the neighbours of each cell along both axes of the
+    last two dimensions of the array passed in
+    """
+    sums = np.zeros_like(values)
+    counts = np.zeros(values.shape[-2:])
+    sums[..., 1:, :] += values[..., :-1, :]
+    counts[1:, :] += 1
+    sums[..., :-1, :] += values[..., 1:, :]
+    counts[:-1, :] += 1
+    sums[..., :, 1:] += values[..., :, :-1]
+    counts[:, 1:] += 1
+    sums[..., :, :-1] += values[..., :, 1:]
+    counts[:, :-1] += 1
+    return sums / np.maximum(counts, 1)
+#### End of function __neighbour_mean
+
+def fill_grid(procsAxis, threadsAxis, grid, measured, logScale=True,
+        maxIterations=10000, tolerance=1e-10):
+    """
+    Interpolates the configurations which were not run. A plane in the log
+    of the process and thread counts is fitted to each time by least squares,
+    and the residuals of the configurations which were run are spread over
+    the rest of the grid as the solution of Laplace's equation, so the
+    measured times are kept and missing times follow the trend of the sweep
+
+    Args:
+        procsAxis (array): Process counts of the rows of the grid
+        threadsAxis (array): Thread counts of the columns of the grid
+        grid (array): Times indexed by [time, processes, threads]
+        measured (array): Boolean array of the configurations which were run
+        logScale (bool): Indicates whether to interpolate the log of the
+            times. Times which are zero for any run are interpolated linearly
+        maxIterations (int): Maximum number of relaxation sweeps
+        tolerance (float): Largest change of a residual at which to stop
+
+    Returns:
+        3-D NumPy array of the times with every configuration filled
+    """
+    if measured.all():
+        return grid.copy()
+
+    useLog = np.zeros(grid.shape[0], dtype=bool)
+    if logScale:
+        useLog = np.all(np.where(measured, grid, 1.) > 0, axis=(1, 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.where(useLog[:, np.newaxis, np.newaxis], np.log(grid), grid)
+
+    logProcs, logThreads = np.meshgrid(np.log(procsAxis), np.log(threadsAxis),
+            indexing="ij")
+    design = np.stack([np.ones(logProcs.shape), logProcs, logThreads], axis=-1)
+    coeffs = np.linalg.lstsq(design[measured], values[:, measured].T,
+            rcond=None)[0]
+    plane = np.einsum("ijk,kc->cij", design, coeffs)
+
+    residuals = np.where(measured, values - plane, 0.)
+    for _ in range(maxIterations):
+        updated = np.where(measured, residuals, __neighbour_mean(residuals))
+        change = np.max(np.abs(updated - residuals))
+        residuals = updated
+        if change < tolerance:
+            break
+
+    filled = plane + residuals
+    filled = np.where(useLog[:, np.newaxis, np.newaxis], np.exp(filled), filled)
+    return np.where(measured, grid, filled)
+#### End of function fill_grid
+
+def get_cores_per_node(runs):
+    """
+    Gets the number of cores per node, taken as the largest number of cores
+    used per node by any of the runs
+
+    Args:
+        runs (list): List of tuples as returned by read_hybrid_runs
+
+    Returns:
+        Number of cores per node
+    """
+    return max(int(np.ceil(float(procs * threads) / max(nodes, 1))) for procs,
+            threads, nodes, _ in runs)
+#### End of function get_cores_per_node
+
+def get_optimal_configurations(procsAxis, threadsAxis, runtimes, coresPerNode,
+        allowed=None):
+    """
+    Gets the configuration with the shortest runtime for each number of nodes
+
+    Args:
+        procsAxis (array): Process counts of the rows of the grid
+        threadsAxis (array): Thread counts of the columns of the grid
+        runtimes (array): 2-D array of the runtime of each configuration
+        coresPerNode (int): Number of cores per node
+        allowed (array): Boolean array of the configurations which can be
+            chosen. Default is all of them
+
+    Returns:
+        List of tuples (number of nodes, row index, column index), sorted by
+        the number of nodes
+    """
+    cores = np.outer(procsAxis, threadsAxis)
+    nodeGrid = -(-cores // coresPerNode)
+    if allowed is None:
+        allowed = np.ones(runtimes.shape, dtype=bool)
+    nodeCounts = np.unique(nodeGrid[allowed])
+    # Runtimes of the configurations on each number of nodes, one layer each
+    candidates = np.where((nodeGrid == nodeCounts[:, np.newaxis, np.newaxis]) &
+            allowed & ~np.isnan(runtimes), runtimes, np.inf)
+    candidates = candidates.reshape(len(nodeCounts), -1)
+    bestInds = np.argmin(candidates, axis=1)
+    found = np.isfinite(candidates[np.arange(len(nodeCounts)), bestInds])
+    rows, cols = np.unravel_index(bestInds, runtimes.shape)
+    return [(int(nodes), int(row), int(col)) for nodes, row, col in
+            zip(nodeCounts[found], rows[found], cols[found])]
+#### End of function get_optimal_configurations
+
+def get_hybrid_surface(fileList, coresPerNode=None, logScale=True, weak=False,
+        measuredOnly=False, loadFunc=load_profile):
+    """
+    Analyses a sweep of hybrid configurations
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP or Performance
+            Reports profiles
+        coresPerNode (int): Number of cores per node. Default is to take it
+            from the runs
+        logScale (bool): Indicates whether to interpolate the log of the times
+        weak (bool): Indicates that the sweep is a weak scaling sweep when
+            measuring efficiency
+        measuredOnly (bool): Indicates whether to choose the optimal
+            configurations from those which were run only
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Dictionary with the process and thread counts ("processes",
+        "threads"), the filled grids of times keyed by the names in timeNames
+        ("times"), the configurations which were run ("measured"), the
+        parallel efficiency and Karp-Flatt metric of the runtime relative to
+        the configuration with the fewest cores ("efficiency", "karp_flatt"),
+        the number of cores per node ("cores_per_node") and the list of
+        dictionaries with the fields in optimalFields ("optimal")
+    """
+    runs = read_hybrid_runs(fileList, loadFunc)
+    procsAxis, threadsAxis, grid, measured = build_grid(runs)
+    filled = fill_grid(procsAxis, threadsAxis, grid, measured, logScale)
+    if coresPerNode is None:
+        coresPerNode = get_cores_per_node(runs)
+
+    cores = np.outer(procsAxis, threadsAxis)
+    runtimes = filled[timeNames.index("runtime")]
+    efficiency = get_parallel_efficiency(cores.ravel(), runtimes.ravel(),
+            weak).reshape(cores.shape)
+    karpFlatt = get_karp_flatt(cores.ravel(), runtimes.ravel()).reshape(
+            cores.shape)
+
+    optimal = []
+    for nodes, row, col in get_optimal_configurations(procsAxis, threadsAxis,
+            runtimes, coresPerNode, measured if measuredOnly else None):
+        optimal.append({"nodes" : nodes, "processes" : int(procsAxis[row]),
+            "threads" : int(threadsAxis[col]), "cores" : int(cores[row, col]),
+            "runtime" : float(runtimes[row, col]),
+            "efficiency" : float(efficiency[row, col]),
+            "measured" : bool(measured[row, col])})
+
+    return {"processes" : procsAxis.tolist(), "threads" : threadsAxis.tolist(),
+            "times" : dict((name, filled[ind]) for ind, name in
+                enumerate(timeNames)),
+            "measured" : measured, "efficiency" : efficiency,
+            "karp_flatt" : karpFlatt, "cores_per_node" : coresPerNode,
+            "optimal" : optimal}
+#### End of function get_hybrid_surface
+
+def __grid_rows(surface, values, fmt):
+    """
+    Returns the rows of a table of a grid, with the configurations which were
+    interpolated marked by '*'
+    """
+    rows = []
+    for row, procs in enumerate(surface["processes"]):
+        tableRow = {"processes" : str(procs)}
+        for col, threads in enumerate(surface["threads"]):
+            value = values[row, col]
+            tableRow[str(threads)] = "-" if np.isnan(value) else fmt % value + \
+                    ("" if surface["measured"][row, col] else "*")
+        rows.append(tableRow)
+    return rows
+#### End of function __grid_rows
+
+def plot_surface(surface):
+    """
+    Plots heatmaps of the runtime and parallel efficiency of each
+    configuration, with the configurations which were run marked
+
+    Args:
+        surface (dict): Dictionary as returned by get_hybrid_surface
+
+    Returns:
+        Nothing
+    """
+    import matplotlib.pyplot as plt
+
+    procInds, threadInds = np.nonzero(surface["measured"])
+    for plotInd, (title, values) in enumerate([("Run time (s)",
+        surface["times"]["runtime"]), ("Parallel efficiency",
+            surface["efficiency"])]):
+        ax = plt.subplot(1, 2, plotInd + 1)
+        image = ax.imshow(values, origin="lower", aspect="auto",
+                interpolation="nearest")
+        plt.colorbar(image, ax=ax)
+        ax.plot(threadInds, procInds, 'kx', label="measured")
+        ax.set_xticks(range(len(surface["threads"])))
+        ax.set_xticklabels(surface["threads"])
+        ax.set_yticks(range(len(surface["processes"])))
+        ax.set_yticklabels(surface["processes"])
+        ax.set_xlabel("Number of Threads")
+        ax.set_ylabel("Number of Processes")
+        ax.set_title(title)
+#### End of function plot_surface
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Analyses a sweep of hybrid" +
+            " MPI x OpenMP configurations of an application, given as JSON" +
+            " format MAP or Performance Reports files. The runtime and CPU," +
+            " MPI and I/O times are placed on a grid of process counts by" +
+            " thread counts, the configurations which were not run are" +
+            " interpolated, and the fastest configuration for each number of" +
+            " nodes is reported. Interpolated values are marked by '*'")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " or Performance Reports files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--coresPerNode", help="Number of cores per node." +
+            " Default is the largest number of cores per node used by a run",
+            type=int, default=None)
+    parser.add_argument("--linear", help="Interpolate the times rather than" +
+            " the log of the times", action="store_true")
+    parser.add_argument("--weak", help="Treat the sweep as weak scaling when" +
+            " measuring efficiency", action="store_true")
+    parser.add_argument("--measuredOnly", help="Only choose the optimal" +
+            " configurations from those which were run", action="store_true")
+    parser.add_argument("--times", help="Times of which to show the grid." +
+            " Default is the runtime", choices=timeNames, nargs="+",
+            default=["runtime"])
+    outGroup = parser.add_mutually_exclusive_group()
+    outGroup.add_argument("--json", help="Write the grids and the optimal" +
+            " configurations in JSON format", action="store_true")
+    outGroup.add_argument("--plot", help="Plot heatmaps of the runtime and" +
+            " the efficiency", action="store_true")
+    add_emit_data_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+
+    if session is None:
+        session = ProfileSession()
+    surface = get_hybrid_surface(fileList, args.coresPerNode, not args.linear,
+            args.weak, args.measuredOnly, session.load)
+
+    if args.emitData:
+        # One series over the process counts for each thread count
+        seriesList = []
+        for name, values in [(name, surface["times"][name]) for name in
+                args.times] + [("efficiency", surface["efficiency"])]:
+            seriesList.extend([(name + " threads=" + str(threads),
+                surface["processes"], values[:, col].tolist()) for col, threads
+                in enumerate(surface["threads"])])
+        emit_plot_data(seriesList, args.emitData)
+        return
+
+    if args.json:
+        grids = ["efficiency", "karp_flatt", "measured"]
+        output = dict((key, value) for key, value in surface.items() if key not
+                in grids + ["times"])
+        output["times"] = dict((name, values.tolist()) for name, values in
+                surface["times"].items())
+        for key in grids:
+            output[key] = np.where(np.isnan(surface[key]), None,
+                    surface[key]).tolist() if key != "measured" else \
+                            surface[key].tolist()
+        print(json.dumps(output, indent=4))
+        return
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        plot_surface(surface)
+        plt.show()
+        return
+
+    columns = ["processes"] + [str(threads) for threads in surface["threads"]]
+    for name in args.times:
+        print(name + " (s), processes x threads:")
+        print_table(__grid_rows(surface, surface["times"][name], "%.4g"),
+                columns)
+        print("")
+    print("efficiency, processes x threads:")
+    print_table(__grid_rows(surface, surface["efficiency"], "%.3f"), columns)
+    print("")
+    print("optimal configurations (" + str(surface["cores_per_node"]) +
+            " cores per node):")
+    print_table(surface["optimal"], optimalFields)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import json
+import sys
+
+def load_json_file(filename):
+    """
+    Reads the JSON file with the given name into a dictionary. This is the
+    loader of both the Performance Reports and the MAP scripts, the latter
+    reading it through map_json_common.load_profile
+
+    Args:
+        filename (str): Name of the JSON file to read
+
+    Returns:
+        The dictionary (or value) stored in the JSON file
+    """
+    with open(filename, 'r') as f:
+        return json.load(f)
+#### End of function load_json_file
+
 def get_dict_field_val(inDict, fields):
     """
     Gets the value of the field given by the ordered list of field keys passed
@@ -39,7 +58,7 @@ def get_dict_field_val(inDict, fields):
             tried += str(field) + ", "
             outVal = outVal[field]
         except KeyError:
-            print("Field '" + tried + "' not found")
+            print("Field '" + tried + "' not found", file=sys.stderr)
             return None
     return outVal
 #### End of function get_dict_field_val
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import csv
+import json
+import sys
+
+emitFormats = ["json", "csv"]
+
+def add_emit_data_argument(parser):
+    """
+    Adds the --emit-data option to the argument parser of a plotting script
+
+    Args:
+        parser (ArgumentParser): The parser to add the option to
+
+    Returns:
+        Nothing
+    """
+    parser.add_argument("--emit-data", help="Write the numbers that would be" +
+            " plotted to standard output in the given format instead of" +
+            " plotting them", choices=emitFormats, default=None,
+            dest="emitData")
+#### End of function add_emit_data_argument
+
+def emit_plot_data(seriesList, fmt, outFile=None):
+    """
+    Writes the data series that a script would plot. In JSON format a list of
+    objects with the fields "name", "x" and "y" is written. In CSV format one
+    row of (series, x, y) is written per point
+
+    Args:
+        seriesList (list): List of tuples of the form (name, xData, yData)
+        fmt (str): One of "json" or "csv"
+        outFile (file): File to write to. Default is standard output
+
+    Returns:
+        Nothing
+    """
+    assert fmt in emitFormats
+
+    if outFile is None:
+        outFile = sys.stdout
+
+    if fmt == "json":
+        json.dump([{"name" : name, "x" : list(xData), "y" : list(yData)}
+            for name, xData, yData in seriesList], outFile)
+        outFile.write("\n")
+        return
+
+    writer = csv.writer(outFile)
+    writer.writerow(["series", "x", "y"])
+    for name, xData, yData in seriesList:
+        for xVal, yVal in zip(xData, yData):
+            writer.writerow([name, xVal, yVal])
+#### End of function emit_plot_data
+
+def __format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "%.6g" % value
+    return str(value)
+#### End of function __format_value
+
+def print_table(rows, fields):
+    """
+    Prints rows of a report as an aligned table, with missing values (None)
+    shown as "-"
+
+    Args:
+        rows (list): List of dictionaries keyed by the fields
+        fields (list): Names of the fields to print, one per column
+
+    Returns:
+        Nothing
+    """
+    fieldWidths = [max([len(field)] + [len(__format_value(row[field]))
+        for row in rows]) for field in fields]
+    print("  ".join(field.ljust(width) for field, width in
+        zip(fields, fieldWidths)).rstrip())
+    for row in rows:
+        print("  ".join(__format_value(row[field]).ljust(width) for field, width
+            in zip(fields, fieldWidths)).rstrip())
+#### End of function print_table
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import importlib
+from collections import OrderedDict
+
+# The plotting functions exposed by a session live in the MAP and Performance
+# Reports script folders, which sit next to this one
+scriptRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for subDir in ["MAP_JSON_Scripts", "PR_JSON_Scripts"]:
+    subPath = os.path.normpath(os.path.join(scriptRoot, subDir))
+    if subPath not in sys.path:
+        sys.path.append(subPath)
+
+# Reads JSON files, and runs stored in profile archives
+from map_json_common import load_profile, split_archive_path
+
+# Approximate size of a boxed float held in a Python list
+floatBytes = sys.getsizeof(0.0)
+
+def get_array_bytes(item):
+    """
+    Estimates the number of bytes held in the arrays of a JSON dictionary.
+    Lists are assumed to hold floats, and NumPy arrays report their own size
+
+    Args:
+        item: Value from a JSON dictionary (dict, list, array or scalar)
+
+    Returns:
+        Estimated number of bytes used by the arrays contained in the item
+    """
+    if isinstance(item, dict):
+        return sum(get_array_bytes(val) for val in item.values())
+    if isinstance(item, list):
+        if len(item) > 0 and isinstance(item[0], (dict, list)):
+            return sum(get_array_bytes(val) for val in item)
+        return sys.getsizeof(item) + len(item) * floatBytes
+    if hasattr(item, "nbytes"):
+        return item.nbytes
+    return 0
+#### End of function get_array_bytes
+
+class ProfileSession(object):
+    """
+    Keeps the JSON exports of MAP and Performance Reports profiles in memory so
+    that each file is read at most once. Profiles are evicted in least recently
+    used order once the bytes held in their arrays exceed the memory budget.
+
+    The dictionaries returned are shared between callers, and should not be
+    modified in place
+    """
+
+    def __init__(self, memoryBudget=None, loadFunc=load_profile):
+        """
+        Args:
+            memoryBudget (int): Maximum number of bytes of array data to keep
+                loaded. None indicates that nothing is evicted
+            loadFunc (function): Function used to read a profile from file.
+                The default also reads runs from profile archives, given as
+                <archive>.h5:<run id>
+        """
+        assert memoryBudget is None or memoryBudget >= 0
+        self.memoryBudget = memoryBudget
+        self.loadFunc = loadFunc
+        self.memoryUsed = 0
+        self.numLoads = 0
+        # Maps a file path to (stat key, profile dictionary, size in bytes)
+        self.__profiles = OrderedDict()
+
+    @staticmethod
+    def __get_key(filename):
+        return os.path.abspath(filename.strip())
+
+    @staticmethod
+    def __get_stat(path):
+        # A run in an archive changes when the archive does
+        archivePath = split_archive_path(path)
+        if archivePath is not None:
+            path = archivePath[0]
+        try:
+            fileStat = os.stat(path)
+        except OSError:
+            return None
+        return (fileStat.st_mtime, fileStat.st_size)
+
+    def __contains__(self, filename):
+        return self.__get_key(filename) in self.__profiles
+
+    def __len__(self):
+        return len(self.__profiles)
+
+    def load(self, filename):
+        """
+        Returns the dictionary for the given file, reading it only if it is
+        not already loaded or if the file has changed since it was read
+
+        Args:
+            filename (str): Name of a JSON export of a MAP or Performance
+                Reports profile
+
+        Returns:
+            Dictionary representing the profile
+        """
+        path = self.__get_key(filename)
+        fileStat = self.__get_stat(path)
+        entry = self.__profiles.get(path)
+        if entry is not None and (entry[0] is None or entry[0] == fileStat):
+            self.__profiles.move_to_end(path)
+            return entry[1]
+
+        profileDict = self.loadFunc(path)
+        self.numLoads += 1
+        self.__store(path, fileStat, profileDict)
+        return profileDict
+    #### End of function load
+
+    def put(self, filename, profileDict):
+        """
+        Adds a profile which has been generated in memory (for example by
+        truncating a loaded profile) under the given file name, so that later
+        calls to load do not read it back from disk
+
+        Args:
+            filename (str): Name under which to store the profile
+            profileDict (dict): Dictionary representing the profile
+        """
+        path = self.__get_key(filename)
+        self.__store(path, None, profileDict)
+    #### End of function put
+
+    def evict(self, filename):
+        """
+        Removes the profile with the given file name, if it is loaded
+
+        Args:
+            filename (str): Name of the file to remove
+        """
+        entry = self.__profiles.pop(self.__get_key(filename), None)
+        if entry is not None:
+            self.memoryUsed -= entry[2]
+    #### End of function evict
+
+    def clear(self):
+        """
+        Removes all of the loaded profiles
+        """
+        self.__profiles.clear()
+        self.memoryUsed = 0
+    #### End of function clear
+
+    def __store(self, path, fileStat, profileDict):
+        self.evict(path)
+        numBytes = get_array_bytes(profileDict)
+        self.__profiles[path] = (fileStat, profileDict, numBytes)
+        self.memoryUsed += numBytes
+        if self.memoryBudget is None:
+            return
+        # Evict the least recently used profiles, always keeping the newest
+        while self.memoryUsed > self.memoryBudget and len(self.__profiles) > 1:
+            _, oldEntry = self.__profiles.popitem(last=False)
+            self.memoryUsed -= oldEntry[2]
+
+    def call(self, moduleName, funcName, *args, **kwargs):
+        """
+        Calls a function from one of the MAP or Performance Reports scripts,
+        passing it this session to read profiles with
+
+        Args:
+            moduleName (str): Name of the script module, e.g. "plot_map_bar"
+            funcName (str): Name of a function in the module which accepts a
+                loadFunc keyword argument
+
+        Returns:
+            The value returned by the function
+        """
+        module = importlib.import_module(moduleName)
+        kwargs["loadFunc"] = self.load
+        return getattr(module, funcName)(*args, **kwargs)
+    #### End of function call
+
+    # MAP profiles
+    def get_avgs(self, fileList, metric, threads=False, indFrom=0, indTo=-1):
+        return self.call("plot_map_bar", "get_avgs", fileList, metric, threads,
+                indFrom, indTo)
+
+    def get_total(self, fileList, metric, threads=False, indFrom=0, indTo=-1):
+        return self.call("plot_map_bar", "get_total", fileList, metric, threads,
+                indFrom, indTo)
+
+    def plot_bar(self, fileList, metric, threads=False, logy=False,
+            ylabel="Proportion of Time (%)", getTotal=False, indFrom=0,
+            indTo=-1):
+        return self.call("plot_map_bar", "plot_bar", fileList, metric, threads,
+                logy, ylabel, getTotal, indFrom, indTo)
+
+    def plot_line(self, fileList, metric, threads=False, logy=False,
+            ylabel="Proportion of Time (%)", getTotal=False,
+            expectedScaling=None, indFrom=0, indTo=-1, fitModels=None):
+        return self.call("plot_map_bar", "plot_line", fileList, metric, threads,
+                logy, ylabel, getTotal, expectedScaling, indFrom, indTo,
+                fitModels)
+
+    def get_min_max(self, fileList, metric, threads=False, indFrom=0, indTo=-1):
+        return self.call("plot_map_min_max_bar", "get_min_max", fileList,
+                metric, threads, indFrom, indTo)
+
+    def get_min_max_total(self, fileList, metric, threads=False, indFrom=0,
+            indTo=-1):
+        return self.call("plot_map_min_max_bar", "get_min_max_total", fileList,
+                metric, threads, indFrom, indTo)
+
+    def plot_min_max_bar(self, fileList, metric, threads=False, logy=False,
+            ylabel="Proportion of Time (%)", getTotal=False, indFrom=0,
+            indTo=-1):
+        return self.call("plot_map_min_max_bar", "plot_min_max_bar", fileList,
+                metric, threads, logy, ylabel, getTotal, indFrom, indTo)
+
+    def read_metric_from_files(self, fileList, metricName):
+        return self.call("plot_one_metric_mult_files_axes",
+                "read_metric_from_files", fileList, metricName)
+
+    def plot_metric_from_files(self, fileList, metricName, yLabel=None,
+            setXAbsolute=False, setXAxisConstant=False,
+            setYAxisConstant=False):
+        return self.call("plot_one_metric_mult_files_axes",
+                "plot_metric_from_files", fileList, metricName, yLabel,
+                setXAbsolute, setXAxisConstant, setYAxisConstant)
+
+    def read_metric_from_file(self, infile, metricName, fieldnames=["means"]):
+        return self.call("plot_single_metric", "read_metric_from_file", infile,
+                metricName, fieldnames)
+
+    def plot_metric_from_file(self, infile, metricName, fieldnames=["means"],
+            yLabel=None, indFrom=0, indTo=-1):
+        return self.call("plot_single_metric", "plot_metric_from_file", infile,
+                metricName, fieldnames, yLabel, indFrom, indTo)
+
+    # Performance Reports profiles
+    def read_time_data_from_files(self, fileList, threads=False):
+        return self.call("plot_scaling_overall_time",
+                "read_time_data_from_files", fileList, threads)
+
+    def read_summary_data_from_files(self, fileList, threads=False):
+        return self.call("plot_scaling_components",
+                "read_summary_data_from_files", fileList, threads)
+
+    def get_all_components_from_files(self, fileList, threads=False):
+        return self.call("plot_pr_stacked_bar",
+                "get_all_components_from_files", fileList, threads)
+
+    def get_mem_use_mpi_percent(self, fileList, threads=False):
+        return self.call("pr_plot_mem_use_mpi_bar", "get_mem_use_mpi_percent",
+                fileList, threads)
+
+    def plot_pr_metrics_as_bar(self, fileList, metricList, labelList,
+            threads=False, ylabel="Proportion of Time (%)"):
+        return self.call("plot_pr_bar", "plot_metrics_as_bar", fileList,
+                metricList, labelList, threads, ylabel)
+#### End of class ProfileSession
@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Detection of regressions over a time ordered history of runs of the same
+# application. The history is kept in a catalog file holding the values of
+# each run and the state of the detectors, so that runs added later (e.g. by
+# a nightly job) are checked without going over the whole history again
+#
+import argparse
+import json
+import os
+import sys
+import warnings
+import numpy as np
+from json_dict_common import get_dict_field_val
+from profile_session import ProfileSession
+from watch_exports import get_profile_type
+from map_json_common import get_start_time, get_runtime
+from rank_metrics import get_profile_statistics
+
+# Values read from Performance Reports, as paths under the "data" section
+prValuePaths = [["overview", "cpu", "percent"], ["overview", "mpi", "percent"],
+        ["overview", "io", "percent"], ["applicationDetails", "time", "plain"]]
+# Default settings of the detectors. window is the number of previous runs
+# forming the baseline of a run, minRuns the smallest baseline with which a
+# run is checked, zThreshold the number of robust standard deviations (the
+# MAD scaled to the standard deviation of a normal distribution) from the
+# median which flags a run, minChange the smallest relative change from the
+# median which is flagged, and cusumDrift and cusumLimit the allowance and
+# decision interval of the CUSUM of the robust scores
+defaultSettings = {"window" : 30, "minRuns" : 10, "zThreshold" : 5.,
+        "minChange" : 0.02, "cusumDrift" : 1., "cusumLimit" : 6.}
+# Scale factor from the MAD to the standard deviation of a normal distribution
+madScale = 1.4826
+# Robust scores are clipped before being accumulated, so that a single
+# outlier cannot trigger the CUSUM on its own
+cusumClip = 4.
+flagFields = ["run", "time", "metric", "value", "baseline", "score", "test",
+        "direction"]
+
+def get_run_values(profileDict):
+    """
+    Gets the values tracked for a run: the runtime and the time weighted mean
+    of each metric and activity of a MAP profile, or the overview
+    percentages and runtime of a Performance Report
+
+    Args:
+        profileDict (dict): Dictionary loaded from a JSON export
+
+    Returns:
+        Dictionary of values keyed by name. The names of Performance Reports
+        values are their paths joined by "/"
+    """
+    profileType = get_profile_type(profileDict)
+    if profileType == "map":
+        names, stats = get_profile_statistics(profileDict)
+        values = dict((name, float(value)) for name, value in
+                zip(names, stats["mean"]) if not np.isnan(value))
+        values["runtime"] = float(get_runtime(profileDict))
+        return values
+    if profileType == "pr":
+        values = {}
+        for path in prValuePaths:
+            try:
+                values["/".join(path)] = float(get_dict_field_val(profileDict,
+                    ["data"] + path))
+            except (KeyError, TypeError, ValueError):
+                pass
+        return values
+    raise ValueError("Not a JSON export of a MAP or Performance Reports profile")
+#### End of function get_run_values
+
+def get_run_time(filename, profileDict):
+    """
+    Gets the time by which a run is ordered in the history: the start time of
+    a MAP profile, or the modification time of the file otherwise
+
+    Returns:
+        Number of seconds since the epoch
+    """
+    if get_profile_type(profileDict) == "map":
+        try:
+            return get_start_time(profileDict["info"])[0].timestamp()
+        except (KeyError, ValueError, AssertionError):
+            pass
+    return os.path.getmtime(filename)
+#### End of function get_run_time
+
+def get_baselines(previous, values, window):
+    """
+    Gets the robust baseline of each new run of a history from the runs
+    before it, for all of the values at once
+
+    Args:
+        previous (array): 2-D array of the values of the last runs before the
+            new ones, with one row per run and one column per value
+        values (array): 2-D array of the values of the new runs
+        window (int): Number of runs in each baseline
+
+    Returns:
+        Tuple of 2-D NumPy arrays (medians, robust standard deviations, number
+        of runs in the baseline) with a row per new run
+    """
+    numCols = values.shape[1]
+    padded = np.concatenate((np.full((window, numCols), np.nan),
+        previous[-window:] if window > 0 else previous[:0], values))
+    # The baseline of a run is the window of runs before it
+    start = padded.shape[0] - values.shape[0] - window
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window,
+            axis=0)[start:start + values.shape[0]]
+    counts = (~np.isnan(windows)).sum(axis=2)
+    with warnings.catch_warnings():
+        # Values without a baseline give all NaN windows
+        warnings.simplefilter("ignore", RuntimeWarning)
+        medians = np.nanmedian(windows, axis=2)
+        deviations = madScale * np.nanmedian(np.abs(windows -
+            medians[:, :, np.newaxis]), axis=2)
+    return medians, deviations, counts
+#### End of function get_baselines
+
+def detect_regressions(previous, values, cusumPos, cusumNeg,
+        settings=defaultSettings):
+    """
+    Checks new runs of a history against the runs before them, with a test
+    of each run against the median and MAD of its baseline, and a two sided
+    CUSUM of the robust scores to catch smaller shifts which persist. The
+    baselines of all of the new runs are found at once, and only the CUSUM
+    is stepped through the runs, for all values at once
+
+    Args:
+        previous (array): 2-D array of the values of (at least the last
+            window of) the runs before the new ones
+        values (array): 2-D array of the values of the new runs. Missing
+            values are NaN
+        cusumPos, cusumNeg (array): CUSUM of increases and of decreases of
+            each value after the previous runs. These are updated in place
+        settings (dict): Settings of the detectors (see defaultSettings)
+
+    Returns:
+        List of tuples of (new run index, value index, baseline median, robust
+        score, test, direction), where test is "mad" or "cusum" and direction
+        is "increase" or "decrease"
+    """
+    medians, deviations, counts = get_baselines(previous, values,
+            settings["window"])
+    changes = values - medians
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # The scores are in units of the noise of the baseline. Only a
+        # baseline with no spread is given the smallest change flagged as its
+        # scale, so that identical runs do not give infinite scores
+        scales = np.where(deviations > 0, deviations, settings["minChange"] *
+                np.abs(medians))
+        scores = np.where(scales > 0, changes / scales, 0.)
+        checked = (counts >= settings["minRuns"]) & ~np.isnan(values)
+        # Changes smaller than minChange are not flagged by either test
+        significant = checked & (np.abs(changes) >= settings["minChange"] *
+                np.abs(medians))
+    flagged = significant & (np.abs(scores) > settings["zThreshold"])
+
+    flags = [(run, col, medians[run, col], scores[run, col], "mad",
+        "increase" if changes[run, col] > 0 else "decrease")
+        for run, col in zip(*np.nonzero(flagged))]
+    clipped = np.where(checked, np.clip(scores, -cusumClip, cusumClip), 0.)
+    for run in range(values.shape[0]):
+        cusumPos[:] = np.maximum(0., cusumPos + clipped[run] -
+                settings["cusumDrift"])
+        cusumNeg[:] = np.maximum(0., cusumNeg - clipped[run] -
+                settings["cusumDrift"])
+        for cusum, direction in [(cusumPos, "increase"), (cusumNeg,
+                "decrease")]:
+            # Shifts already flagged by the MAD test are not flagged again.
+            # A CUSUM over the limit at a run whose change is too small to be
+            # significant waits for the next significant run
+            alarms = (cusum > settings["cusumLimit"]) & significant[run] & \
+                    ~flagged[run]
+            flags += [(run, col, medians[run, col], scores[run, col], "cusum",
+                direction) for col in np.flatnonzero(alarms)]
+            # The CUSUM starts again after an alarm
+            cusum[(cusum > settings["cusumLimit"]) & significant[run]] = 0.
+    return sorted(flags)
+#### End of function detect_regressions
+
+class RegressionHistory(object):
+    """
+    Time ordered history of the values of runs of an application, with the
+    state of the regression detectors after the last run, stored in a JSON
+    catalog file
+    """
+
+    def __init__(self, settings=None):
+        """
+        Args:
+            settings (dict): Settings of the detectors. Missing settings take
+                the values in defaultSettings
+        """
+        self.settings = dict(defaultSettings)
+        self.settings.update(settings or {})
+        self.columns = []
+        self.runs = []
+        self.values = np.zeros((0, 0))
+        self.cusumPos = np.zeros(0)
+        self.cusumNeg = np.zeros(0)
+        self.flags = []
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a history from a catalog file
+        """
+        with open(filename, "r") as catalog:
+            state = json.load(catalog)
+        history = cls(state["settings"])
+        history.columns = state["columns"]
+        history.runs = state["runs"]
+        history.values = np.array(state["values"], dtype=np.float64).reshape(
+                len(history.runs), len(history.columns))
+        history.cusumPos = np.array(state["cusum_pos"], dtype=np.float64)
+        history.cusumNeg = np.array(state["cusum_neg"], dtype=np.float64)
+        history.flags = state["flags"]
+        return history
+    #### End of function load
+
+    def save(self, filename):
+        """
+        Writes the history to a catalog file. Missing values are written as
+        null
+        """
+        state = {"settings" : self.settings, "columns" : self.columns,
+                "runs" : self.runs,
+                "values" : [[None if np.isnan(value) else value for value in
+                    row] for row in self.values.tolist()],
+                "cusum_pos" : self.cusumPos.tolist(),
+                "cusum_neg" : self.cusumNeg.tolist(), "flags" : self.flags}
+        with open(filename, "w") as catalog:
+            json.dump(state, catalog, indent=1)
+    #### End of function save
+
+    def __contains__(self, runId):
+        return any(run["id"] == runId for run in self.runs)
+
+    def add_runs(self, runs):
+        """
+        Appends runs to the history and checks them for regressions. Only
+        the new runs, and the window of runs before them, are looked at
+
+        Args:
+            runs (list): List of tuples of (run id, time, dictionary of values
+                keyed by name). Runs are added in order of time, after any
+                runs already in the history
+
+        Returns:
+            List of the flags raised for the new runs, as dictionaries with
+            the fields in flagFields
+
+        Raises:
+            ValueError: A run is older than the newest run in the history.
+                Such runs can only be placed with insert_runs
+        """
+        runs = sorted(runs, key=lambda run: run[1])
+        if len(runs) > 0 and len(self.runs) > 0 and \
+                runs[0][1] < self.runs[-1]["time"]:
+            raise ValueError("Run " + runs[0][0] + " is older than the" +
+                    " newest run in the history, " + self.runs[-1]["id"] +
+                    ", and can only be inserted when the history is rebuilt")
+        newValues = self.__get_values(runs)
+        newFlags = self.__check(self.values, newValues, runs)
+        self.values = np.concatenate((self.values, newValues))
+        self.runs += [{"id" : runId, "time" : runTime} for runId, runTime, _ in
+                runs]
+        return newFlags
+    #### End of function add_runs
+
+    def insert_runs(self, runs):
+        """
+        Inserts runs into the history in order of time, without checking
+        them. The history has to be rebuilt afterwards for the flags and the
+        state of the detectors to take the runs into account
+
+        Args:
+            runs (list): List of tuples of (run id, time, dictionary of values
+                keyed by name)
+        """
+        newValues = self.__get_values(runs)
+        allRuns = self.runs + [{"id" : runId, "time" : runTime} for runId,
+                runTime, _ in runs]
+        order = sorted(range(len(allRuns)), key=lambda ind:
+                allRuns[ind]["time"])
+        self.values = np.concatenate((self.values, newValues))[order]
+        self.runs = [allRuns[ind] for ind in order]
+    #### End of function insert_runs
+
+    def __get_values(self, runs):
+        # Adds the names of the values of runs which are new to the history
+        # as columns, and gets the values of the runs in those columns
+        for _, _, runValues in runs:
+            self.columns += sorted(name for name in runValues if name not in
+                    set(self.columns))
+        numCols = len(self.columns)
+        # Values which are new to the history have no previous runs
+        extraCols = numCols - self.values.shape[1]
+        self.values = np.concatenate((self.values, np.full((len(self.runs),
+            extraCols), np.nan)), axis=1)
+        self.cusumPos = np.concatenate((self.cusumPos, np.zeros(extraCols)))
+        self.cusumNeg = np.concatenate((self.cusumNeg, np.zeros(extraCols)))
+
+        colInds = dict((name, ind) for ind, name in enumerate(self.columns))
+        newValues = np.full((len(runs), numCols), np.nan)
+        for row, (_, _, runValues) in enumerate(runs):
+            for name, value in runValues.items():
+                newValues[row, colInds[name]] = value
+        return newValues
+    #### End of function __get_values
+
+    def rebuild(self):
+        """
+        Checks the whole history again, e.g. after the settings are changed
+
+        Returns:
+            List of all of the flags raised
+        """
+        self.cusumPos = np.zeros(len(self.columns))
+        self.cusumNeg = np.zeros(len(self.columns))
+        self.flags = []
+        runs = [(run["id"], run["time"], None) for run in self.runs]
+        return self.__check(self.values[:0], self.values, runs)
+    #### End of function rebuild
+
+    def __check(self, previous, values, runs):
+        newFlags = []
+        for run, col, baseline, score, test, direction in detect_regressions(
+                previous, values, self.cusumPos, self.cusumNeg, self.settings):
+            newFlags.append({"run" : runs[run][0], "time" : runs[run][1],
+                "metric" : self.columns[col],
+                "value" : float(values[run, col]), "baseline" : float(baseline),
+                "score" : float(score), "test" : test,
+                "direction" : direction})
+        self.flags += newFlags
+        return newFlags
+    #### End of function __check
+#### End of class RegressionHistory
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+
+    Returns:
+        1 if any of the runs added are flagged as regressions, otherwise 0
+    """
+    parser = argparse.ArgumentParser(description="Keeps a time ordered" +
+            " history of runs of an application, from JSON exports of MAP" +
+            " or Performance Reports profiles, in a catalog file, and flags" +
+            " runs whose metrics, activity or overview percentages or runtime" +
+            " differ significantly from the runs before them. Each run is" +
+            " tested against the median and MAD of a window of previous runs," +
+            " and a CUSUM catches smaller shifts which persist. Only the runs" +
+            " added are checked, and the exit status is 1 if any are flagged")
+    parser.add_argument("catalog", help="JSON file holding the history. It is" +
+            " created if it does not exist")
+    parser.add_argument("infiles", help="JSON exports of runs to add to the" +
+            " history", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    for setting, helpStr in [("window", "Number of previous runs in the" +
+                " baseline of a run"),
+            ("minRuns", "Smallest number of previous runs with which a run is" +
+                " checked"),
+            ("zThreshold", "Number of robust standard deviations from the" +
+                " median which flags a run"),
+            ("minChange", "Smallest relative change from the median which is" +
+                " flagged"),
+            ("cusumDrift", "Allowance of the CUSUM, in robust standard" +
+                " deviations"),
+            ("cusumLimit", "Value of the CUSUM which flags a run")]:
+        parser.add_argument("--" + setting, help=helpStr + ". Default is " +
+                str(defaultSettings[setting]) + ", or the value in the catalog",
+                type=type(defaultSettings[setting]), default=None)
+    parser.add_argument("--rebuild", help="Check the whole history again, e.g." +
+            " after changing the settings. Runs older than the newest run in" +
+            " the history can only be added with --rebuild, which inserts" +
+            " them in order of time", action="store_true")
+    parser.add_argument("--json", help="Write the flags in JSON format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    settings = dict((setting, getattr(args, setting)) for setting in
+            defaultSettings if getattr(args, setting) is not None)
+    if settings.get("window", 1) < 1 or settings.get("minRuns", 1) < 1:
+        parser.error("the window and the number of runs must be positive")
+
+    if os.path.isfile(args.catalog):
+        history = RegressionHistory.load(args.catalog)
+        if settings and not args.rebuild and any(history.settings[setting] !=
+                value for setting, value in settings.items()):
+            parser.error("the settings of the catalog can only be changed" +
+                    " with --rebuild")
+        history.settings.update(settings)
+    else:
+        history = RegressionHistory(settings)
+
+    if session is None:
+        session = ProfileSession()
+    runs = []
+    for filename in fileList:
+        runId = os.path.abspath(filename)
+        if runId in history or any(run[0] == runId for run in runs):
+            print("Skipping " + filename + ", which is already in the history",
+                    file=sys.stderr)
+            continue
+        profileDict = session.load(filename)
+        runs.append((runId, get_run_time(filename, profileDict),
+            get_run_values(profileDict)))
+
+    if args.rebuild:
+        history.insert_runs(runs)
+        flags = history.rebuild()
+    else:
+        try:
+            flags = history.add_runs(runs)
+        except ValueError as err:
+            parser.error(str(err))
+    history.save(args.catalog)
+
+    if args.json:
+        print(json.dumps(flags, indent=4))
+    else:
+        for flag in flags:
+            print(flag["run"] + ": " + flag["metric"] + " " +
+                    flag["direction"] + " to %.6g from a baseline of %.6g" %
+                    (flag["value"], flag["baseline"]) + " (" + flag["test"] +
+                    ", score %.3g)" % flag["score"])
+        print(str(len(runs)) + " runs added, " + str(len(flags)) +
+                " regressions flagged")
+    return 1 if len(flags) > 0 else 0
+#### End of function main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Scaling models shared by the MAP and Performance Reports scaling plots: the
+# ideal scaling lines drawn from the first point of a series, and models
+# fitted to the times of a series by least squares. The fits take a 2-D array
+# with one series per row (e.g. one per metric or per application), so that
+# any number of series are fitted in a single call
+#
+import argparse
+import csv
+import json
+import sys
+import numpy as np
+from profile_session import ProfileSession
+from plot_data_common import print_table
+from watch_exports import get_profile_type
+import map_json_common as mjc
+import pr_json_common as pjc
+from time_weighting import get_time_weighted_mean
+
+scalingDefs = { 'constant' : (lambda x, y : 1.),
+            'lineard' : (lambda x, y : float(x) / y),
+            'lineari' : (lambda x, y : float(y) / x),
+            'quadraticd' : (lambda x, y : float(x**2) / y**2),
+            'quadratici' : (lambda x, y : float(y**2) / x**2)
+            }
+
+# Models of the time T taken on p processes (or threads) which can be fitted.
+# amdahl is T = serial + parallel / p, for strong scaling. gustafson fits the
+# scaled speedup (p / p0) * T(p0) / T(p) of a weak scaling series to
+# f + (1 - f) * p / p0, where p0 is the smallest count of the series. power
+# is T = scale * p^exponent, and log is T = intercept + slope * log(p)
+modelNames = ["amdahl", "gustafson", "power", "log"]
+fitFields = ["series", "model", "r2", "rms", "serial_fraction", "params"]
+# Times read from each profile of a series
+timeNames = ["runtime", "cpu", "mpi", "io"]
+
+def get_ideal_func(expected):
+    return scalingDefs[expected]
+#### End of function get_ideal_func
+
+def get_scaling_label(expected):
+    assert isinstance(expected, str)
+    return expected[0:-1] if expected[-1] == "i" or expected[-1] == "d" else expected
+#### End of function get_scaling_label
+
+def is_decreasing(scaling):
+    assert isinstance(scaling, str)
+    return scaling[-1] == "d"
+#### End of function is_decreasing
+
+def get_ideal_line(initTime, coreCounts, expected):
+    """
+    Gets data for an ideal scaling line in either the weak or strong case.
+
+    Args:
+        initTime (float): The initial time from which to draw an ideal scaling
+        coreCounts (list): List of counts of cores from which the ideal line
+            can be calculated
+        expected (str): Indicates what sort of scaling is expected for the
+            ideal line
+    """
+
+    idealData = [0. for _ in coreCounts]
+    idealData[0] = initTime
+
+    scalingFunc = get_ideal_func(expected)
+    for i in range(1,len(coreCounts)):
+        idealData[i] = idealData[i-1] * scalingFunc(coreCounts[i-1], coreCounts[i])
+
+    return idealData
+#### End of function get_ideal_line
+
+def __as_batch(procs, times):
+    """
+    Returns the counts and times as 2-D float arrays of the same shape, with
+    one series per row, and a mask of the points which can be used
+    """
+    times = np.atleast_2d(np.asarray(times, dtype=np.float64))
+    procs = np.asarray(procs, dtype=np.float64)
+    procs = np.broadcast_to(np.atleast_2d(procs), times.shape)
+    with np.errstate(invalid="ignore"):
+        used = ~np.isnan(times) & (procs > 0)
+    return procs, times, used
+#### End of function __as_batch
+
+def __fit_lines(x, y, used):
+    """
+    Fits y = intercept + slope * x to the used points of each row by least
+    squares. Rows with fewer than two distinct x values are NaN
+    """
+    counts = used.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xMean = np.where(used, x, 0.).sum(axis=1) / counts
+        yMean = np.where(used, y, 0.).sum(axis=1) / counts
+        xDev = np.where(used, x - xMean[:, np.newaxis], 0.)
+        yDev = np.where(used, y - yMean[:, np.newaxis], 0.)
+        sxx = (xDev ** 2).sum(axis=1)
+        slopes = (xDev * yDev).sum(axis=1) / sxx
+    valid = (counts >= 2) & (sxx > 0)
+    slopes = np.where(valid, slopes, np.nan)
+    return np.where(valid, yMean - slopes * xMean, np.nan), slopes
+#### End of function __fit_lines
+
+def get_reference_points(procs, times):
+    """
+    Gets the point of each series with the fewest processes, against which
+    speedups and efficiencies are measured
+
+    Args:
+        procs (array): Counts of processes (or threads), shared by all series
+            (1-D) or per series (2-D)
+        times (array): Times, with one series per row. Missing times are NaN
+
+    Returns:
+        Tuple of NumPy arrays (reference count, reference time) with a value
+        per series
+    """
+    procs, times, used = __as_batch(procs, times)
+    inds = np.argmin(np.where(used, procs, np.inf), axis=1)
+    rows = np.arange(times.shape[0])
+    hasPoints = used.any(axis=1)
+    return np.where(hasPoints, procs[rows, inds], np.nan), \
+            np.where(hasPoints, times[rows, inds], np.nan)
+#### End of function get_reference_points
+
+def __reshape_like(values, times):
+    return values if np.ndim(times) > 1 else values[0]
+#### End of function __reshape_like
+
+def get_parallel_efficiency(procs, times, weak=False):
+    """
+    Gets the parallel efficiency of each point of each series relative to
+    the point with the fewest processes: T0 * p0 / (T * p) for strong
+    scaling, and T0 / T for weak scaling
+
+    Args:
+        procs (array): Counts of processes (or threads), 1-D or 2-D
+        times (array): Times of one series (1-D) or one series per row (2-D)
+        weak (bool): Indicates that the series are weak scaling series
+
+    Returns:
+        NumPy array of the same shape as times
+    """
+    refProcs, refTimes = get_reference_points(procs, times)
+    batchProcs, batchTimes, used = __as_batch(procs, times)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        efficiency = refTimes[:, np.newaxis] / batchTimes
+        if not weak:
+            efficiency *= refProcs[:, np.newaxis] / batchProcs
+    return __reshape_like(np.where(used, efficiency, np.nan), times)
+#### End of function get_parallel_efficiency
+
+def get_karp_flatt(procs, times):
+    """
+    Gets the Karp-Flatt metric of each point of each series: the serial
+    fraction e = (1 / S - 1 / q) / (1 - 1 / q) measured from the speedup S on
+    q times the processes of the point with the fewest processes. A serial
+    fraction which grows with q points to parallel overheads rather than to
+    serial code
+
+    Args:
+        procs (array): Counts of processes (or threads), 1-D or 2-D
+        times (array): Times of one series (1-D) or one series per row (2-D)
+
+    Returns:
+        NumPy array of the same shape as times. Points with no more processes
+        than the reference are NaN
+    """
+    refProcs, refTimes = get_reference_points(procs, times)
+    batchProcs, batchTimes, used = __as_batch(procs, times)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speedups = refTimes[:, np.newaxis] / batchTimes
+        ratios = batchProcs / refProcs[:, np.newaxis]
+        serial = (1. / speedups - 1. / ratios) / (1. - 1. / ratios)
+    return __reshape_like(np.where(used & (ratios > 1), serial, np.nan), times)
+#### End of function get_karp_flatt
+
+def fit_model(model, procs, times):
+    """
+    Fits a scaling model to each series of times by least squares, all
+    series at once. amdahl and log are linear in their parameters, power is
+    fitted to log(T) against log(p), and gustafson is a one parameter fit
+    of the scaled speedups
+
+    Args:
+        model (str): One of modelNames
+        procs (array): Counts of processes (or threads), 1-D or 2-D
+        times (array): Times of one series (1-D) or one series per row (2-D).
+            Missing times are NaN
+
+    Returns:
+        Dictionary of NumPy arrays of the parameters of each series. Series
+        which cannot be fitted are NaN
+    """
+    assert model in modelNames
+    batchProcs, batchTimes, used = __as_batch(procs, times)
+    if model == "amdahl":
+        serial, parallel = __fit_lines(1. / batchProcs, batchTimes, used)
+        return {"serial" : serial, "parallel" : parallel}
+    if model == "log":
+        intercept, slope = __fit_lines(np.log(batchProcs), batchTimes, used)
+        return {"intercept" : intercept, "slope" : slope}
+    if model == "power":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            logTimes = np.log(batchTimes)
+        logScale, exponent = __fit_lines(np.log(batchProcs), logTimes,
+                used & (batchTimes > 0))
+        return {"scale" : np.exp(logScale), "exponent" : exponent}
+
+    refProcs, refTimes = get_reference_points(batchProcs, batchTimes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = batchProcs / refProcs[:, np.newaxis]
+        speedups = ratios * refTimes[:, np.newaxis] / batchTimes
+        fitted = used & (ratios != 1) & ~np.isnan(speedups)
+        # Least squares solution of speedup - q = f * (1 - q)
+        offsets = np.where(fitted, 1. - ratios, 0.)
+        fraction = (offsets * np.where(fitted, speedups - ratios, 0.)).sum(
+                axis=1) / (offsets ** 2).sum(axis=1)
+    return {"serial_fraction" : np.where(fitted.any(axis=1), fraction, np.nan),
+            "ref_procs" : refProcs, "ref_time" : refTimes}
+#### End of function fit_model
+
+def predict_model(model, params, procs):
+    """
+    Gets the times predicted by a fitted scaling model
+
+    Args:
+        model (str): One of modelNames
+        params (dict): Parameters returned by fit_model
+        procs (array): Counts of processes (or threads) at which to predict,
+            shared by all series (1-D) or per series (2-D)
+
+    Returns:
+        2-D NumPy array with one row per series
+    """
+    assert model in modelNames
+    params = dict((name, np.asarray(values, dtype=np.float64)[:, np.newaxis])
+            for name, values in params.items())
+    procs = np.atleast_2d(np.asarray(procs, dtype=np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if model == "amdahl":
+            return params["serial"] + params["parallel"] / procs
+        if model == "log":
+            return params["intercept"] + params["slope"] * np.log(procs)
+        if model == "power":
+            return params["scale"] * procs ** params["exponent"]
+        ratios = procs / params["ref_procs"]
+        fraction = params["serial_fraction"]
+        return ratios * params["ref_time"] / (fraction + (1. - fraction) * ratios)
+#### End of function predict_model
+
+def fit_scaling_models(procs, times, models=modelNames):
+    """
+    Fits scaling models to each series of times, and measures how well each
+    fits
+
+    Args:
+        procs (array): Counts of processes (or threads), 1-D or 2-D
+        times (array): Times of one series (1-D) or one series per row (2-D)
+        models (list): Names of the models to fit
+
+    Returns:
+        Dictionary keyed by model of dictionaries with the fields "params"
+        (see fit_model), "predicted" (2-D NumPy array of the time predicted
+        at each point), "r2" (coefficient of determination of each series),
+        "rms" (root mean square residual) and "serial_fraction" (serial
+        fraction implied by the amdahl and gustafson models, NaN otherwise)
+    """
+    batchProcs, batchTimes, used = __as_batch(procs, times)
+    counts = used.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(used, batchTimes, 0.).sum(axis=1) / counts
+        totalSq = (np.where(used, batchTimes - means[:, np.newaxis], 0.) **
+                2).sum(axis=1)
+
+    fits = {}
+    for model in models:
+        params = fit_model(model, batchProcs, batchTimes)
+        predicted = predict_model(model, params, batchProcs)
+        residuals = np.where(used, batchTimes - predicted, 0.)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            residualSq = (residuals ** 2).sum(axis=1)
+            r2 = np.where(totalSq > 0, 1. - residualSq / totalSq, np.nan)
+            rms = np.sqrt(residualSq / counts)
+            if model == "amdahl":
+                serialFraction = params["serial"] / (params["serial"] +
+                        params["parallel"])
+            elif model == "gustafson":
+                serialFraction = params["serial_fraction"]
+            else:
+                serialFraction = np.full(len(counts), np.nan)
+        fitted = ~np.isnan(predicted).all(axis=1)
+        fits[model] = {"params" : params, "predicted" : predicted,
+                "r2" : np.where(fitted, r2, np.nan),
+                "rms" : np.where(fitted, rms, np.nan),
+                "serial_fraction" : serialFraction}
+    return fits
+#### End of function fit_scaling_models
+
+def get_fitted_lines(coreCounts, yDataList, models, labels=None):
+    """
+    Gets the lines of fitted scaling models to draw alongside the data of
+    one or more series, all fitted at once
+
+    Args:
+        coreCounts (list): Counts of cores of the points of the series
+        yDataList (list): List of the y data of each series. None values are
+            missing
+        models (list): Names of the models to fit
+        labels (list): Labels of the series, prefixed to the names of the
+            models. Default is to label the lines by the model only
+
+    Returns:
+        List of tuples (label, fittedData), by model and then by series
+    """
+    times = np.array([[np.nan if y is None else y for y in yData]
+        for yData in yDataList], dtype=np.float64)
+    fits = fit_scaling_models(coreCounts, times, models)
+    lines = []
+    for model in models:
+        for ind, predicted in enumerate(fits[model]["predicted"]):
+            label = model + " fit"
+            if labels:
+                label = labels[ind] + " " + label
+            lines.append((label, predicted.tolist()))
+    return lines
+#### End of function get_fitted_lines
+
+def get_profile_times(profileDict):
+    """
+    Gets the run configuration and the runtime and the CPU, MPI and I/O times
+    of a MAP or Performance Reports profile
+
+    Args:
+        profileDict (dict): Dictionary of the JSON export of a MAP or
+            Performance Reports profile
+
+    Returns:
+        Tuple of (number of processes, number of threads, number of nodes,
+        list of the times in seconds in the order of timeNames)
+    """
+    if get_profile_type(profileDict) == "map":
+        runtime = mjc.get_runtime(profileDict) / 1000.
+        percentages = []
+        for func in [mjc.get_total_cpu_activity, mjc.get_mpi_activity,
+                mjc.get_io_activity]:
+            samples = func(profileDict)
+            percentages.append(get_time_weighted_mean(profileDict, samples)
+                    if len(samples) > 0 else 0.)
+        common = mjc
+    else:
+        runtime = float(pjc.get_runtime(profileDict))
+        overview = pjc.get_overview_data(profileDict)
+        percentages = [float(overview[part]["percent"]) for part in timeNames[1:]]
+        common = pjc
+    return int(common.get_num_processes(profileDict)), \
+            int(common.get_num_threads(profileDict)), \
+            int(common.get_num_nodes(profileDict)), \
+            [runtime] + [percentage / 100. * runtime for percentage in percentages]
+#### End of function get_profile_times
+
+def read_scaling_series(fileList, threads=False, loadFunc=mjc.load_profile):
+    """
+    Reads the runtime and the CPU, MPI and I/O times of a scaling series of
+    MAP or Performance Reports profiles
+
+    Args:
+        fileList (list): Names of the JSON exports
+        threads (bool): Indicates whether to scale against the number of
+            threads rather than of processes
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of (sorted list of counts, dictionary of lists of times in
+        seconds keyed by the names in timeNames)
+    """
+    series = {}
+    for filename in fileList:
+        numProcs, numThreads, _, times = get_profile_times(loadFunc(filename))
+        series[numThreads if threads else numProcs] = times
+
+    sortedKeys = sorted(series.keys())
+    return sortedKeys, dict((name, [series[key][ind] for key in sortedKeys])
+            for ind, name in enumerate(timeNames))
+#### End of function read_scaling_series
+
+def get_fit_report(coreCounts, timeSeries, models=modelNames, weak=False):
+    """
+    Gets the rows of the report of the scaling of a set of series
+
+    Args:
+        coreCounts (list): Counts of cores of the points of the series
+        timeSeries (dict): Dictionary of lists of times keyed by series name
+        models (list): Names of the models to fit
+        weak (bool): Indicates that the series are weak scaling series
+
+    Returns:
+        Tuple of (list of dictionaries with the fields in fitFields, one per
+        series and model, dictionary of the efficiency and Karp-Flatt metric
+        of each series as lists keyed by "<series> efficiency" and "<series>
+        karp-flatt")
+    """
+    names = list(timeSeries)
+    times = np.array([timeSeries[name] for name in names], dtype=np.float64)
+    fits = fit_scaling_models(coreCounts, times, models)
+    rows = []
+    for ind, name in enumerate(names):
+        for model in models:
+            fit = fits[model]
+            rows.append({"series" : name, "model" : model,
+                "r2" : __to_value(fit["r2"][ind]),
+                "rms" : __to_value(fit["rms"][ind]),
+                "serial_fraction" : __to_value(fit["serial_fraction"][ind]),
+                "params" : dict((param, __to_value(values[ind])) for param,
+                    values in fit["params"].items())})
+    efficiency = get_parallel_efficiency(coreCounts, times, weak)
+    karpFlatt = get_karp_flatt(coreCounts, times)
+    metrics = {}
+    for ind, name in enumerate(names):
+        metrics[name + " efficiency"] = [__to_value(value) for value in
+                efficiency[ind]]
+        metrics[name + " karp-flatt"] = [__to_value(value) for value in
+                karpFlatt[ind]]
+    return rows, metrics
+#### End of function get_fit_report
+
+def __to_value(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+#### End of function __to_value
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Fits scaling models" +
+            " (Amdahl, Gustafson, power law and logarithmic) to the runtime" +
+            " and the CPU, MPI and I/O times of a scaling series of JSON" +
+            " format MAP or Performance Reports files, and reports the" +
+            " parallel efficiency and Karp-Flatt serial fraction of each run")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " or Performance Reports files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--models", help="Models to fit. Default is all of" +
+            " them", choices=modelNames, nargs="+", default=modelNames)
+    parser.add_argument("--threads", help="Scale against the number of" +
+            " threads rather than of processes", action="store_true")
+    parser.add_argument("--weak", help="Treat the series as weak scaling when" +
+            " measuring efficiency", action="store_true")
+    outGroup = parser.add_mutually_exclusive_group()
+    outGroup.add_argument("--csv", help="Write the fits in CSV format",
+            action="store_true")
+    outGroup.add_argument("--json", help="Write the fits and the efficiencies" +
+            " in JSON format", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+
+    if session is None:
+        session = ProfileSession()
+    coreCounts, timeSeries = read_scaling_series(fileList, args.threads,
+            session.load)
+    timeSeries = dict((name, values) for name, values in timeSeries.items()
+            if any(values))
+    rows, metrics = get_fit_report(coreCounts, timeSeries, args.models,
+            args.weak)
+
+    if args.json:
+        print(json.dumps({"counts" : coreCounts, "times" : timeSeries,
+            "fits" : rows, "metrics" : metrics}, indent=4))
+    elif args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=fitFields)
+        writer.writeheader()
+        for row in rows:
+            row = dict(row)
+            row["params"] = " ".join(param + "=" + str(value) for param, value
+                    in sorted(row["params"].items()))
+            writer.writerow(row)
+    else:
+        print_table([dict(row, params=" ".join(param + "=%.4g" % value if
+            value is not None else param + "=-" for param, value in
+            sorted(row["params"].items()))) for row in rows], fitFields)
+        print("")
+        countStrs = [str(count) for count in coreCounts]
+        print_table([dict([("series", name)] + list(zip(countStrs, values)))
+            for name, values in sorted(metrics.items())], ["series"] + countStrs)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@
 #
 import argparse
 import json
+from profile_session import ProfileSession
 
 def print_indented(indentLevel, outStr):
     """
@@ -56,12 +57,20 @@ def print_dict_keys(inDict, recurseLevel=0, indentLevel=1, showAll=False):
 #### End of function print_dict_keys
 
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to show the keys in" +
             " a JSON file up to a given depth")
     # Add a file to read input from
-    parser.add_argument("infile", help="JSON file to read information from",
-        type=argparse.FileType('r'))
+    parser.add_argument("infile", help="JSON file to read information from")
 
     parser.add_argument("--level", help="Maximum level to iterate to",
             nargs="?", type=int, default=1)
@@ -69,13 +78,19 @@ if __name__ == "__main__":
             action='store_true', default=False)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Read in the JSON as a dictionary
-    jsonDict = json.load(args.infile)
+    if session is None:
+        session = ProfileSession()
+    jsonDict = session.load(args.infile)
 
     if (not isinstance(jsonDict, dict)):
         print("JSON read a single value: " + str(jsonDict))
     else:
         print_dict_keys(jsonDict, recurseLevel=args.level, indentLevel=0,
                 showAll=args.all)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
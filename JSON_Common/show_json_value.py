@@ -15,6 +15,7 @@
 #
 import argparse
 import json
+from profile_session import ProfileSession
 
 def get_dict_field_val(inDict, fields):
     """
@@ -44,25 +45,39 @@ def get_dict_field_val(inDict, fields):
     return outVal
 #### End of function get_dict_field_val
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to show the value " +
             "stored at a given field in a JSON file")
     # Add a file to read input from
-    parser.add_argument("infile", help="JSON file to read information from",
-        type=argparse.FileType('r'))
+    parser.add_argument("infile", help="JSON file to read information from")
 
     # Add a list of (ordered) field names
     parser.add_argument("fields", help="List of fields to recurse into." +
             " This is ordered, and each entry goes down a level in the " +
             "JSON object", nargs='+') 
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Read in the JSON as a dictionary
-    jsonDict = json.load(args.infile)
+    if session is None:
+        session = ProfileSession()
+    jsonDict = session.load(args.infile)
 
     val = get_dict_field_val(jsonDict, args.fields)
     print(str(val))
     # Print out the value requested
     with open("kbrab.json", "w") as outFile:
         json.dump(val, outFile)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import contextlib
+import fnmatch
+import os
+import shlex
+import sys
+import time
+import warnings
+from profile_session import ProfileSession
+
+# The subcommands run by the watcher are those of the allinea-json command,
+# which sits in the folder above this one
+scriptRoot = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir))
+if scriptRoot not in sys.path:
+    sys.path.append(scriptRoot)
+
+# Names of the list files written to the output folder, and the placeholder
+# replaced by them in the series commands
+mapListName = "map_files.txt"
+prListName = "pr_files.txt"
+fileListToken = "{files}"
+
+def get_profile_type(profileDict):
+    """
+    Gets the type of profile a JSON dictionary represents
+
+    Args:
+        profileDict (dict): Dictionary loaded from a JSON export
+
+    Returns:
+        "map" for a MAP profile, "pr" for a Performance Report, or None if it
+        is neither
+    """
+    if not isinstance(profileDict, dict):
+        return None
+    if "samples" in profileDict and "info" in profileDict:
+        return "map"
+    if "data" in profileDict:
+        return "pr"
+    return None
+#### End of function get_profile_type
+
+class ExportWatcher(object):
+    """
+    Detects JSON exports which are new or have been modified in a folder. The
+    folder is watched with inotify when the inotify_simple package is
+    available, and polled otherwise
+    """
+
+    def __init__(self, directory, pattern="*.json", usePolling=False):
+        """
+        Args:
+            directory (str): Folder in which to look for exports
+            pattern (str): Glob pattern which the file names must match
+            usePolling (bool): Indicates that the folder should be polled even
+                when inotify is available
+        """
+        self.directory = directory
+        self.pattern = pattern
+        # Maps a file path to its last seen (modification time, size)
+        self.__stats = {}
+        self.__inotify = None
+        if not usePolling:
+            try:
+                from inotify_simple import INotify, flags
+            except ImportError:
+                return
+            self.__inotify = INotify()
+            self.__inotify.add_watch(directory, flags.CLOSE_WRITE |
+                    flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM)
+
+    def is_polling(self):
+        return self.__inotify is None
+
+    def scan(self):
+        """
+        Compares the files in the folder against those seen by the previous
+        scan
+
+        Returns:
+            Tuple of (changed, removed) where changed is a sorted list of the
+            paths of files which are new or modified, and removed is a sorted
+            list of the paths of files which no longer exist
+        """
+        current = {}
+        for filename in os.listdir(self.directory):
+            if not fnmatch.fnmatch(filename, self.pattern):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                fileStat = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (fileStat.st_mtime, fileStat.st_size)
+
+        changed = sorted(path for path in current
+                if self.__stats.get(path) != current[path])
+        removed = sorted(path for path in self.__stats if path not in current)
+        self.__stats = current
+        return changed, removed
+    #### End of function scan
+
+    def forget(self, path):
+        """
+        Forgets the state of the given file, so that it is reported as changed
+        by the next scan. Used for files which could not be read yet
+        """
+        self.__stats.pop(path, None)
+
+    def wait(self, interval):
+        """
+        Blocks until files in the folder may have changed
+
+        Args:
+            interval (float): Number of seconds between polls. When inotify is
+                used this is the longest time to wait for an event
+
+        Returns:
+            Nothing
+        """
+        if self.__inotify is None:
+            time.sleep(interval)
+            return
+        events = self.__inotify.read(timeout=int(interval * 1000))
+        # Let a burst of events (e.g. several exports finishing at once)
+        # settle so that they are handled together
+        while len(events) > 0:
+            events = self.__inotify.read(timeout=100)
+    #### End of function wait
+#### End of class ExportWatcher
+
+def write_file_list(filename, fileList):
+    with open(filename, "w") as outfile:
+        for path in fileList:
+            outfile.write(os.path.abspath(path) + "\n")
+#### End of function write_file_list
+
+def run_series_command(command, listFileName, outPrefix, session):
+    """
+    Runs an allinea-json subcommand over a list of profiles. When the command
+    emits its data, the output is written to a .csv or .json file. Otherwise
+    the figures it draws are saved to .png files
+
+    Args:
+        command (str): Subcommand and its arguments, where the list of
+            profiles is given by the placeholder {files}
+        listFileName (str): Name of the file containing the list of profiles
+        outPrefix (str): Prefix of the names of the files written
+        session (ProfileSession): Session from which to read profiles
+
+    Returns:
+        List of the names of the files written
+    """
+    import allinea_json
+    argv = [listFileName if arg == fileListToken else arg
+            for arg in shlex.split(command)]
+    module = allinea_json.get_subcommand_module(argv[0])
+    if module is None:
+        raise ValueError("Unknown subcommand '" + argv[0] + "'")
+
+    # Use the data format as the file extension when the data is emitted
+    emitFormat = None
+    for ind, arg in enumerate(argv):
+        if arg == "--emit-data" and ind + 1 < len(argv):
+            emitFormat = argv[ind + 1]
+        elif arg.startswith("--emit-data="):
+            emitFormat = arg.split("=", 1)[1]
+
+    if emitFormat is not None:
+        outFileName = outPrefix + "." + emitFormat
+        with open(outFileName, "w") as outfile:
+            with contextlib.redirect_stdout(outfile):
+                module.main(argv[1:], session)
+        return [outFileName]
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    with warnings.catch_warnings():
+        # The scripts call show(), which does nothing with the Agg backend
+        warnings.simplefilter("ignore", UserWarning)
+        module.main(argv[1:], session)
+
+    outFileNames = []
+    figNums = plt.get_fignums()
+    for figNum in figNums:
+        if len(figNums) == 1:
+            outFileName = outPrefix + ".png"
+        else:
+            outFileName = outPrefix + "_" + str(figNum) + ".png"
+        plt.figure(figNum).savefig(outFileName)
+        outFileNames.append(outFileName)
+    plt.close("all")
+    return outFileNames
+#### End of function run_series_command
+
+def write_sample_csv(path, outDir, session):
+    import generate_sample_csv
+    stem = os.path.splitext(os.path.basename(path))[0]
+    outFileName = os.path.join(outDir, stem + "_allsamples.txt")
+    generate_sample_csv.main([path, "-o", outFileName], session)
+    return outFileName
+#### End of function write_sample_csv
+
+class ExportPipeline(object):
+    """
+    Brings the outputs generated from a folder of JSON exports up to date.
+    Only the profiles which are new or have changed are read, and only the
+    outputs which depend on them are regenerated
+    """
+
+    def __init__(self, outDir, writeCsv=False, mapCommands=[], prCommands=[],
+            session=None):
+        """
+        Args:
+            outDir (str): Folder to write the outputs to
+            writeCsv (bool): Indicates that a CSV of the samples of each MAP
+                profile is written
+            mapCommands (list): Subcommands run over the list of MAP profiles
+            prCommands (list): Subcommands run over the list of Performance
+                Reports profiles
+            session (ProfileSession): Session from which to read profiles
+        """
+        self.outDir = outDir
+        self.writeCsv = writeCsv
+        self.commands = {"map" : list(mapCommands), "pr" : list(prCommands)}
+        self.listFileNames = {"map" : os.path.join(outDir, mapListName),
+                "pr" : os.path.join(outDir, prListName)}
+        self.session = ProfileSession() if session is None else session
+        # Maps the path of each profile to its type
+        self.profiles = {}
+
+    def update(self, changed, removed):
+        """
+        Processes the files which have changed or been removed
+
+        Args:
+            changed (list): Paths of the new or modified files
+            removed (list): Paths of the files which have been removed
+
+        Returns:
+            List of the paths of changed files which could not be read, for
+            example because they are still being written
+        """
+        affected = set()
+        unreadable = []
+        for path in removed:
+            self.session.evict(path)
+            profileType = self.profiles.pop(path, None)
+            if profileType is not None:
+                affected.add(profileType)
+
+        for path in changed:
+            try:
+                profileDict = self.session.load(path)
+            except (IOError, ValueError):
+                unreadable.append(path)
+                continue
+            profileType = get_profile_type(profileDict)
+            oldType = self.profiles.pop(path, None)
+            if oldType is not None:
+                affected.add(oldType)
+            if profileType is None:
+                self.session.evict(path)
+                continue
+            self.profiles[path] = profileType
+            affected.add(profileType)
+            if profileType == "map" and self.writeCsv:
+                write_sample_csv(path, self.outDir, self.session)
+
+        for profileType in sorted(affected):
+            self.__update_series(profileType)
+        return unreadable
+    #### End of function update
+
+    def __update_series(self, profileType):
+        fileList = sorted(path for path in self.profiles
+                if self.profiles[path] == profileType)
+        listFileName = self.listFileNames[profileType]
+        write_file_list(listFileName, fileList)
+        if len(fileList) == 0:
+            return
+        for ind, command in enumerate(self.commands[profileType]):
+            outPrefix = os.path.join(self.outDir, profileType + "_" +
+                    shlex.split(command)[0] + "_" + str(ind))
+            try:
+                outFileNames = run_series_command(command, listFileName,
+                        outPrefix, self.session)
+            except (IOError, ValueError, KeyError, SystemExit) as err:
+                print("Failed to run '" + command + "': " + str(err),
+                        file=sys.stderr)
+                continue
+            for outFileName in outFileNames:
+                print("Updated " + outFileName)
+#### End of class ExportPipeline
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Watches a folder for new or" +
+            " modified JSON exports of MAP and Performance Reports profiles," +
+            " and regenerates the outputs that depend on them. The lists of" +
+            " MAP and Performance Reports profiles found are written to " +
+            mapListName + " and " + prListName + " in the output folder")
+    parser.add_argument("directory", help="Folder to watch for JSON exports")
+    parser.add_argument("-o", "--outdir", help="Folder to write the outputs" +
+            " to. Default is the watched folder", default=None)
+    parser.add_argument("--pattern", help="Glob pattern the names of the" +
+            " exports must match. Default is *.json", default="*.json")
+    parser.add_argument("--csv", help="Write a CSV of the samples of each MAP" +
+            " profile", action="store_true")
+    parser.add_argument("--map", help="allinea-json subcommand to run over" +
+            " the MAP profiles when any of them changes, with " +
+            fileListToken + " in place of the list file, e.g. \"plot-bar " +
+            fileListToken + " cpu_time_percentage\". Figures are saved as" +
+            " .png, and data as .csv or .json when --emit-data is given." +
+            " May be repeated", action="append", default=[])
+    parser.add_argument("--pr", help="As --map, for the Performance Reports" +
+            " profiles", action="append", default=[])
+    parser.add_argument("--interval", help="Number of seconds between polls" +
+            " of the folder. Default is 5", type=float, default=5.0)
+    parser.add_argument("--poll", help="Poll the folder even if inotify is" +
+            " available", action="store_true")
+    parser.add_argument("--once", help="Process the current contents of the" +
+            " folder and exit", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        raise IOError("Folder " + args.directory + " does not exist")
+    outDir = args.directory if args.outdir is None else args.outdir
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+
+    watcher = ExportWatcher(args.directory, args.pattern, args.poll)
+    pipeline = ExportPipeline(outDir, args.csv, args.map, args.pr, session)
+
+    try:
+        while True:
+            changed, removed = watcher.scan()
+            if len(changed) > 0 or len(removed) > 0:
+                unreadable = pipeline.update(changed, removed)
+                # Files which are still being written are retried later
+                for path in unreadable:
+                    watcher.forget(path)
+            if args.once:
+                break
+            watcher.wait(args.interval)
+    except KeyboardInterrupt:
+        pass
+#### End of function main
+
+if __name__ == "__main__":
+    main()
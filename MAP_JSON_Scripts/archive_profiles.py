@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import json
+import numbers
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from sample_codec import encode_sample_blocks
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+archiveCompressions = ["gorilla", "gzip", "lzf", "none"]
+
+def __create_sample_dataset(group, name, samples, chunkSize, compression,
+        level):
+    if compression == "gorilla":
+        # Store the independently encoded blocks of samples as bytes, with
+        # the offset of each block so that a window can be read on its own
+        data, offsets = encode_sample_blocks(samples, chunkSize)
+        dataset = group.create_dataset(name, data=np.frombuffer(data,
+            dtype=np.uint8))
+        dataset.attrs["codec"] = compression
+        dataset.attrs["count"] = len(samples)
+        dataset.attrs["block_size"] = chunkSize
+        dataset.attrs["block_offsets"] = offsets
+        return
+
+    # Missing values (null in the JSON) are stored as NaN
+    data = np.array(samples, dtype=np.float64)
+    options = {}
+    if len(data) > 0:
+        options["chunks"] = (min(chunkSize, len(data)),)
+        if compression != "none":
+            options["compression"] = compression
+            options["shuffle"] = True
+            if compression == "gzip":
+                options["compression_opts"] = level
+    group.create_dataset(name, data=data, **options)
+#### End of function __create_sample_dataset
+
+def add_profile_to_archive(archive, runId, profileDict, chunkSize=4096,
+        compression="gorilla", level=4, replace=False):
+    """
+    Adds a MAP profile to an open archive. The "info" block is stored as
+    attributes of the run's group, and each field of each metric and each
+    activity timeline as a chunked, compressed dataset
+
+    Args:
+        archive (h5py.File): Archive opened for writing with open_archive
+        runId (str): Identifier of the run
+        profileDict (dict): Dictionary representing the MAP profile
+        chunkSize (int): Number of samples in each chunk of the datasets
+        compression (str): One of "gorilla" (see sample_codec), "gzip", "lzf"
+            or "none"
+        level (int): Compression level for gzip, from 0 to 9
+        replace (bool): Indicates whether to replace a run with the same
+            identifier
+
+    Returns:
+        Nothing
+
+    Raises:
+        ValueError: If the archive has a run with the same identifier and
+            replace is False
+    """
+    assert compression in archiveCompressions
+    assert chunkSize > 0
+
+    if runId in archive:
+        if not replace:
+            raise ValueError("Run " + runId + " is already in the archive." +
+                    " Use --replace to replace it")
+        del archive[runId]
+    group = archive.create_group(runId)
+
+    infoDict = profileDict["info"]
+    group.attrs["info"] = json.dumps(infoDict)
+    # Scalar info values are also stored individually so that runs can be
+    # selected without parsing the JSON
+    for key, val in infoDict.items():
+        if isinstance(val, (numbers.Number, str)):
+            group.attrs[key] = val
+    group.attrs["header"] = json.dumps(dict((key, val)
+        for key, val in profileDict.items() if key not in ["info", "samples"]))
+    group.attrs["count"] = get_sample_count(profileDict)
+
+    sampleDict = profileDict["samples"]
+    __create_sample_dataset(group, "window_start_offsets",
+            sampleDict["window_start_offsets"], chunkSize, compression, level)
+    metricsGroup = group.create_group("metrics")
+    for metric, metricDict in sampleDict["metrics"].items():
+        fieldGroup = metricsGroup.create_group(metric)
+        for field, samples in metricDict.items():
+            __create_sample_dataset(fieldGroup, field, samples, chunkSize,
+                    compression, level)
+    if "activity" in sampleDict:
+        activityGroup = group.create_group("activity")
+        for timeline, activityDict in sampleDict["activity"].items():
+            timelineGroup = activityGroup.create_group(timeline)
+            for activity, samples in activityDict.items():
+                __create_sample_dataset(timelineGroup, activity, samples,
+                        chunkSize, compression, level)
+#### End of function add_profile_to_archive
+
+def archive_profiles(archiveName, fileList, chunkSize=4096,
+        compression="gorilla", level=4, runIds=None, replace=False,
+        loadFunc=load_profile):
+    """
+    Adds a list of MAP profiles to an archive, creating the archive if it does
+    not exist. Profiles are read and added one at a time. The run ids are
+    checked before any profile is added, so that nothing is written if two
+    runs share an id, or if a run is already in the archive and replace is
+    False
+
+    Args:
+        archiveName (str): Name of the archive file
+        fileList (list): List of the names of JSON exports of MAP profiles
+        chunkSize (int): Number of samples in each chunk of the datasets
+        compression (str): One of "gorilla", "gzip", "lzf" or "none"
+        level (int): Compression level for gzip, from 0 to 9
+        runIds (list): Identifiers of the runs, in the same order as the
+            files. Default is to derive them from the file names (see
+            get_run_id)
+        replace (bool): Indicates whether to replace runs which are already
+            in the archive
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of the run identifiers added
+
+    Raises:
+        ValueError: If two runs have the same identifier, or if a run is
+            already in the archive and replace is False
+    """
+    runIds = get_run_ids(fileList, runIds)
+    with open_archive(archiveName, "a") as archive:
+        existing = [runId for runId in runIds if runId in archive]
+        if existing and not replace:
+            raise ValueError("Runs already in the archive: " +
+                    " ".join(existing) + ". Use --replace to replace them")
+        for filename, runId in zip(fileList, runIds):
+            add_profile_to_archive(archive, runId, loadFunc(filename.strip()),
+                    chunkSize, compression, level, replace)
+    return runIds
+#### End of function archive_profiles
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Adds JSON format MAP files" +
+            " to a compressed HDF5 archive of profiles. Each profile is" +
+            " stored under a run id, which is the name of the JSON file" +
+            " without its extension unless given with --runIds. A run can then be read by any of the" +
+            " scripts by giving its name as <archive>.h5:<run id>")
+    parser.add_argument("archive", help="Name of the archive file, with the" +
+            " extension .h5 or .hdf5")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--chunkSize", help="Number of samples in each chunk" +
+            " of the archive. Smaller chunks make reading short windows" +
+            " faster, at the expense of compression. Default is 4096",
+            type=int, default=4096)
+    parser.add_argument("--compression", help="Compression of the samples." +
+            " gorilla stores the XOR or delta of consecutive values, which suits" +
+            " slowly varying samples and long runs of zeros. Default is" +
+            " gorilla",
+            choices=archiveCompressions, default="gorilla")
+    parser.add_argument("--level", help="Compression level for gzip, from 0" +
+            " to 9. Default is 4", type=int, choices=range(10), default=4)
+    parser.add_argument("--runIds", help="Identifiers of the runs, one per" +
+            " input file in the same order. Default is the name of each file" +
+            " without its folder or extension", nargs="+", default=None)
+    parser.add_argument("--replace", help="Replace runs which are already in" +
+            " the archive. By default the files are not added if any of them" +
+            " is", action="store_true")
+    parser.add_argument("--list", help="List the runs in the archive after" +
+            " adding the files", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if not args.archive.lower().endswith(archiveExtensions):
+        parser.error("the archive name must end with one of " +
+                ", ".join(archiveExtensions))
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+
+    if session is None:
+        session = ProfileSession()
+    if len(fileList) > 0:
+        try:
+            runIds = archive_profiles(args.archive, fileList, args.chunkSize,
+                    args.compression, args.level, args.runIds, args.replace,
+                    session.load)
+        except ValueError as err:
+            parser.error(str(err))
+        print("Added " + str(len(runIds)) + " runs to " + args.archive)
+
+    if args.list:
+        for runId in get_archive_run_ids(args.archive):
+            print(runId)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
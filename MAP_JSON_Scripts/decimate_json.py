@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import argparse
+import os
+import sys
+import numpy as np
+import map_json_common as mjc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+def generate_out_filename(infileName, factor):
+    # A run in an archive is written to a JSON file next to the archive
+    infileName = mjc.get_output_base_name(infileName)
+    dotInd= infileName.rfind(".")
+    slashInd= infileName.rfind("/")
+    suffix= "_dec" + str(factor)
+    outFName= infileName + suffix if dotInd < 0 or (slashInd > 0 and dotInd < slashInd) else \
+            infileName[:dotInd] + suffix + infileName[dotInd:]
+    return outFName
+#### End of function generate_out_filename
+
+def __group_samples(samples, factor):
+    """
+    Returns the samples as a NumPy array with one row per group of factor
+    consecutive samples. Missing values (None), and the padding of the last
+    group, are NaN
+    """
+    values = np.array([np.nan if val is None else val for val in samples],
+            dtype=np.float64)
+    numGroups = -(-len(values) // factor)
+    padded = np.full(numGroups * factor, np.nan)
+    padded[:len(values)] = values
+    return padded.reshape(numGroups, factor)
+#### End of function __group_samples
+
+def __to_list(values):
+    # Missing values are written back as null
+    return [None if np.isnan(val) else float(val) for val in values]
+#### End of function __to_list
+
+def get_window_weights(profileDict, factor):
+    """
+    Gets the lengths of the sampling windows of a profile, grouped into
+    groups of factor consecutive windows. A group whose windows all have zero
+    length weights its windows equally
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        factor (int): Number of consecutive samples in each group
+
+    Returns:
+        NumPy array with one row per group, with a weight of zero for the
+        padding of the last group
+    """
+    startTimes = mjc.get_window_start_times(profileDict)
+    widths = np.array(mjc.get_window_end_times(profileDict), dtype=np.float64) - \
+            np.array(startTimes, dtype=np.float64)
+    weights = np.nan_to_num(__group_samples(widths, factor))
+    inGroup = ~np.isnan(__group_samples(startTimes, factor))
+    noWidth = weights.sum(axis=1) <= 0
+    weights[noWidth] = inGroup[noWidth]
+    return weights
+#### End of function get_window_weights
+
+def weighted_mean(groups, weights):
+    """
+    Gets the weighted mean of each row of grouped samples, ignoring missing
+    (NaN) samples
+
+    Args:
+        groups (array): Samples with one row per group
+        weights (array): Weight of each sample
+
+    Returns:
+        NumPy array with the mean of each group, NaN where all of the samples
+        of a group are missing
+    """
+    weights = np.where(np.isnan(groups), 0.0, weights)
+    totals = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(np.isnan(groups), 0.0, groups * weights).sum(axis=1) / totals
+#### End of function weighted_mean
+
+def last_value(groups):
+    """
+    Gets the last sample of each row of grouped samples, ignoring missing
+    (NaN) samples
+
+    Args:
+        groups (array): Samples with one row per group
+
+    Returns:
+        NumPy array with the last sample of each group, NaN where all of the
+        samples of a group are missing
+    """
+    present = ~np.isnan(groups)
+    lastInds = groups.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+    return np.where(present.any(axis=1),
+            groups[np.arange(groups.shape[0]), lastInds], np.nan)
+#### End of function last_value
+
+def decimate_metric(metricDict, weights, factor, isTotal=False):
+    """
+    Combines each group of factor consecutive samples of a metric into a
+    single sample. The minimum of a group is the minimum of its minimums and
+    the maximum the maximum of its maximums. The mean is the mean of the means
+    weighted by the length of each window, and the variance is the pooled
+    variance of the group: the weighted mean of the variances plus the
+    weighted variance of the means about the combined mean. As the sums are
+    the sum over processes of each window's value, they are combined like the
+    means. Any other fields are also combined like the means. Every field of a
+    running total (see map_json_common.is_running_total) takes the last value
+    of its group instead, so that the total still ends each combined window
+
+    Args:
+        metricDict (dict): Dictionary of the fields of a metric, e.g. "mins"
+        weights (array): Window weights, as returned by get_window_weights
+        factor (int): Number of consecutive samples to combine
+        isTotal (bool): Indicates that the metric is a running total
+
+    Returns:
+        Dictionary of the combined fields
+    """
+    groups = dict((field, __group_samples(samples, factor))
+            for field, samples in metricDict.items())
+    if isTotal:
+        return dict((field, __to_list(last_value(group)))
+                for field, group in groups.items())
+    decDict = {}
+    for field, group in groups.items():
+        if field == "mins":
+            decDict[field] = np.fmin.reduce(group, axis=1)
+        elif field == "maxs":
+            decDict[field] = np.fmax.reduce(group, axis=1)
+        elif field != "vars":
+            decDict[field] = weighted_mean(group, weights)
+
+    if "vars" in groups:
+        if "means" in groups:
+            deviations = groups["means"] - decDict["means"][:, np.newaxis]
+            # Windows without a mean cannot contribute to the pooled variance
+            decDict["vars"] = weighted_mean(groups["vars"] + deviations**2,
+                    weights)
+        else:
+            decDict["vars"] = weighted_mean(groups["vars"], weights)
+
+    return dict((field, __to_list(values)) for field, values in decDict.items())
+#### End of function decimate_metric
+
+def decimate_profile(profileDict, factor):
+    """
+    Reduces the number of samples of a profile by an integer factor, by
+    combining each group of factor consecutive samples into one (see
+    decimate_metric). The activity percentages are weighted by the length of
+    each window. A combined window starts at the start of its first window,
+    and the last group may contain fewer samples. The info section is left as
+    it is, as the profile still covers the whole run
+
+    Args:
+        profileDict (dict): Dictionary representing the JSON export of a MAP
+                            profile
+        factor (int): Number of consecutive samples to combine
+
+    Returns:
+        Nothing. profileDict is modified in place
+    """
+    assert isinstance(factor, int) and factor > 0
+
+    weights = get_window_weights(profileDict, factor)
+    sampleDict = profileDict["samples"]
+    for metric in sampleDict["metrics"]:
+        sampleDict["metrics"][metric] = decimate_metric(
+                sampleDict["metrics"][metric], weights, factor,
+                mjc.is_running_total(metric))
+    for timeline, activityDict in sampleDict.get("activity", {}).items():
+        for activity in activityDict:
+            activityDict[activity] = __to_list(weighted_mean(
+                __group_samples(activityDict[activity], factor), weights))
+
+    sampleDict["window_start_offsets"] = \
+            mjc.get_window_start_times(profileDict)[::factor]
+    mjc.set_sample_count(profileDict, len(sampleDict["window_start_offsets"]))
+#### End of function decimate_profile
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+
+    Returns:
+        0 if the profile is decimated, or 1 if the factor is invalid
+    """
+    parser = argparse.ArgumentParser(description="Reduces the number of" +
+            " samples in a JSON file by an integer factor, combining each" +
+            " group of consecutive samples into one. Minimums, maximums," +
+            " means, variances, sums and activity percentages are combined" +
+            " so that they describe the same run at a coarser resolution." +
+            " Running totals (metrics named *_total) keep the last value of" +
+            " each group")
+
+    # Add a file to read input from
+    parser.add_argument("infile", help="JSON format file which has been " +
+            "exported from an Arm MAP file")
+    parser.add_argument("factor", help="Number of consecutive samples to" +
+            " combine into one", type=int)
+    parser.add_argument("-o", "--outfile", help="Name of the file to write" +
+            " the decimated profile to. Default is the name of the input" +
+            " file with _dec<factor> added", default=None)
+
+    # Parse the arguments
+    args = parser.parse_args(argv)
+
+    if args.factor < 1:
+        print("Invalid decimation factor " + str(args.factor), file=sys.stderr)
+        return 1
+
+    # Read the JSON file
+    if session is None:
+        session = ProfileSession()
+    profileDict = session.load(args.infile)
+
+    # The profile is decimated in place, so the session no longer holds the
+    # contents of the input file
+    session.evict(args.infile)
+    decimate_profile(profileDict, args.factor)
+
+    outFileName = args.outfile if args.outfile else \
+            generate_out_filename(args.infile, args.factor)
+    with open(outFileName, "w") as f:
+        json.dump(profileDict, f, sort_keys=True, indent=4)
+    session.put(outFileName, profileDict)
+    print("Decimated JSON samples written to " + outFileName)
+    return 0
+#### End of function main
+
+if __name__ == "__main__":
+    sys.exit(main())
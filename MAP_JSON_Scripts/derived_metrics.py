@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Metrics derived from the samples of a MAP profile by an expression, e.g.
+#
+#     lustre_bytes_read / io_reads_rate
+#     mpi_sent.sums / (collective_mpi + point_to_point_mpi)
+#     cpu_time_percentage * threads
+#
+# A name in an expression is a sampled metric, an activity of the main thread
+# or one of the run constants processes, threads and nodes. name.field takes
+# a given field (mins, maxs, means, vars or sums) of a metric, and is
+# otherwise taken from the field being evaluated. timeline.activity takes an
+# activity of another timeline, e.g. worker_threads.openmp. Names which are
+# not identifiers are given as strings, e.g. "my-metric".maxs. Expressions
+# use the arithmetic operators, comparisons and the functions in
+# exprFunctions, and are evaluated on all of the samples at once
+#
+import argparse
+import ast
+import json
+import keyword
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from time_weighting import get_time_weighted_mean
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from plot_data_common import print_table
+
+metricFields = ["mins", "maxs", "means", "vars", "sums"]
+
+def __safe_divide(x, y):
+    # Windows in which nothing was counted give zero rather than NaN or inf
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(y != 0, np.true_divide(x, np.where(y != 0, y, 1.)), 0.)
+#### End of function __safe_divide
+
+def __get_run_constants(profileDict):
+    return {"processes" : get_num_processes(profileDict),
+            "threads" : get_num_threads(profileDict),
+            "nodes" : get_num_nodes(profileDict)}
+#### End of function __get_run_constants
+
+binaryOps = {ast.Add : np.add, ast.Sub : np.subtract, ast.Mult : np.multiply,
+        ast.Div : __safe_divide, ast.Pow : np.power, ast.Mod : np.mod}
+unaryOps = {ast.USub : np.negative, ast.UAdd : np.positive}
+compareOps = {ast.Lt : np.less, ast.LtE : np.less_equal, ast.Gt : np.greater,
+        ast.GtE : np.greater_equal, ast.Eq : np.equal, ast.NotEq : np.not_equal}
+# Functions which can be called in an expression, with the number of
+# arguments each takes
+exprFunctions = {"abs" : (np.abs, 1), "sqrt" : (np.sqrt, 1),
+        "log" : (np.log, 1), "log10" : (np.log10, 1), "exp" : (np.exp, 1),
+        "minimum" : (np.fmin, 2), "maximum" : (np.fmax, 2),
+        "where" : (np.where, 3)}
+
+def is_profile_input(profileDict, name):
+    """
+    Indicates whether a name is exactly that of a sampled metric or of an
+    activity of the main thread of a profile
+
+    Args:
+        profileDict (dict): Dictionary of the JSON export of a MAP profile
+        name (str): Name given in place of a metric
+
+    Returns:
+        True if the profile has a metric or activity with the given name
+    """
+    samples = profileDict["samples"]
+    return name in samples["metrics"] or \
+            name in samples.get("activity", {}).get("main_thread", {})
+#### End of function is_profile_input
+
+def is_expression(metricName, profileDict=None):
+    """
+    Indicates whether a metric name is an expression rather than the name of
+    a single metric or activity. Metric names need not be identifiers (e.g.
+    my-metric or com.vendor.ctr), so when a profile is given a name which it
+    has a metric or activity for is never an expression
+
+    Args:
+        metricName (str): Name given in place of a metric
+        profileDict (dict): Dictionary of the JSON export of a MAP profile to
+            look the name up in. If None, only the form of the name is used
+
+    Returns:
+        True if the name has to be compiled as an expression
+    """
+    if profileDict is not None and is_profile_input(profileDict, metricName):
+        return False
+    metricName = metricName.strip()
+    return not metricName.isidentifier() or keyword.iskeyword(metricName)
+#### End of function is_expression
+
+class ExpressionCache(object):
+    """
+    Values computed from the samples of a profile, keyed by the input or
+    sub-expression and the field, so that inputs shared by several
+    expressions are only read and converted once. A cache is meant to be
+    used for the duration of a single pass over a profile, and is dropped
+    with it, so that no values are kept for profiles evicted from a
+    ProfileSession. The values are also dropped if the profile is changed to
+    a different set of samples (e.g. by truncating it in place)
+    """
+
+    def __init__(self):
+        # Identifies the profile and samples which the values were computed for
+        self.__key = None
+        self.__values = {}
+
+    @staticmethod
+    def __get_key(profileDict):
+        samples = profileDict["samples"]
+        return (id(profileDict), id(samples),
+                id(samples.get("window_start_offsets")),
+                get_sample_count(profileDict))
+
+    def get_values(self, profileDict):
+        """
+        Returns the dictionary of cached values of the given profile
+        """
+        key = self.__get_key(profileDict)
+        if key != self.__key:
+            self.__key = key
+            self.__values = {}
+        return self.__values
+    #### End of function get_values
+
+    def clear(self):
+        self.__key = None
+        self.__values = {}
+    #### End of function clear
+#### End of class ExpressionCache
+
+def get_input_values(profileDict, name, field="means", timeline=None):
+    """
+    Reads an input of an expression, looking the name up as a metric, then
+    as an activity of the main thread and then as a run constant
+
+    Args:
+        profileDict (dict): Dictionary of the JSON export of a MAP profile
+        name (str): Name of a metric, activity or run constant
+        field (str): Field of the metric to read
+        timeline (str): Name of the activity timeline to read from. If given,
+            the name is only looked up as an activity
+
+    Returns:
+        NumPy array of the samples, or a NumPy scalar for a run constant
+
+    Raises:
+        KeyError: If the name is not found in the profile
+    """
+    samples = profileDict["samples"]
+    if timeline is None:
+        if name in samples["metrics"]:
+            if field not in samples["metrics"][name]:
+                raise KeyError("Metric " + name + " has no field " + field)
+            return np.array(samples["metrics"][name][field], dtype=np.float64)
+        timeline = "main_thread"
+        if name in samples.get("activity", {}).get(timeline, {}):
+            return np.array(samples["activity"][timeline][name],
+                    dtype=np.float64)
+        constants = __get_run_constants(profileDict)
+        if name in constants:
+            return np.float64(constants[name])
+        raise KeyError("Unable to find metric " + name + " in JSON profile")
+    try:
+        return np.array(samples["activity"][timeline][name], dtype=np.float64)
+    except KeyError:
+        raise KeyError("Unable to find activity " + timeline + "." + name +
+                " in JSON profile")
+#### End of function get_input_values
+
+class MetricExpression(object):
+    """
+    An expression over the metrics of a profile, compiled once to a tree of
+    NumPy operations. Only the inputs which an expression refers to are read
+    from a profile, and the value of each input and sub-expression is cached
+    per profile and field
+    """
+
+    def __init__(self, text):
+        """
+        Args:
+            text (str): The expression
+
+        Raises:
+            ValueError: If the expression cannot be parsed or uses something
+                other than names, numbers, operators and exprFunctions
+        """
+        self.text = text.strip()
+        try:
+            tree = ast.parse(self.text, mode="eval").body
+        except SyntaxError as err:
+            raise ValueError("Unable to parse expression '" + self.text + "': " +
+                    str(err.msg))
+        # Tuples of (name, field, timeline) of the inputs referred to
+        self.inputs = []
+        self.__evaluate = self.__compile(tree)
+
+    def __compile(self, node):
+        """
+        Returns a function of (profileDict, field, values) which evaluates the
+        given node, where values is the cache of the profile
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            value = np.float64(node.value)
+            return lambda profileDict, field, values : value
+
+        inputRef = self.__get_input(node)
+        if inputRef is not None:
+            self.inputs.append(inputRef)
+            name, fixedField, timeline = inputRef
+            def read(profileDict, field, values):
+                return get_input_values(profileDict, name, fixedField or field,
+                        timeline)
+            return self.__cached(node, read, fixedField is not None)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in binaryOps:
+            func = binaryOps[type(node.op)]
+            args = [self.__compile(node.left), self.__compile(node.right)]
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in unaryOps:
+            func = unaryOps[type(node.op)]
+            args = [self.__compile(node.operand)]
+        elif isinstance(node, ast.Compare) and len(node.ops) == 1 and \
+                type(node.ops[0]) in compareOps:
+            func = compareOps[type(node.ops[0])]
+            args = [self.__compile(node.left), self.__compile(node.comparators[0])]
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+                node.func.id in exprFunctions and not node.keywords:
+            func, numArgs = exprFunctions[node.func.id]
+            if len(node.args) != numArgs:
+                raise ValueError("Function " + node.func.id + " takes " +
+                        str(numArgs) + " argument" + ("s" if numArgs > 1 else
+                            "") + ", not " + str(len(node.args)) + ", in '" +
+                        self.text + "'")
+            args = [self.__compile(arg) for arg in node.args]
+        else:
+            raise ValueError("Unsupported expression '" +
+                    ast.get_source_segment(self.text, node) + "' in '" +
+                    self.text + "'")
+
+        def apply(profileDict, field, values):
+            with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+                return func(*[arg(profileDict, field, values) for arg in args])
+        return self.__cached(node, apply, False)
+    #### End of function __compile
+
+    @staticmethod
+    def __get_input(node):
+        """
+        Returns (name, field, timeline) if the node refers to an input, where
+        field and timeline are None when not given, and None otherwise
+        """
+        if isinstance(node, ast.Name) and node.id not in exprFunctions:
+            return (node.id, None, None)
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return (node.value, None, None)
+        if isinstance(node, ast.Attribute):
+            base = MetricExpression.__get_input(node.value)
+            if base is None or base[1] is not None or base[2] is not None:
+                return None
+            if node.attr in metricFields:
+                return (base[0], node.attr, None)
+            return (node.attr, None, base[0])
+        return None
+    #### End of function __get_input
+
+    @staticmethod
+    def __cached(node, func, fixedField):
+        """
+        Wraps the function evaluating a node so that its value is kept in the
+        cache of the profile. The value of a node which does not depend on
+        the field being evaluated is shared by all of the fields
+        """
+        key = ast.dump(node)
+        def evaluate(profileDict, field, values):
+            cacheKey = (key, None if fixedField else field)
+            if cacheKey not in values:
+                values[cacheKey] = func(profileDict, field, values)
+            return values[cacheKey]
+        return evaluate
+    #### End of function __cached
+
+    def evaluate(self, profileDict, field="means", cache=None):
+        """
+        Evaluates the expression on the samples of a profile
+
+        Args:
+            profileDict (dict): Dictionary of the JSON export of a MAP profile
+            field (str): Field of the metrics used when none is given in the
+                expression
+            cache (ExpressionCache): Cache of the values of the profile. If
+                None, values are only shared within this evaluation
+
+        Returns:
+            NumPy array with the value of each sample
+
+        Raises:
+            KeyError: If the expression refers to something which is not in
+                the profile
+        """
+        assert field in metricFields
+        if cache is None:
+            cache = ExpressionCache()
+        result = self.__evaluate(profileDict, field,
+                cache.get_values(profileDict))
+        if np.ndim(result) == 0:
+            result = np.full(get_sample_count(profileDict), result,
+                    dtype=np.float64)
+        return np.asarray(result, dtype=np.float64)
+    #### End of function evaluate
+#### End of class MetricExpression
+
+# Compiled expressions, keyed by their text
+__compiled = {}
+
+def compile_expression(text):
+    """
+    Compiles an expression, reusing the compiled form of an expression seen
+    before
+
+    Args:
+        text (str): The expression
+
+    Returns:
+        A MetricExpression
+    """
+    if text not in __compiled:
+        __compiled[text] = MetricExpression(text)
+    return __compiled[text]
+#### End of function compile_expression
+
+def get_metric_values(profileDict, metricName, field="means", cache=None):
+    """
+    Gets the samples of a metric, activity or expression of a profile. A name
+    which the profile has a metric or activity for is read as it is, even if
+    it would otherwise parse as an expression
+
+    Args:
+        profileDict (dict): Dictionary of the JSON export of a MAP profile
+        metricName (str): Name of a metric or activity, or an expression
+        field (str): Field of the metrics to use
+        cache (ExpressionCache): Cache of the values of the profile. If None,
+            values are only shared within this evaluation
+
+    Returns:
+        NumPy array with the value of each sample
+    """
+    if not is_expression(metricName, profileDict):
+        # Plain names are read directly, so that keywords can be used
+        if not is_profile_input(profileDict, metricName):
+            metricName = metricName.strip()
+        return np.asarray(get_input_values(profileDict, metricName, field) *
+            np.ones(get_sample_count(profileDict)), dtype=np.float64)
+    return compile_expression(metricName).evaluate(profileDict, field, cache)
+#### End of function get_metric_values
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Evaluates metrics derived" +
+            " from the samples of JSON format MAP files, and shows the time" +
+            " weighted mean, minimum and maximum of each. Expressions can be" +
+            " given wherever a metric name is taken by plot_map_bar.py," +
+            " plot_single_metric.py and generate_sample_csv.py")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="+")
+    parser.add_argument("-e", "--expression", help="Expression to evaluate," +
+            " e.g. 'lustre_bytes_read / io_reads_rate'. Can be given more" +
+            " than once", action="append", required=True)
+    parser.add_argument("--field", help="Field of the metrics to use when" +
+            " none is given in an expression", choices=metricFields,
+            default="means")
+    parser.add_argument("--samples", help="Write the value of each sample" +
+            " in JSON format", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if session is None:
+        session = ProfileSession()
+
+    results = []
+    for infile in args.infiles:
+        profileDict = session.load(infile)
+        # Inputs shared by the expressions are read once per profile
+        cache = ExpressionCache()
+        for text in args.expression:
+            try:
+                values = get_metric_values(profileDict, text, args.field, cache)
+            except ValueError as err:
+                parser.error(str(err))
+            except KeyError as err:
+                parser.error(infile + ": " + err.args[0])
+            result = {"file" : infile, "expression" : text.strip(),
+                    "mean" : get_time_weighted_mean(profileDict, values),
+                    "min" : float(np.nanmin(values)) if len(values) else None,
+                    "max" : float(np.nanmax(values)) if len(values) else None}
+            if args.samples:
+                result["samples"] = values.tolist()
+            results.append(result)
+
+    if args.samples:
+        print(json.dumps(results))
+        return
+
+    print_table(results, ["file", "expression", "mean", "min", "max"])
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import csv
+import json
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from metric_pyramid import get_activity_names, get_metric_series
+from resample_runs import resample_windows
+from detect_phases import detect_phases, select_main_phase
+from periodicity import get_autocorrelation, find_period
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+# Functions giving the samples of each part of the split of the time of an
+# iteration
+iterationParts = [("compute", get_total_cpu_activity), ("mpi", get_mpi_activity),
+        ("io", get_io_activity)]
+scalingFields = ["file", "processes", "threads", "period", "strength",
+        "iterations", "time_mean", "time_std"] + \
+        [part + suffix for part, _ in iterationParts for suffix in ["_mean", "_std"]]
+
+def get_uniform_signals(profileDict, seriesList, numBins=2048, startInd=0,
+        endInd=-1):
+    """
+    Resamples series of samples of a profile onto a grid of equal bins of
+    time, using the time-weighted mean of the windows overlapping each bin
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        seriesList (list): List of the series of samples to resample
+        numBins (int): Number of bins
+        startInd (int): Index of the first sample to include
+        endInd (int): Index of the last sample to include (inclusive). -1
+            indicates the last sample
+
+    Returns:
+        Tuple of (NumPy array of the numBins + 1 edges of the bins in
+        milliseconds, 2-D NumPy array with one row per series)
+    """
+    numSamples = get_sample_count(profileDict)
+    if endInd == -1 or endInd >= numSamples:
+        endInd = numSamples - 1
+    starts = np.array(get_window_start_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    ends = np.array(get_window_end_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    binEdges = np.linspace(starts[startInd], ends[endInd], numBins + 1)
+    signals = np.zeros((len(seriesList), numBins))
+    for row, series in enumerate(seriesList):
+        values = np.array(series, dtype=np.float64)[:numSamples]
+        signals[row] = resample_windows(starts, ends, values, values, values,
+                binEdges)[2]
+    return binEdges, signals
+#### End of function get_uniform_signals
+
+def get_iteration_boundaries(signal, period):
+    """
+    Finds the boundaries of the iterations of a periodic signal. The first
+    boundary is placed at the steepest rise of the signal folded over the
+    period, starting from the first period in which the signal rises by at
+    least half as much as in the period where it rises most, and each later
+    boundary at the steepest rise within a quarter of a period of one period
+    after the one before, so that iterations of varying length are followed.
+    Tracking stops where the signal no longer rises
+
+    Args:
+        signal (array): Samples of the signal at equal intervals
+        period (float): Period of the signal in samples
+
+    Returns:
+        NumPy array of the (increasing) indices at which iterations start
+    """
+    signal = np.where(np.isnan(signal), np.nanmean(signal), signal)
+    numSamples = len(signal)
+    rises = np.diff(signal)
+    periodLen = max(int(round(period)), 2)
+    if numSamples < 2 * periodLen:
+        return np.zeros(0, dtype=np.int64)
+
+    # Fold the rises over the period to find the phase of the boundaries
+    numFolds = (numSamples - 1) // periodLen
+    folded = rises[:numFolds * periodLen].reshape(numFolds, periodLen).mean(axis=0)
+    halfWidth = max(periodLen // 4, 1)
+    # A set up phase before the iterations has no rises at the phase of the
+    # boundaries, so tracking starts at the first rise of at least half the
+    # height of the highest
+    windows = [rises[max(centre - halfWidth, 0):centre + halfWidth + 1] for
+            centre in range(int(np.argmax(folded)), numSamples - 1, periodLen)]
+    heights = np.array([np.max(window) for window in windows])
+    first = int(np.flatnonzero(heights >= 0.5 * heights.max())[0])
+    centre = int(np.argmax(folded)) + first * periodLen
+    boundaries = [max(centre - halfWidth, 0) + 1 +
+            int(np.argmax(windows[first]))]
+    while True:
+        centre = int(round(boundaries[-1] + period))
+        first = max(centre - halfWidth, boundaries[-1] + 1)
+        last = min(centre + halfWidth + 1, numSamples)
+        if first >= last or centre >= numSamples:
+            break
+        # The iterations have stopped if the signal no longer rises
+        window = rises[first - 1:last - 1]
+        if np.max(window) <= 0:
+            break
+        boundaries.append(first + int(np.argmax(window)))
+    return np.array(boundaries, dtype=np.int64)
+#### End of function get_iteration_boundaries
+
+def get_iteration_stats(profileDict, names=None, numBins=2048, startInd=0,
+        endInd=-1, minStrength=0.3):
+    """
+    Detects the dominant period of the activity (and any given metric)
+    timelines of a profile, and gets the time and the split of the time
+    between compute, MPI and I/O of each iteration
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        names (list): Names of the activities and metrics to look for a
+            period in. Default is all of the main thread activities
+        numBins (int): Number of bins of equal time onto which the timelines
+            are resampled
+        startInd (int): Index of the first sample to include
+        endInd (int): Index of the last sample to include (inclusive)
+        minStrength (float): See find_period
+
+    Returns:
+        Dictionary with the fields "period" (in milliseconds, or None if
+        there is no period), "strength" (autocorrelation at the period),
+        "iterations" (list with the "start_time", "time" and percentage of
+        each part in iterationParts of each whole iteration) and "summary"
+        (dictionary of [mean, standard deviation] over the iterations of the
+        time and of each part)
+    """
+    if names is None:
+        names = get_activity_names(profileDict)
+    seriesList = [get_metric_series(profileDict, name)[2] for name in names]
+    partSeries = []
+    for part, func in iterationParts:
+        try:
+            samples = func(profileDict)
+        except KeyError:
+            samples = []
+        partSeries.append(samples if len(samples) > 0 else
+                np.zeros(get_sample_count(profileDict)))
+
+    binEdges, signals = get_uniform_signals(profileDict, seriesList + partSeries,
+            numBins, startInd, endInd)
+    signals, partSignals = signals[:len(seriesList)], signals[len(seriesList):]
+    binWidth = binEdges[1] - binEdges[0]
+    result = {"period" : None, "strength" : None, "iterations" : [],
+            "summary" : {}}
+    if len(seriesList) == 0:
+        return result
+
+    # Signals which do not oscillate (e.g. activities which never happen, or
+    # I/O which only happens while the run is set up) carry no information
+    # about the period, and would hide it in the mean
+    acf = get_autocorrelation(signals)
+    oscillating = [ind for ind in range(len(acf)) if acf[ind, 0] > 0 and
+            find_period(acf[ind], minStrength)[0] is not None]
+    if not oscillating:
+        return result
+    period, strength = find_period(acf[oscillating].mean(axis=0), minStrength)
+    if period is None:
+        return result
+    result["period"] = period * binWidth
+    result["strength"] = strength
+
+    # Follow the iterations in the signal which is most strongly periodic
+    reference = signals[int(np.argmax(acf[:, int(round(period))]))]
+    boundaries = get_iteration_boundaries(reference, period)
+    if len(boundaries) < 2:
+        return result
+    # Mean of each part over the bins of each iteration
+    sums = np.concatenate((np.zeros((len(partSignals), 1)),
+        np.cumsum(np.nan_to_num(partSignals), axis=1)), axis=1)
+    lengths = np.diff(boundaries)
+    partMeans = (sums[:, boundaries[1:]] - sums[:, boundaries[:-1]]) / lengths
+    times = lengths * binWidth
+    for ind in range(len(lengths)):
+        iteration = {"start_time" : float(binEdges[boundaries[ind]]),
+                "time" : float(times[ind])}
+        for partInd, (part, _) in enumerate(iterationParts):
+            iteration[part] = float(partMeans[partInd, ind])
+        result["iterations"].append(iteration)
+
+    result["summary"]["time"] = [float(np.mean(times)), float(np.std(times))]
+    for partInd, (part, _) in enumerate(iterationParts):
+        result["summary"][part] = [float(np.mean(partMeans[partInd])),
+                float(np.std(partMeans[partInd]))]
+    return result
+#### End of function get_iteration_stats
+
+def get_iteration_scaling(fileList, names=None, numBins=2048, mainPhase=False,
+        minStrength=0.3, loadFunc=load_profile):
+    """
+    Gets the iteration statistics of each run of a scaling series
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        names (list): See get_iteration_stats
+        numBins (int): See get_iteration_stats
+        mainPhase (bool): Indicates whether to only use the main phase of
+            each run (see detect_phases.py)
+        minStrength (float): See find_period
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of dictionaries with the fields in scalingFields, sorted by the
+        number of processes and threads
+    """
+    rows = []
+    for filename in fileList:
+        profileDict = loadFunc(filename)
+        startInd, endInd = 0, -1
+        if mainPhase:
+            startInd, endInd = select_main_phase(profileDict,
+                    detect_phases(profileDict))
+        stats = get_iteration_stats(profileDict, names, numBins, startInd,
+                endInd, minStrength)
+        row = {"file" : filename, "processes" : get_num_processes(profileDict),
+                "threads" : get_num_threads(profileDict),
+                "period" : stats["period"], "strength" : stats["strength"],
+                "iterations" : len(stats["iterations"])}
+        for field in ["time"] + [part for part, _ in iterationParts]:
+            mean, std = stats["summary"].get(field, [None, None])
+            row[field + "_mean"] = mean
+            row[field + "_std"] = std
+        rows.append(row)
+    return sorted(rows, key=lambda row: (row["processes"], row["threads"]))
+#### End of function get_iteration_scaling
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Detects the period of the" +
+            " iterations of runs in JSON format MAP files from the" +
+            " autocorrelation of their activity timelines, and reports the" +
+            " time of each iteration and its split between compute, MPI and" +
+            " I/O. Several files are reported as a scaling series")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--metrics", help="Names of the activities and" +
+            " metrics to look for a period in. Default is all of the main" +
+            " thread activities", nargs="+", default=None)
+    parser.add_argument("--bins", help="Number of bins of equal time onto" +
+            " which the timelines are resampled. Default is 2048", type=int,
+            default=2048)
+    parser.add_argument("--mainPhase", help="Only use the main phase of each" +
+            " run, leaving out set up and I/O phases", action="store_true")
+    parser.add_argument("--minStrength", help="Smallest autocorrelation at the" +
+            " period for a run to be taken as periodic. Default is 0.3",
+            type=float, default=0.3)
+    parser.add_argument("--iterations", help="Print the statistics of each" +
+            " iteration rather than a summary of each run", action="store_true")
+    parser.add_argument("--csv", help="Write the report in CSV format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+    if args.bins < 4:
+        parser.error("at least 4 bins are needed")
+
+    if session is None:
+        session = ProfileSession()
+
+    if args.iterations:
+        fields = ["file", "start_time", "time"] + [part for part, _ in
+                iterationParts]
+        rows = []
+        for filename in fileList:
+            profileDict = session.load(filename)
+            startInd, endInd = 0, -1
+            if args.mainPhase:
+                startInd, endInd = select_main_phase(profileDict,
+                        detect_phases(profileDict))
+            stats = get_iteration_stats(profileDict, args.metrics, args.bins,
+                    startInd, endInd, args.minStrength)
+            for iteration in stats["iterations"]:
+                iteration["file"] = filename
+                rows.append(iteration)
+    else:
+        fields = scalingFields
+        rows = get_iteration_scaling(fileList, args.metrics, args.bins,
+                args.mainPhase, args.minStrength, session.load)
+
+    if args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    print(json.dumps(rows, indent=4))
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import copy
+import json
+import os
+import sys
+import numpy as np
+import map_json_common as mjc
+from metric_pyramid import get_activity_names, get_metric_series
+from time_weighting import get_window_lengths, get_time_weighted_mean
+from periodicity import get_autocorrelation, find_period
+from truncate_json import generate_out_filename
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+# Activities which mark a phase as set up or I/O rather than the main
+# computation of a run
+defaultExcludedActivities = ["io_reads", "io_writes", "io_reads_openmp",
+        "io_writes_openmp"]
+
+def get_dominant_period(signals, minStrength=0.3, peakFraction=0.8):
+    """
+    Finds the length of the iterations of a run from the autocorrelation of
+    the changes between consecutive samples, summed over the signals. Taking
+    the changes removes the steps between phases and slow trends, so that a
+    set up or I/O phase does not hide the period of the iterations. The peak
+    of the autocorrelation is chosen as by periodicity.find_period
+
+    Args:
+        signals (array): 2-D array with one row per signal, scaled so that the
+            noise of each has unit variance
+        minStrength (float): Smallest autocorrelation at the peak for the run
+            to be taken as periodic
+        peakFraction (float): Fraction of the highest peak which the first
+            peak has to reach to be taken as the period
+
+    Returns:
+        Period in samples, or None if the signals are not periodic. At least
+        three periods fit in the samples
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    changes = np.diff(signals, axis=1)
+    numChanges = changes.shape[1]
+    if signals.shape[0] == 0 or numChanges < 8:
+        return None
+    acf = get_autocorrelation(changes, summed=True)
+    period, _ = find_period(acf, minStrength, peakFraction, numChanges // 3)
+    return None if period is None else int(round(period))
+#### End of function get_dominant_period
+
+def smooth_signals(signals, period):
+    """
+    Averages each signal over a window of one period centred on each sample,
+    so that the variation within the iterations of a run is removed while the
+    changes between its phases are kept. The windows are cut short at the
+    ends of the signals
+
+    Args:
+        signals (array): 2-D array with one row per signal
+        period (int): Length of the window in samples
+
+    Returns:
+        2-D NumPy array of the smoothed signals
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    numSamples = signals.shape[1]
+    prefix = np.concatenate((np.zeros((signals.shape[0], 1)),
+        np.cumsum(signals, axis=1)), axis=1)
+    first = np.clip(np.arange(numSamples) - period // 2, 0, numSamples)
+    last = np.clip(first + period, 0, numSamples)
+    return (prefix[:, last] - prefix[:, first]) / np.maximum(last - first, 1)
+#### End of function smooth_signals
+
+def get_phase_signals(profileDict, metrics=None, includeActivity=True,
+        period=None):
+    """
+    Gets the signals in which to look for changes of phase: the percentages of
+    each main thread activity and the means of the given metrics. Each signal
+    is scaled by an estimate of its noise, taken from the median absolute
+    difference between consecutive samples, so that signals of different
+    units are comparable. Signals which do not vary are left out.
+
+    The activity of a run which iterates changes within each iteration, which
+    would otherwise be taken as a phase each time. If the run is periodic the
+    signals are averaged over one period, and scaled by the variation about
+    that average, so only changes between iterations are seen
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metrics (list): Names of metrics to include
+        includeActivity (bool): Indicates whether to include the activities
+        period (int): Length of the iterations in samples. Default is to
+            detect it with get_dominant_period. Values below two indicate
+            that the signals should not be averaged
+
+    Returns:
+        Tuple of (2-D NumPy array with one row per signal and one column per
+        sample, period in samples or None if the signals were not averaged).
+        Missing samples are zero
+    """
+    names = list(metrics) if metrics else []
+    if includeActivity:
+        names += get_activity_names(profileDict)
+    numSamples = mjc.get_sample_count(profileDict)
+
+    signals = []
+    for name in names:
+        signal = get_metric_series(profileDict, name)[2][:numSamples]
+        signal = np.where(np.isnan(signal), 0., signal)
+        # For Gaussian noise the median absolute difference is 0.954 sigma
+        noise = np.median(np.abs(np.diff(signal))) / 0.954 if len(signal) > 1 \
+                else 0.
+        if noise <= 0:
+            noise = np.std(signal)
+        if noise > 0:
+            signals.append(signal / noise)
+    signals = np.array(signals, dtype=np.float64).reshape(len(signals),
+            numSamples)
+
+    if period is None:
+        period = get_dominant_period(signals)
+    if period is None or period < 2:
+        return signals, None
+    period = int(period)
+    smoothed = smooth_signals(signals, period)
+    # The variation within an iteration is taken as the noise. The averages
+    # of neighbouring samples share most of their samples, so the noise is
+    # not reduced by the averaging, which keeps the cost of a split in units
+    # of independent periods
+    noise = np.median(np.abs(signals - smoothed), axis=1) / 0.6745
+    noise = np.where(noise > 0, noise, 1.)
+    return smoothed / noise[:, np.newaxis], period
+#### End of function get_phase_signals
+
+def __get_split(prefixW, prefixWX, prefixWX2, start, end, minSize):
+    """
+    Finds the split of the samples [start, end) which most reduces the sum
+    over the signals of the weighted squared deviations from the mean of each
+    part, using the prefix sums of the weights, the weighted signals and the
+    weighted squares of the signals
+
+    Returns:
+        Tuple of (reduction in cost, index of the first sample of the second
+        part), or (0, None) if the samples cannot be split
+    """
+    def cost(first, last):
+        first = np.atleast_1d(first)
+        last = np.atleast_1d(last)
+        weights = prefixW[last] - prefixW[first]
+        sums = prefixWX[:, last] - prefixWX[:, first]
+        squares = prefixWX2[:, last] - prefixWX2[:, first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weights > 0, squares - sums**2 / weights,
+                    0.).sum(axis=0)
+
+    splits = np.arange(start + minSize, end - minSize + 1)
+    if len(splits) == 0:
+        return 0., None
+    gains = cost(start, end) - cost(start, splits) - cost(splits, end)
+    best = int(np.argmax(gains))
+    return float(gains[best]), int(splits[best])
+#### End of function __get_split
+
+def find_change_points(signals, weights=None, penalty=None, minSize=5,
+        maxPhases=None):
+    """
+    Finds the points at which the means of a set of signals change, by binary
+    segmentation: the segment whose best split most reduces the cost is split
+    until no split reduces the cost by more than the penalty. The cost of
+    every split of a segment is found at once from prefix sums, so each round
+    takes time linear in the length of the segment
+
+    Args:
+        signals (array): 2-D array with one row per signal, scaled so that the
+            noise of each has unit variance
+        weights (array): Weight of each sample, e.g. the length of its window.
+            Default is to weight the samples equally
+        penalty (float): Reduction in cost needed to accept a change point.
+            Default is 2 log(n) per signal, the Bayesian information criterion
+            for a change in mean
+        minSize (int): Smallest number of samples in a phase
+        maxPhases (int): Largest number of phases. Default is no limit
+
+    Returns:
+        Sorted list of the indices at which new phases start, not including 0
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    numSignals, numSamples = signals.shape
+    if numSignals == 0 or numSamples == 0:
+        return []
+    if weights is None:
+        weights = np.ones(numSamples)
+    weights = np.asarray(weights, dtype=np.float64)
+    # Weights are scaled to a mean of one so that the penalty does not
+    # depend on the units of time
+    if weights.sum() > 0:
+        weights = weights * (numSamples / weights.sum())
+    if penalty is None:
+        penalty = 2. * np.log(max(numSamples, 2)) * numSignals
+    minSize = max(int(minSize), 1)
+
+    prefixW = np.concatenate(([0.], np.cumsum(weights)))
+    prefixWX = np.concatenate((np.zeros((numSignals, 1)),
+        np.cumsum(signals * weights, axis=1)), axis=1)
+    prefixWX2 = np.concatenate((np.zeros((numSignals, 1)),
+        np.cumsum(signals**2 * weights, axis=1)), axis=1)
+
+    changePoints = []
+    # Candidate splits of each segment, as (gain, split, start, end)
+    candidates = [__get_split(prefixW, prefixWX, prefixWX2, 0, numSamples,
+        minSize) + (0, numSamples)]
+    while candidates and (maxPhases is None or len(changePoints) + 1 < maxPhases):
+        best = max(range(len(candidates)), key=lambda ind: candidates[ind][0])
+        gain, split, start, end = candidates.pop(best)
+        if split is None or gain <= penalty:
+            break
+        changePoints.append(split)
+        for first, last in [(start, split), (split, end)]:
+            candidates.append(__get_split(prefixW, prefixWX, prefixWX2, first,
+                last, minSize) + (first, last))
+    return sorted(changePoints)
+#### End of function find_change_points
+
+def detect_phases(profileDict, metrics=None, includeActivity=True,
+        penalty=None, minSize=5, maxPhases=None, period=None):
+    """
+    Detects the phases of a profiled run from changes in its activity
+    breakdown and in the given metrics, weighting each sample by the length
+    of its window. The signals of a periodic run are averaged over a period
+    (see get_phase_signals), and no phase is shorter than the period
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metrics (list): Names of metrics to include
+        includeActivity (bool): Indicates whether to include the activities
+        penalty (float): See find_change_points
+        minSize (int): Smallest number of samples in a phase
+        maxPhases (int): Largest number of phases
+        period (int): Length of the iterations in samples. See
+            get_phase_signals
+
+    Returns:
+        List of tuples of (startInd, endInd) of each phase, where both indices
+        are inclusive as for truncate_profile
+    """
+    signals, period = get_phase_signals(profileDict, metrics,
+            includeActivity, period)
+    numSamples = signals.shape[1]
+    if period is not None:
+        minSize = max(minSize, period)
+    changePoints = find_change_points(signals, get_window_lengths(profileDict),
+            penalty, minSize, maxPhases)
+    bounds = [0] + changePoints + [numSamples]
+    return [(bounds[ind], bounds[ind + 1] - 1) for ind in range(len(bounds) - 1)
+            if bounds[ind + 1] > bounds[ind]]
+#### End of function detect_phases
+
+def get_phase_summary(profileDict, phases):
+    """
+    Gets the times and the mean activity breakdown of each phase of a run
+
+    Returns:
+        List of dictionaries with the fields "start_ind", "end_ind",
+        "start_time", "end_time" and "activity", a dictionary of the time
+        weighted mean percentage of each main thread activity
+    """
+    startTimes = mjc.get_window_start_times(profileDict)
+    endTimes = mjc.get_window_end_times(profileDict)
+    activities = get_activity_names(profileDict)
+    series = [get_metric_series(profileDict, name)[2] for name in activities]
+    summary = []
+    for startInd, endInd in phases:
+        means = get_time_weighted_mean(profileDict, series, startInd,
+                endInd + 1) if series else []
+        summary.append({"start_ind" : startInd, "end_ind" : endInd,
+            "start_time" : startTimes[startInd], "end_time" : endTimes[endInd],
+            "activity" : dict((name, float(mean)) for name, mean in
+                zip(activities, means))})
+    return summary
+#### End of function get_phase_summary
+
+def select_main_phase(profileDict, phases,
+        excludedActivities=defaultExcludedActivities, maxExcluded=50.):
+    """
+    Selects the main phase of a run: the longest phase in which the excluded
+    activities (by default I/O) take less than the given percentage of the
+    time. Set up and I/O phases are therefore passed over
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        phases (list): Phases as returned by detect_phases
+        excludedActivities (list): Names of main thread activities which mark
+            a phase as not being the main phase
+        maxExcluded (float): Largest percentage of time in the excluded
+            activities for the main phase
+
+    Returns:
+        Tuple of (startInd, endInd) of the main phase. The longest phase is
+        chosen if every phase is dominated by the excluded activities
+    """
+    assert len(phases) > 0
+
+    summary = get_phase_summary(profileDict, phases)
+    lengths = [phase["end_time"] - phase["start_time"] for phase in summary]
+    allowed = [ind for ind, phase in enumerate(summary) if
+            sum(phase["activity"].get(name, 0.) for name in excludedActivities)
+            < maxExcluded]
+    if not allowed:
+        allowed = range(len(phases))
+    return phases[max(allowed, key=lambda ind: lengths[ind])]
+#### End of function select_main_phase
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Detects the phases of runs" +
+            " in JSON format MAP files from changes in the activity breakdown" +
+            " and in selected metrics, and prints the sample indices of each" +
+            " phase. The main phase of each run, the longest which is not" +
+            " dominated by I/O, can be truncated to a new file")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--metrics", help="Names of metrics to detect changes" +
+            " in as well as the activities", nargs="+", default=None)
+    parser.add_argument("--noActivity", help="Only detect changes in the" +
+            " metrics given with --metrics", action="store_true")
+    parser.add_argument("--penalty", help="Reduction in cost needed to accept" +
+            " a change of phase. Larger values give fewer phases. Default is" +
+            " 2 log(number of samples) per signal", type=float, default=None)
+    parser.add_argument("--minSize", help="Smallest number of samples in a" +
+            " phase. Default is 5", type=int, default=5)
+    parser.add_argument("--maxPhases", help="Largest number of phases",
+            type=int, default=None)
+    parser.add_argument("--period", help="Length in samples of the" +
+            " iterations of the runs, over which the signals are averaged so" +
+            " that each iteration is not taken as a phase. Default is to" +
+            " detect it for each run. 0 does not average the signals",
+            type=int, default=None)
+    parser.add_argument("--exclude", help="Main thread activities which mark a" +
+            " phase as not being the main phase. Default is " +
+            " ".join(defaultExcludedActivities), nargs="+",
+            default=defaultExcludedActivities)
+    parser.add_argument("--truncate", help="Write the main phase of each run" +
+            " to a new file, as truncate_json.py does", action="store_true")
+    parser.add_argument("--outList", help="With --truncate, write the names of" +
+            " the truncated files to this list file, e.g. for the scaling" +
+            " plots", default=None)
+    parser.add_argument("--json", help="Print the phases in JSON format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+    if args.noActivity and not args.metrics:
+        parser.error("--noActivity needs metrics given with --metrics")
+    if args.outList and not args.truncate:
+        parser.error("--outList can only be used with --truncate")
+
+    if session is None:
+        session = ProfileSession()
+    report = {}
+    outFileNames = []
+    for infile in fileList:
+        profileDict = session.load(infile)
+        phases = detect_phases(profileDict, args.metrics, not args.noActivity,
+                args.penalty, args.minSize, args.maxPhases, args.period)
+        mainPhase = select_main_phase(profileDict, phases, args.exclude)
+        report[infile] = {"phases" : get_phase_summary(profileDict, phases),
+                "main_phase" : list(mainPhase)}
+
+        if args.truncate:
+            # Truncate a copy, as the dictionaries of the session are shared
+            truncDict = copy.deepcopy(profileDict)
+            mjc.truncate_profile(truncDict, mainPhase[0], mainPhase[1])
+            outFileName = generate_out_filename(infile, mainPhase[0],
+                    mainPhase[1])
+            with open(outFileName, "w") as f:
+                json.dump(truncDict, f, sort_keys=True, indent=4)
+            session.put(outFileName, truncDict)
+            outFileNames.append(outFileName)
+            report[infile]["truncated_file"] = outFileName
+
+    if args.outList:
+        with open(args.outList, "w") as f:
+            for outFileName in outFileNames:
+                f.write(outFileName + "\n")
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+    for infile in fileList:
+        print(infile)
+        for phase in report[infile]["phases"]:
+            isMain = [phase["start_ind"], phase["end_ind"]] == \
+                    report[infile]["main_phase"]
+            print("    samples " + str(phase["start_ind"]) + "-" +
+                    str(phase["end_ind"]) + ", time " + str(phase["start_time"]) +
+                    "-" + str(phase["end_time"]) + " ms" +
+                    (" (main phase)" if isMain else ""))
+        if "truncated_file" in report[infile]:
+            print("    main phase written to " + report[infile]["truncated_file"])
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Comparison of a MAP profile against a baseline, for use as a regression
+# gate. The exit status of the script is 1 if any difference is over its
+# threshold, so that it can fail a CI job
+#
+import argparse
+import csv
+import json
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from integrate_rates import get_rate_metric_names, get_rate_scale
+from metric_pyramid import get_activity_names
+from resample_runs import resample_window_means
+from time_weighting import get_time_weighted_mean, get_time_weighted_total
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from plot_data_common import print_table
+
+# Kinds of value compared. mean is the time weighted mean of a metric, total
+# the integral over the run of a rate metric, activity the time weighted
+# percentage of a main thread activity and run a value of the whole run
+diffKinds = ["run", "mean", "total", "activity"]
+diffFields = ["kind", "name", "baseline", "current", "delta", "relative_delta",
+        "shape_delta", "status"]
+
+def get_sample_matrix(profileDict, names, sectionFunc):
+    """
+    Gets the means of the samples of a list of metrics or activities as a 2-D
+    array with one row per name, with NaN for missing samples
+    """
+    section = sectionFunc(profileDict)
+    numSamples = get_sample_count(profileDict)
+    values = np.full((len(names), numSamples), np.nan)
+    for row, name in enumerate(names):
+        samples = section[name]
+        if isinstance(samples, dict):
+            samples = samples["means"]
+        samples = np.array(samples[:numSamples], dtype=np.float64)
+        values[row, :len(samples)] = samples
+    return values
+#### End of function get_sample_matrix
+
+def __get_activity_section(profileDict):
+    return profileDict["samples"]["activity"]["main_thread"]
+#### End of function __get_activity_section
+
+def get_profile_values(profileDict, metrics=None, numBins=100):
+    """
+    Gets the values of a profile which are compared by diff_profiles, with
+    the arithmetic done for all of the metrics of each kind at once
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metrics (list): Names of the metrics to compare. Default is all of
+            them. Rate metrics among them are also compared by their totals
+        numBins (int): Number of bins of normalised time onto which the means
+            are resampled to compare the shape of their timelines
+
+    Returns:
+        Dictionary keyed by each kind in diffKinds of tuples of (list of
+        names, NumPy array of values, 2-D NumPy array of the resampled
+        timeline of each name or None)
+    """
+    metricDict = get_samples(profileDict)
+    if metrics is None:
+        metrics = list(metricDict)
+    metrics = [metric for metric in metrics if metric in metricDict]
+    activities = get_activity_names(profileDict)
+    rates = [metric for metric in get_rate_metric_names(profileDict)
+            if metric in metrics]
+
+    numSamples = get_sample_count(profileDict)
+    starts = np.array(get_window_start_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    ends = np.array(get_window_end_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    # Timelines are compared over the fraction of each run's runtime
+    if numSamples > 0 and ends[-1] > starts[0]:
+        runStart, runLength = starts[0], ends[-1] - starts[0]
+        starts = (starts - runStart) / runLength
+        ends = (ends - runStart) / runLength
+    binEdges = np.linspace(0., 1., numBins + 1)
+
+    values = {"run" : (["runtime"], np.array([get_runtime(profileDict)],
+        dtype=np.float64), None)}
+    for kind, names, sectionFunc in [("mean", metrics, get_samples),
+            ("activity", activities, __get_activity_section)]:
+        samples = get_sample_matrix(profileDict, names, sectionFunc)
+        if len(names) == 0 or numSamples == 0:
+            values[kind] = (names, np.full(len(names), np.nan), None)
+            continue
+        values[kind] = (names, get_time_weighted_mean(profileDict, samples),
+                resample_window_means(starts, ends, samples, binEdges))
+        if kind == "mean" and len(rates) > 0:
+            rows = [names.index(rate) for rate in rates]
+            scales = np.array([get_rate_scale(profileDict, rate) for rate in
+                rates], dtype=np.float64)
+            values["total"] = (rates, get_time_weighted_total(profileDict,
+                samples[rows]) * scales, None)
+    values.setdefault("total", ([], np.zeros(0), None))
+    return values
+#### End of function get_profile_values
+
+def __align(baseNames, curNames):
+    """
+    Returns the union of two lists of names, keeping the order of the first,
+    along with the position of each name in each list (-1 if missing)
+    """
+    names = list(baseNames) + [name for name in curNames if name not in
+            set(baseNames)]
+    baseInds = dict((name, ind) for ind, name in enumerate(baseNames))
+    curInds = dict((name, ind) for ind, name in enumerate(curNames))
+    return names, np.array([baseInds.get(name, -1) for name in names],
+            dtype=np.int64), np.array([curInds.get(name, -1) for name in
+                names], dtype=np.int64)
+#### End of function __align
+
+def __take(values, inds):
+    # Values at the given positions, with NaN at -1
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return np.full(len(inds), np.nan)
+    return np.where(inds >= 0, values[np.maximum(inds, 0)], np.nan)
+#### End of function __take
+
+def diff_profiles(baseline, current, metrics=None, numBins=100,
+        loadFunc=load_profile):
+    """
+    Compares a profile against a baseline. Metrics and activities are
+    matched by name, and their timelines are compared on a common grid of
+    normalised time
+
+    Args:
+        baseline: Name of the JSON export of the baseline MAP profile, or
+            the dictionary of values representing it
+        current: Name or dictionary of the profile to compare
+        metrics (list): Names of the metrics to compare. Default is all of
+            them
+        numBins (int): See get_profile_values
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Dictionary keyed by each kind in diffKinds of dictionaries with the
+        fields "names" (list), and "baseline", "current", "delta" (current -
+        baseline), "relative_delta" (delta / |baseline|) and "shape_delta"
+        (largest difference of the resampled timelines relative to the
+        largest absolute value of the baseline timeline), all NumPy arrays.
+        Values missing from one of the profiles are NaN. Changes from a
+        baseline of zero are infinite relative changes
+    """
+    baseDict = baseline if isinstance(baseline, dict) else loadFunc(baseline)
+    curDict = current if isinstance(current, dict) else loadFunc(current)
+    baseValues = get_profile_values(baseDict, metrics, numBins)
+    curValues = get_profile_values(curDict, metrics, numBins)
+
+    diffs = {}
+    for kind in diffKinds:
+        baseNames, baseVals, baseBins = baseValues[kind]
+        curNames, curVals, curBins = curValues[kind]
+        names, baseInds, curInds = __align(baseNames, curNames)
+        base = __take(baseVals, baseInds)
+        cur = __take(curVals, curInds)
+        shape = np.full(len(names), np.nan)
+        if baseBins is not None and curBins is not None:
+            both = (baseInds >= 0) & (curInds >= 0)
+            baseRows = baseBins[baseInds[both]]
+            curRows = curBins[curInds[both]]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scale = np.fmax.reduce(np.abs(baseRows), axis=1)
+                largest = np.fmax.reduce(np.abs(curRows - baseRows), axis=1)
+                # A timeline which is zero throughout the baseline only
+                # matches one which is also zero
+                shape[both] = np.where(scale > 0, largest / scale,
+                        np.where(largest > 0, np.inf, largest))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Any change from a baseline of zero is an infinite relative
+            # change, so that it cannot pass a threshold
+            relative = np.where(base != 0, (cur - base) / np.abs(base),
+                    np.where(cur == base, 0., np.copysign(np.inf, cur - base)))
+        diffs[kind] = {"names" : names, "baseline" : base, "current" : cur,
+                "delta" : cur - base, "relative_delta" : relative,
+                "shape_delta" : shape}
+    return diffs
+#### End of function diff_profiles
+
+def get_diff_status(diffs, threshold=0.1, activityThreshold=5.,
+        shapeThreshold=None, metricThresholds={}, increasesOnly=False):
+    """
+    Checks the differences between two profiles against thresholds
+
+    Args:
+        diffs (dict): Differences returned by diff_profiles
+        threshold (float): Largest relative change allowed in the runtime and
+            in the mean or total of a metric
+        activityThreshold (float): Largest change allowed in the percentage
+            of time spent in an activity, in percentage points
+        shapeThreshold (float): Largest relative difference allowed between
+            the timelines of a metric or activity. None indicates that the
+            shapes are not checked
+        metricThresholds (dict): Thresholds which replace threshold or
+            activityThreshold for the given names
+        increasesOnly (bool): Indicates whether only increases fail
+
+    Returns:
+        Dictionary keyed by kind of NumPy arrays of the status of each name:
+        "pass", "fail", or "missing" if it is only in one of the profiles
+    """
+    statuses = {}
+    for kind, diff in diffs.items():
+        names = diff["names"]
+        isActivity = kind == "activity"
+        changes = diff["delta"] if isActivity else diff["relative_delta"]
+        limits = np.array([metricThresholds.get(name, activityThreshold if
+            isActivity else threshold) for name in names], dtype=np.float64)
+        if not increasesOnly:
+            changes = np.abs(changes)
+        with np.errstate(invalid="ignore"):
+            failed = changes > limits
+            if shapeThreshold is not None and kind != "run":
+                failed |= diff["shape_delta"] > shapeThreshold
+        missing = np.isnan(diff["baseline"]) | np.isnan(diff["current"])
+        statuses[kind] = np.where(missing, "missing", np.where(failed, "fail",
+            "pass"))
+    return statuses
+#### End of function get_diff_status
+
+def get_diff_report(diffs, statuses):
+    """
+    Gets the rows of the report of a comparison, one per value compared
+
+    Returns:
+        List of dictionaries with the fields in diffFields
+    """
+    rows = []
+    for kind in diffKinds:
+        diff = diffs[kind]
+        for ind, name in enumerate(diff["names"]):
+            row = {"kind" : kind, "name" : name,
+                    "status" : str(statuses[kind][ind])}
+            for field in diffFields[2:-1]:
+                value = float(diff[field][ind])
+                # Infinite relative changes from a baseline of zero are
+                # written as null, as JSON has no infinity
+                row[field] = value if np.isfinite(value) else None
+            rows.append(row)
+    return rows
+#### End of function get_diff_report
+
+def __parse_thresholds(parser, thresholdList):
+    thresholds = {}
+    for item in thresholdList:
+        name, sep, value = item.rpartition("=")
+        try:
+            thresholds[name] = float(value)
+        except ValueError:
+            sep = ""
+        if not sep or not name:
+            parser.error("thresholds must be given as NAME=VALUE, not " + item)
+    return thresholds
+#### End of function __parse_thresholds
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+
+    Returns:
+        0 if every difference is within its threshold, otherwise 1
+    """
+    parser = argparse.ArgumentParser(description="Compares a JSON format MAP" +
+            " file against a baseline, matching metrics by name. The runtime," +
+            " the time weighted mean of each metric, the total of each rate" +
+            " metric and the percentage of time in each activity are" +
+            " compared, and each difference checked against a threshold." +
+            " The exit status is 1 if any difference is over its threshold")
+    parser.add_argument("baseline", help="JSON export of the baseline MAP file")
+    parser.add_argument("current", help="JSON export of the MAP file to compare")
+    parser.add_argument("--metrics", help="Names of the metrics to compare." +
+            " Default is all of them", nargs="+", default=None)
+    parser.add_argument("--threshold", help="Largest relative change allowed" +
+            " in the runtime and in the mean or total of a metric. Default is" +
+            " 0.1", type=float, default=0.1)
+    parser.add_argument("--activityThreshold", help="Largest change allowed in" +
+            " the percentage of time in an activity, in percentage points." +
+            " Default is 5", type=float, default=5.)
+    parser.add_argument("--shapeThreshold", help="Largest difference allowed" +
+            " between the timelines of a metric on a grid of normalised time," +
+            " relative to the peak of the baseline. Default is not to check" +
+            " the timelines", type=float, default=None)
+    parser.add_argument("--metricThreshold", help="Threshold for a single" +
+            " metric or activity, as NAME=VALUE. May be repeated",
+            action="append", default=[])
+    parser.add_argument("--bins", help="Number of bins of normalised time on" +
+            " which timelines are compared. Default is 100", type=int,
+            default=100)
+    parser.add_argument("--increasesOnly", help="Only fail on increases, for" +
+            " metrics where smaller is better", action="store_true")
+    parser.add_argument("--failuresOnly", help="Only report the values which" +
+            " fail or are missing", action="store_true")
+    outGroup = parser.add_mutually_exclusive_group()
+    outGroup.add_argument("--csv", help="Write the report in CSV format",
+            action="store_true")
+    outGroup.add_argument("--table", help="Write the report as a table",
+            action="store_true")
+    parser.add_argument("-o", "--outfile", help="File to write the report to." +
+            " Default is standard output", default=None)
+
+    args = parser.parse_args(argv)
+    if args.bins < 1:
+        parser.error("the number of bins must be positive")
+    if args.table and args.outfile:
+        parser.error("--table writes to standard output")
+    metricThresholds = __parse_thresholds(parser, args.metricThreshold)
+
+    if session is None:
+        session = ProfileSession()
+    if args.metrics:
+        knownMetrics = set(get_samples(session.load(args.baseline))) | \
+                set(get_samples(session.load(args.current)))
+        unknown = [metric for metric in args.metrics if metric not in
+                knownMetrics]
+        if unknown:
+            parser.error("metrics not found in either profile: " +
+                    " ".join(unknown))
+    diffs = diff_profiles(args.baseline, args.current, args.metrics, args.bins,
+            session.load)
+    statuses = get_diff_status(diffs, args.threshold, args.activityThreshold,
+            args.shapeThreshold, metricThresholds, args.increasesOnly)
+    rows = get_diff_report(diffs, statuses)
+    passed = all(row["status"] != "fail" for row in rows)
+    if args.failuresOnly:
+        rows = [row for row in rows if row["status"] != "pass"]
+
+    outFile = open(args.outfile, "w") if args.outfile else sys.stdout
+    try:
+        if args.csv:
+            writer = csv.DictWriter(outFile, fieldnames=diffFields)
+            writer.writeheader()
+            writer.writerows(rows)
+        elif args.table:
+            print_table(rows, diffFields)
+            print("")
+            print("PASSED" if passed else "FAILED")
+        else:
+            json.dump({"baseline" : args.baseline, "current" : args.current,
+                "passed" : passed, "results" : rows}, outFile, indent=4)
+            outFile.write("\n")
+    finally:
+        if args.outfile:
+            outFile.close()
+    return 0 if passed else 1
+#### End of function main
+
+if __name__ == "__main__":
+    sys.exit(main())
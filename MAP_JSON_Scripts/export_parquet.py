@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import os
+import sys
+import numpy as np
+from map_json_common import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+sampleFields = ["mins", "maxs", "means", "vars", "sums"]
+exportFormats = ["parquet", "arrow"]
+
+def get_long_format_columns(profileDict, fields=sampleFields,
+        includeActivity=True):
+    """
+    Gets the samples of a MAP profile in long format, with one row per
+    sample of each field of each metric. Activity timelines are included as
+    rows where the metric is the activity name (e.g. normal_compute) and the
+    field is the timeline (e.g. main_thread)
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        fields (list): Fields of the sampled metrics to include
+        includeActivity (bool): Indicates whether activity timelines are
+            included
+
+    Returns:
+        Tuple of (metricNames, fieldNames, columns), where columns is a
+        dictionary of NumPy arrays with the keys "metric" and "field" (indices
+        into metricNames and fieldNames), "sample", "time" and "value"
+    """
+    assert isinstance(profileDict, dict)
+
+    sampleCount = get_sample_count(profileDict)
+    sampleInds = np.arange(sampleCount, dtype=np.int32)
+    times = np.asarray(get_window_start_times(profileDict),
+            dtype=np.float64)[:sampleCount]
+
+    # Gather the (metric, field, values) of each series
+    series = []
+    metricDict = get_samples(profileDict)
+    for metric in sorted(metricDict):
+        for field in fields:
+            if field in metricDict[metric]:
+                series.append((metric, field, metricDict[metric][field]))
+    if includeActivity:
+        activityDict = profileDict["samples"].get("activity", {})
+        for timeline in sorted(activityDict):
+            for activity in sorted(activityDict[timeline]):
+                series.append((activity, timeline,
+                    activityDict[timeline][activity]))
+
+    metricNames = sorted(set(item[0] for item in series))
+    fieldNames = sorted(set(item[1] for item in series))
+    metricInds = dict((name, ind) for ind, name in enumerate(metricNames))
+    fieldInds = dict((name, ind) for ind, name in enumerate(fieldNames))
+
+    numSeries = len(series)
+    values = np.empty((numSeries, sampleCount), dtype=np.float64)
+    for ind, (_, _, samples) in enumerate(series):
+        # Missing values (null in the JSON) become NaN
+        values[ind] = np.array(samples[:sampleCount], dtype=np.float64)
+
+    columns = {
+            "metric" : np.repeat(np.array([metricInds[item[0]] for item in series],
+                dtype=np.int32), sampleCount),
+            "field" : np.repeat(np.array([fieldInds[item[1]] for item in series],
+                dtype=np.int32), sampleCount),
+            "sample" : np.tile(sampleInds, numSeries),
+            "time" : np.tile(times, numSeries),
+            "value" : values.ravel()
+            }
+    return metricNames, fieldNames, columns
+#### End of function get_long_format_columns
+
+def get_long_format_table(profileDict, runId, fields=sampleFields,
+        includeActivity=True):
+    """
+    Gets the samples of a MAP profile as an Arrow table in long format, with
+    the columns run_id, metric, field, sample, time and value. The string
+    columns are dictionary encoded and the time is in milliseconds from the
+    start of the run
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        runId (str): Identifier of the run
+        fields (list): Fields of the sampled metrics to include
+        includeActivity (bool): Indicates whether activity timelines are
+            included
+
+    Returns:
+        A pyarrow.Table
+    """
+    import pyarrow as pa
+
+    metricNames, fieldNames, columns = get_long_format_columns(profileDict,
+            fields, includeActivity)
+    numRows = len(columns["value"])
+    return pa.table({
+        "run_id" : pa.DictionaryArray.from_arrays(
+            np.zeros(numRows, dtype=np.int32), pa.array([runId])),
+        "metric" : pa.DictionaryArray.from_arrays(columns["metric"],
+            pa.array(metricNames, type=pa.string())),
+        "field" : pa.DictionaryArray.from_arrays(columns["field"],
+            pa.array(fieldNames, type=pa.string())),
+        "sample" : pa.array(columns["sample"]),
+        "time" : pa.array(columns["time"]),
+        "value" : pa.array(columns["value"])
+        })
+#### End of function get_long_format_table
+
+def write_long_format_dataset(fileList, outDir, fields=sampleFields,
+        includeActivity=True, fmt="parquet", compression="zstd", runIds=None,
+        loadFunc=load_profile):
+    """
+    Writes the samples of a list of MAP profiles to a dataset partitioned by
+    run, in the directory layout outDir/run_id=<run id>/. Profiles are read and
+    written one at a time, and the partition of a run which has already been
+    exported is replaced
+
+    Args:
+        fileList (list): List of the names of JSON exports of MAP profiles
+        outDir (str): Folder in which to write the dataset
+        fields (list): Fields of the sampled metrics to include
+        includeActivity (bool): Indicates whether activity timelines are
+            included
+        fmt (str): One of "parquet" or "arrow" (Arrow IPC files)
+        compression (str): Compression codec for the files, e.g. "zstd",
+            "snappy" or "none"
+        runIds (list): Identifiers of the runs, in the same order as the
+            files. Default is to derive them from the file names
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of the run identifiers written
+
+    Raises:
+        ValueError: If two runs have the same identifier
+    """
+    assert fmt in exportFormats
+    # Check the identifiers before anything is written or deleted
+    runIds = get_run_ids(fileList, runIds)
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("The pyarrow package is required to write " + fmt +
+                " files")
+
+    if fmt == "parquet":
+        fileFormat = ds.ParquetFileFormat()
+        fileOptions = fileFormat.make_write_options(compression=compression)
+    else:
+        fileFormat = ds.IpcFileFormat()
+        fileOptions = fileFormat.make_write_options(
+                compression=None if compression == "none" else compression)
+
+    for filename, runId in zip(fileList, runIds):
+        table = get_long_format_table(loadFunc(filename.strip()), runId,
+                fields, includeActivity)
+        ds.write_dataset(table, outDir, format=fileFormat,
+                file_options=fileOptions, partitioning=["run_id"],
+                partitioning_flavor="hive",
+                basename_template="part-{i}." + fmt,
+                existing_data_behavior="delete_matching")
+    return runIds
+#### End of function write_long_format_dataset
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Exports the samples of one" +
+            " or more JSON format MAP files to a Parquet or Arrow dataset in" +
+            " long format, with one row of (run_id, metric, field, sample," +
+            " time, value) per sample. The dataset is partitioned by run_id," +
+            " which is the name of the JSON file without its extension")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("-o", "--outdir", help="Folder to write the dataset" +
+            " to", required=True)
+    parser.add_argument("--fields", help="Fields of the sampled metrics to" +
+            " export. Default is all of them", nargs="+", choices=sampleFields,
+            default=sampleFields)
+    parser.add_argument("--noActivity", help="Do not export the activity" +
+            " timelines", action="store_true")
+    parser.add_argument("--format", help="Format of the files in the dataset",
+            choices=exportFormats, default="parquet")
+    parser.add_argument("--compression", help="Compression codec. Default is" +
+            " zstd", default="zstd")
+    parser.add_argument("--runIds", help="Identifiers of the runs, one per" +
+            " input file in the same order. Needed when two files have the" +
+            " same name in different folders", nargs="+", default=None)
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+
+    try:
+        runIds = get_run_ids(fileList, args.runIds)
+    except ValueError as err:
+        parser.error(str(err))
+
+    if session is None:
+        session = ProfileSession()
+    runIds = write_long_format_dataset(fileList, args.outdir, args.fields,
+            not args.noActivity, args.format, args.compression, runIds,
+            session.load)
+    print("Written " + str(len(runIds)) + " runs to " + args.outdir)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
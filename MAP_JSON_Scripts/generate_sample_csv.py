@@ -15,61 +15,455 @@
 #
 import csv
 import argparse
+import itertools
 import json
 import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import map_json_common as mjc
+from derived_metrics import is_expression, get_metric_values, \
+        ExpressionCache
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
 
-if (__name__ == "__main__"):
+sampleFields = ["mins", "maxs", "means", "vars", "sums"]
+
+def get_stream_parser(infile):
+    """
+    Returns the ijson module if the given profile can be parsed
+    incrementally, or None if ijson is not installed or the profile is a run
+    in an archive, which has to be read whole
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file, or of a run in
+            an archive
+    """
+    if mjc.split_archive_path(infile) is not None:
+        return None
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+#### End of function get_stream_parser
+
+def iter_sample_items(infile, sectionName, loadFunc=None):
+    """
+    Iterates over the items of a section of the samples of a MAP profile.
+    When no function to load the profile is given and the ijson package is
+    available, the file is parsed incrementally so that only one item is held
+    in memory at a time
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        sectionName (str): One of "metrics" or "activity"
+        loadFunc (function): Function used to read the profile from file. If
+            None, the file is streamed if possible
+
+    Returns:
+        Iterator over tuples of (name, dictionary of values), e.g. a metric
+        name and the dictionary of its fields
+    """
+    assert sectionName in ["metrics", "activity"]
+
+    if loadFunc is None:
+        ijson = get_stream_parser(infile)
+        if ijson is None:
+            loadFunc = mjc.load_profile
+        else:
+            with open(infile, "rb") as f:
+                for item in ijson.kvitems(f, "samples." + sectionName,
+                        use_float=True):
+                    yield item
+            return
+
+    sectionDict = loadFunc(infile)["samples"].get(sectionName, {})
+    for name in sectionDict:
+        yield name, sectionDict[name]
+#### End of function iter_sample_items
+
+def iter_metric_samples(infile, loadFunc=None):
+    """
+    Iterates over the sampled metrics of a MAP profile. See iter_sample_items
+
+    Returns:
+        Iterator over tuples of (metric name, dictionary of the fields of the
+        metric)
+    """
+    return iter_sample_items(infile, "metrics", loadFunc)
+#### End of function iter_metric_samples
+
+def read_window_start_offsets(infile, loadFunc=None):
+    """
+    Reads the start times of the sampling windows of a MAP profile, parsing
+    the file incrementally when no function to load the profile is given and
+    the ijson package is available
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        loadFunc (function): Function used to read the profile from file. If
+            None, the file is streamed if possible
+
+    Returns:
+        List of start times of the sampling windows
+    """
+    if loadFunc is None:
+        ijson = get_stream_parser(infile)
+        if ijson is None:
+            loadFunc = mjc.load_profile
+        else:
+            with open(infile, "rb") as f:
+                for offsets in ijson.items(f, "samples.window_start_offsets",
+                        use_float=True):
+                    return offsets
+            return []
+
+    return mjc.get_window_start_times(loadFunc(infile))
+#### End of function read_window_start_offsets
+
+def iter_derived_samples(infile, metrics, fields, loadFunc=None):
+    """
+    Iterates over the values of the expressions in a list of metric names
+    (see derived_metrics.py). The expressions need the whole of the profile,
+    so it is only read when there are names which may be expressions. Names
+    which the profile has a metric or activity for are not expressions
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        metrics (list): Names of metrics and expressions. Names which are not
+            expressions are skipped
+        fields (list): Fields of the metrics to evaluate the expressions for
+        loadFunc (function): Function used to read the profile from file. If
+            None, the profile is read with map_json_common.load_profile
+
+    Returns:
+        Iterator over tuples of (expression, dictionary of the list of values
+        of each field)
+    """
+    expressions = [metric for metric in metrics or [] if is_expression(metric)]
+    if len(expressions) == 0:
+        return
+    profileDict = (loadFunc or mjc.load_profile)(infile)
+    cache = ExpressionCache()
+    for expression in expressions:
+        if not is_expression(expression, profileDict):
+            continue
+        yield expression, dict((field, get_metric_values(profileDict,
+            expression, field, cache).tolist()) for field in fields)
+#### End of function iter_derived_samples
+
+def get_output_file_names(infile, outfile, fields):
+    """
+    Gets the names of the files to write the samples and the metric names to.
+    When more than one field is written, the name of the field is added to
+    the name of the file of samples
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        outfile (str): Name of the file of samples. If None, it is derived
+            from the name of the input file
+        fields (list): Fields of the metrics which are written
+
+    Returns:
+        Tuple of (dictionary of file name for each field, name of the file of
+        metric names)
+    """
+    if not outfile:
+        base = os.path.splitext(mjc.get_output_base_name(infile))[0]
+        outfile = base + "_allsamples.txt"
+        fieldFName = base + "_fieldnames.txt"
+    else:
+        fieldFName = os.path.splitext(outfile)[0] + "_fieldnames.txt"
+
+    if len(fields) == 1:
+        return {fields[0] : outfile}, fieldFName
+    base, ext = os.path.splitext(outfile)
+    return dict((field, base + "_" + field + ext) for field in fields), fieldFName
+#### End of function get_output_file_names
+
+def write_sample_csv(infile, outfile=None, fields=["means"], transpose=False,
+        chunkSize=1024, metrics=None, loadFunc=None):
+    """
+    Writes the samples of a MAP profile in CSV format, with one file per
+    field. By default each row is a metric and each column a sample. The rows
+    are written as the metrics are read, so all of the fields are written in a
+    single pass over the profile. In the transposed layout each row is a
+    sample and each column a metric, and the rows are written in chunks
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        outfile (str): Name of the file of samples. If None, it is derived
+            from the name of the input file
+        fields (list): Fields of the metrics to write
+        transpose (bool): Indicates that each row should be a sample
+        chunkSize (int): Number of samples written at a time in the
+            transposed layout
+        metrics (list): Names of the metrics to write, which can include
+            expressions over metrics (see derived_metrics.py). If None, all
+            of the metrics are written. A warning is printed for each name
+            which is neither a metric nor an expression
+        loadFunc (function): Function used to read the profile from file. If
+            None, the file is streamed if possible
+
+    Returns:
+        List of the names of the files written
+    """
+    assert all(field in sampleFields for field in fields)
+    assert chunkSize > 0
+
+    outFNames, fieldFName = get_output_file_names(infile, outfile, fields)
+    outFiles = dict((field, open(outFNames[field], "w", newline=""))
+            for field in fields)
+    try:
+        writers = dict((field, csv.writer(outFiles[field])) for field in fields)
+        metricNames = []
+        # Samples of each field, only kept for the transposed layout
+        columns = dict((field, []) for field in fields)
+        sampleItems = itertools.chain(iter_metric_samples(infile, loadFunc),
+                iter_derived_samples(infile, metrics, fields, loadFunc))
+        for metric, metricDict in sampleItems:
+            if metrics is not None and metric not in metrics:
+                continue
+            metricNames.append(metric)
+            for field in fields:
+                if transpose:
+                    columns[field].append(metricDict[field])
+                else:
+                    writers[field].writerow(metricDict[field])
+
+        if transpose:
+            for field in fields:
+                numSamples = max([len(col) for col in columns[field]] + [0])
+                for start in range(0, numSamples, chunkSize):
+                    writers[field].writerows(zip(*[col[start:start + chunkSize]
+                        for col in columns[field]]))
+                columns[field] = None
+    finally:
+        for field in fields:
+            outFiles[field].close()
+
+    with open(fieldFName, "w") as fieldfile:
+        for metric in metricNames:
+            fieldfile.write(metric + "\n")
+    __warn_missing(infile, metrics, metricNames)
+
+    return [outFNames[field] for field in fields] + [fieldFName]
+#### End of function write_sample_csv
+
+def __warn_missing(infile, metrics, found):
+    """
+    Warns on stderr of each name in metrics which is not in found, being
+    neither a metric of the profile nor an expression
+    """
+    for metric in metrics or []:
+        if metric not in found:
+            print("Metric " + metric + " does not exist in " + infile +
+                    " - skipping", file=sys.stderr)
+#### End of function __warn_missing
+
+def __spill_series(spillFile, samples, numSamples):
+    """
+    Appends the first numSamples values of a series to a file of float64
+    values. Missing values (None), and values past the end of a short series,
+    are written as NaN
+    """
+    values = np.full(numSamples, np.nan)
+    samples = [np.nan if val is None else val for val in samples[:numSamples]]
+    values[:len(samples)] = samples
+    spillFile.write(values.tobytes())
+#### End of function __spill_series
+
+def write_sample_jsonl(infile, outfile=None, fields=["means"], metrics=None,
+        includeActivity=True, chunkSize=1024, loadFunc=None):
+    """
+    Writes the samples of a MAP profile in JSON Lines format, with one object
+    per sample of the form
+
+        {"sample": 0, "window_start_offset": 0,
+         "metrics": {"cpu_time_percentage": {"means": 51.2}},
+         "activity": {"main_thread": {"normal_compute": 65.0}}}
+
+    Each line needs a value from every series, so the series are spilled to
+    a temporary file as they are read, and read back as a memory map one
+    chunk of samples at a time. Only one series and one chunk are then held
+    in memory when the profile is streamed
+
+    Args:
+        infile (str): Name of the JSON export of a MAP file
+        outfile (str): Name of the file to write to, or "-" for standard
+            output. If None, it is derived from the name of the input file
+        fields (list): Fields of the metrics to write
+        metrics (list): Names of the metrics to write, which can include
+            expressions over metrics (see derived_metrics.py). If None, all
+            of the metrics are written. A warning is printed for each name
+            which is neither a metric nor an expression
+        includeActivity (bool): Indicates whether the activity timelines are
+            written
+        chunkSize (int): Number of samples read back from the temporary file
+            at a time
+        loadFunc (function): Function used to read the profile from file. If
+            None, the file is streamed if possible
+
+    Returns:
+        The name of the file written
+    """
+    assert all(field in sampleFields for field in fields)
+    assert chunkSize > 0
+
+    if loadFunc is None and get_stream_parser(infile) is None:
+        # Read the file once rather than once per section
+        profileDict = mjc.load_profile(infile)
+        loadFunc = lambda filename: profileDict
+
+    if not outfile:
+        outfile = os.path.splitext(mjc.get_output_base_name(infile))[0] + \
+                "_samples.jsonl"
+
+    offsets = read_window_start_offsets(infile, loadFunc)
+    numSamples = len(offsets)
+    with tempfile.TemporaryFile() as spillFile:
+        # List of (metric name, field) and of (timeline, activity) of the
+        # series, in the order in which they are spilled
+        metricSeries = []
+        for metric, metricDict in itertools.chain(iter_metric_samples(infile,
+                loadFunc), iter_derived_samples(infile, metrics, fields,
+                    loadFunc)):
+            if metrics is None or metric in metrics:
+                for field in fields:
+                    __spill_series(spillFile, metricDict[field], numSamples)
+                    metricSeries.append((metric, field))
+        found = set(metric for metric, _ in metricSeries)
+        activitySeries = []
+        if includeActivity:
+            for timeline, activityDict in iter_sample_items(infile, "activity",
+                    loadFunc):
+                for activity in activityDict:
+                    __spill_series(spillFile, activityDict[activity],
+                            numSamples)
+                    activitySeries.append((timeline, activity))
+                    found.add(activity)
+        __warn_missing(infile, metrics, found)
+        spillFile.flush()
+
+        numSeries = len(metricSeries) + len(activitySeries)
+        series = np.memmap(spillFile, dtype=np.float64, mode="r",
+                shape=(numSeries, numSamples)) if numSeries * numSamples > 0 \
+                        else np.zeros((numSeries, numSamples))
+        f = sys.stdout if outfile == "-" else open(outfile, "w")
+        try:
+            for start in range(0, numSamples, chunkSize):
+                chunk = np.array(series[:, start:start + chunkSize])
+                # Missing values are written as null
+                chunk = np.where(np.isnan(chunk), None, chunk).tolist()
+                for ind in range(start, min(start + chunkSize, numSamples)):
+                    col = ind - start
+                    metricVals = {}
+                    for row, (metric, field) in enumerate(metricSeries):
+                        metricVals.setdefault(metric, {})[field] = \
+                                chunk[row][col]
+                    sample = {"sample" : ind, "window_start_offset" :
+                            offsets[ind], "metrics" : metricVals}
+                    if includeActivity:
+                        activityVals = {}
+                        for row, (timeline, activity) in enumerate(
+                                activitySeries, len(metricSeries)):
+                            activityVals.setdefault(timeline, {})[activity] = \
+                                    chunk[row][col]
+                        sample["activity"] = activityVals
+                    f.write(json.dumps(sample) + "\n")
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        del series
+
+    return outfile
+#### End of function write_sample_jsonl
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Gets the sample values from a" +
             " JSON format MAP file and outputs them in CSV format. Each row" +
             " represents a metric, and each column a sample")
 
-    parser.add_argument("infile", help="JSON file which is the export of a MAP" +
-            " file")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="+")
 
     parser.add_argument("-o", "--outfile", help="Name of file to write output" +
-            " to", default=None)
-    parser.add_argument("--field", help="Name of the field to obtain at each" +
-            " sample. Must be one of [mins, maxs, means]", 
-            choices=["mins", "maxs", "means"], default="means")
+            " to. Only valid for a single input file", default=None)
+    parser.add_argument("--field", help="Names of the fields to obtain at each" +
+            " sample. Each field is written to a separate file", nargs="+",
+            choices=sampleFields, default=["means"])
+    parser.add_argument("--transpose", help="Write one row per sample and one" +
+            " column per metric", action="store_true")
+    parser.add_argument("--chunkSize", help="Number of samples written at a" +
+            " time with --transpose or --jsonl", type=int, default=1024)
+    parser.add_argument("--metrics", help="Names of the metrics to write." +
+            " Expressions over metrics (see derived_metrics.py) are also" +
+            " written, e.g. 'lustre_bytes_read / io_reads_rate'. Default is" +
+            " all of the metrics", nargs="+", default=None)
+    parser.add_argument("--jsonl", help="Write one JSON object per sample, in" +
+            " JSON Lines format, instead of CSV. An output file of - writes" +
+            " to standard output. The samples are held in a temporary file" +
+            " of the size of the selected series while the lines are" +
+            " written", action="store_true")
+    parser.add_argument("--noActivity", help="Do not write the activity" +
+            " timelines with --jsonl", action="store_true")
+    parser.add_argument("-j", "--jobs", help="Number of input files to" +
+            " process concurrently", type=int, default=1)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    # Read in the JSON export of a MAP file
-    if(not os.path.isfile(args.infile)):
-        raise IOError("File " + args.infile + " does not exist")
+    if args.outfile and len(args.infiles) > 1:
+        parser.error("--outfile can only be used with a single input file")
 
-    with open(args.infile, 'r') as jsonFile:
-        profileDict = json.load(jsonFile)
+    # Read in the JSON export of a MAP file
+    for infile in args.infiles:
+        if(not mjc.profile_exists(infile)):
+            raise IOError("File " + infile + " does not exist")
 
-    if not args.outfile:
-        dotInd = args.infile.rfind(".")
-        if dotInd < 0:
-            outFName = args.infile + "_allsamples.txt"
-            fieldFName = outfile[:-4] + "_fieldnames.txt"
-        else:
-            outFName = args.infile[:dotInd] + "_allsamples.txt"
-            fieldFName = args.infile[:dotInd] + "_fieldnames.txt"
-    else:
-        outFName = args.outfile
-        dotInd = outFName.rfind(".")
-        if dotInd < 0:
-            fieldFName = outFName + "_fieldnames.txt"
-        else:
-            fieldFName = outFName[:dotInd] + "_fieldnames.txt"
+    if session is None:
+        session = ProfileSession()
+    fields = list(dict.fromkeys(args.field))
 
-    # Get the sample values from the JSON dictionary (i.e. disregard the
-    # activity timeline values)
-    metrics = mjc.get_samples(profileDict)
+    if args.jsonl:
+        for infile in args.infiles:
+            outFName = write_sample_jsonl(infile, args.outfile, fields,
+                    args.metrics, not args.noActivity, args.chunkSize,
+                    session.load if infile in session else None)
+            if outFName != "-":
+                print("Written samples to " + outFName)
+        return
 
-    # Write to CSV
-    with open(outFName, "w") as outfile, open(fieldFName, "w") as fieldfile:
-        writer = csv.writer(outfile)
-        for metric in metrics:
-            fieldfile.write(metric + "\n")
-            writer.writerow(metrics[metric][args.field])
+    if args.jobs > 1 and len(args.infiles) > 1:
+        # Each worker streams its own profiles
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(write_sample_csv, infile, None, fields,
+                args.transpose, args.chunkSize, args.metrics)
+                for infile in args.infiles]
+            outFNameLists = [future.result() for future in futures]
+    else:
+        # Use a profile which is already loaded rather than reading it again
+        outFNameLists = [write_sample_csv(infile, args.outfile, fields,
+            args.transpose, args.chunkSize, args.metrics,
+            session.load if infile in session else None)
+            for infile in args.infiles]
 
-    print("Written samples to " + outFName)
-    print("Written field names to " + fieldFName)
-#### End of main program
+    for outFNames in outFNameLists:
+        for outFName in outFNames[:-1]:
+            print("Written samples to " + outFName)
+        print("Written field names to " + outFNames[-1])
+#### End of function main
 
+if __name__ == "__main__":
+    main()
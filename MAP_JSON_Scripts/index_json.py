@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import json
+import mmap
+import os
+import re
+from map_json_common import *
+
+whitespaceRe = re.compile(rb"[ \t\r\n]*")
+scalarRe = re.compile(rb"[^,}\] \t\r\n]*")
+# Depth of the values whose byte spans are recorded, e.g. a depth of 4
+# reaches samples.metrics.<name>.<field>
+indexDepth = 4
+
+class JsonSpanScanner(object):
+    """
+    Finds the byte ranges of the values in a JSON file without parsing them.
+    Arrays of numbers are skipped by searching for their closing bracket, so
+    the time taken depends mainly on the number of arrays rather than on the
+    number of samples
+    """
+
+    def __init__(self, buf):
+        """
+        Args:
+            buf: Bytes, or an mmap of the file
+        """
+        self.buf = buf
+
+    def skip_whitespace(self, pos):
+        return whitespaceRe.match(self.buf, pos).end()
+
+    def scan_string(self, pos):
+        """
+        Returns the position after the string starting at the quote at pos
+        """
+        end = pos
+        while True:
+            end = self.buf.find(b'"', end + 1)
+            if end < 0:
+                raise ValueError("Unterminated string at byte " + str(pos))
+            # The quote is escaped if it follows an odd number of backslashes
+            numSlashes = 0
+            while self.buf[end - 1 - numSlashes] == ord("\\"):
+                numSlashes += 1
+            if numSlashes % 2 == 0:
+                return end + 1
+
+    def scan_value(self, pos, spans=None, path="", depth=0):
+        """
+        Scans the value starting at pos. The spans of the values nested in it
+        are recorded in the dictionary spans, keyed by their path (the keys
+        leading to them joined by "/"), down to the given depth
+
+        Returns:
+            The position after the value
+        """
+        char = self.buf[pos:pos + 1]
+        if char == b"{":
+            return self.scan_object(pos, spans, path, depth)
+        if char == b"[":
+            return self.scan_array(pos)
+        if char == b'"':
+            return self.scan_string(pos)
+        return scalarRe.match(self.buf, pos).end()
+
+    def scan_array(self, pos):
+        first = self.skip_whitespace(pos + 1)
+        # An array of numbers is ended by the first closing bracket, and
+        # contains no strings or nested values
+        end = self.buf.find(b"]", first)
+        if end < 0:
+            raise ValueError("Unterminated array at byte " + str(pos))
+        if self.buf.find(b"[", first, end) < 0 and \
+                self.buf.find(b"{", first, end) < 0 and \
+                self.buf.find(b'"', first, end) < 0:
+            return end + 1
+
+        pos = first
+        while self.buf[pos:pos + 1] != b"]":
+            pos = self.skip_whitespace(self.scan_value(pos))
+            if self.buf[pos:pos + 1] == b",":
+                pos = self.skip_whitespace(pos + 1)
+        return pos + 1
+
+    def scan_object(self, pos, spans=None, path="", depth=0):
+        pos = self.skip_whitespace(pos + 1)
+        while self.buf[pos:pos + 1] != b"}":
+            keyEnd = self.scan_string(pos)
+            key = json.loads(self.buf[pos:keyEnd].decode("utf-8"))
+            pos = self.skip_whitespace(keyEnd)
+            if self.buf[pos:pos + 1] != b":":
+                raise ValueError("Expected ':' at byte " + str(pos))
+            valStart = self.skip_whitespace(pos + 1)
+            valPath = path + "/" + key if path else key
+            if spans is not None and depth > 0:
+                valEnd = self.scan_value(valStart, spans, valPath, depth - 1)
+                spans[valPath] = [valStart, valEnd - valStart]
+            else:
+                valEnd = self.scan_value(valStart)
+            pos = self.skip_whitespace(valEnd)
+            if self.buf[pos:pos + 1] == b",":
+                pos = self.skip_whitespace(pos + 1)
+            elif self.buf[pos:pos + 1] != b"}":
+                raise ValueError("Expected ',' or '}' at byte " + str(pos))
+        return pos + 1
+#### End of class JsonSpanScanner
+
+def build_profile_index(filename):
+    """
+    Builds an index of the byte offsets and lengths of the values in the JSON
+    export of a MAP profile, down to the arrays of
+    samples/metrics/<name>/<field> and samples/activity/<timeline>/<activity>
+
+    Args:
+        filename (str): Name of the JSON export of a MAP file
+
+    Returns:
+        Dictionary with the size and modification time of the indexed file,
+        and "spans", a dictionary of [offset, length] keyed by the path of
+        each value, e.g. "info" or "samples/metrics/mpi_sent/means"
+    """
+    fileStat = os.stat(filename)
+    spans = {}
+    with open(filename, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            scanner = JsonSpanScanner(buf)
+            start = scanner.skip_whitespace(0)
+            if buf[start:start + 1] != b"{":
+                raise ValueError(filename + " does not contain a JSON object")
+            scanner.scan_object(start, spans, "", indexDepth)
+        finally:
+            buf.close()
+
+    return {"version" : indexVersion, "size" : fileStat.st_size,
+            "mtime" : fileStat.st_mtime, "spans" : spans}
+#### End of function build_profile_index
+
+def index_profile(filename):
+    """
+    Builds the index of the JSON export of a MAP profile and writes it to the
+    sidecar file next to it
+
+    Args:
+        filename (str): Name of the JSON export of a MAP file
+
+    Returns:
+        The index, as returned by build_profile_index
+    """
+    index = build_profile_index(filename)
+    with open(get_index_file_name(filename), "w") as f:
+        json.dump(index, f)
+    return index
+#### End of function index_profile
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Unused, as the profiles are scanned rather
+            than loaded
+    """
+    parser = argparse.ArgumentParser(description="Indexes the byte offsets of" +
+            " the info block and of each sample array in JSON format MAP" +
+            " files, and writes the index to a sidecar file next to each" +
+            " (<file>" + indexExtension + "). Single metrics can then be read" +
+            " from the unmodified JSON file without parsing the rest of it")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="+")
+    parser.add_argument("--force", help="Rebuild indexes which are up to date",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    for infile in args.infiles:
+        if not args.force and load_profile_index(infile) is not None:
+            print("Index of " + infile + " is up to date")
+            continue
+        index_profile(infile)
+        print("Written index to " + get_index_file_name(infile))
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import csv
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from time_weighting import get_time_weighted_integral
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from plot_data_common import print_table
+
+# Counters of running totals whose names do not follow from the name of the
+# rate, i.e. are not <rate>_total or <name>_total for a rate <name>_rate
+rateTotalNames = {"lustre_bytes_read" : "lustre_rchar_total",
+        "lustre_bytes_written" : "lustre_wchar_total"}
+# Parts of the names of metrics which are rates per second
+rateNameParts = ["bytes", "rate", "sent", "recv"]
+reportFields = ["file", "metric", "integral", "total_metric", "total",
+        "error", "relative_error"]
+
+def get_total_metric_name(metricDict, metricName):
+    """
+    Gets the name of the counter of the running total of a rate metric
+
+    Args:
+        metricDict (dict): Dictionary of the sampled metrics of a profile
+        metricName (str): Name of the rate metric
+
+    Returns:
+        The name of the total metric, or None if the profile has no matching
+        total
+    """
+    candidates = [rateTotalNames.get(metricName), metricName + "_total"]
+    if metricName.endswith("_rate"):
+        candidates.append(metricName[:-len("_rate")] + "_total")
+    for candidate in candidates:
+        if candidate in metricDict:
+            return candidate
+    return None
+#### End of function get_total_metric_name
+
+def get_rate_metric_names(profileDict):
+    """
+    Gets the names of the metrics of a profile which are rates, i.e. those
+    with a matching running total or whose names mark them as rates
+    """
+    metricDict = get_samples(profileDict)
+    return [metric for metric in metricDict if not is_running_total(metric)
+            and (get_total_metric_name(metricDict, metric) is not None or
+                any(part in metric for part in rateNameParts))]
+#### End of function get_rate_metric_names
+
+def get_rate_scale(profileDict, metricName):
+    """
+    Gets the factor by which the mean of a rate over processes is multiplied
+    to give the rate of the whole run. Lustre metrics are measured per node,
+    and other metrics per process
+    """
+    if metricName.startswith("lustre_"):
+        return get_num_nodes(profileDict)
+    return get_num_processes(profileDict)
+#### End of function get_rate_scale
+
+def integrate_rates(profile, metrics=None, loadFunc=load_profile):
+    """
+    Integrates the rate metrics of a profile over time, all at once, and
+    compares each integral with the running total recorded for the metric
+    where there is one
+
+    Args:
+        profile: Name of the JSON export of a MAP profile, or the dictionary
+            of values representing it
+        metrics (list): Names of the rate metrics to integrate. Default is all
+            of the rate metrics of the profile (see get_rate_metric_names)
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Dictionary keyed by metric name of dictionaries with the fields
+        "integral" (NumPy array of the integral at the end of each window),
+        "total_metric" (name of the total, or None), "total" (NumPy array of
+        the running total, or None), "error" (difference between the final
+        integral and the final total) and "relative_error" (error as a
+        fraction of the final total). The errors are None without a total
+    """
+    profileDict = profile if isinstance(profile, dict) else loadFunc(profile)
+    metricDict = get_samples(profileDict)
+    if metrics is None:
+        metrics = get_rate_metric_names(profileDict)
+    for metric in metrics:
+        if metric not in metricDict:
+            raise KeyError("Unable to find metric " + metric + " in profile")
+    if len(metrics) == 0:
+        return {}
+
+    means = [metricDict[metric]["means"] for metric in metrics]
+    scales = np.array([get_rate_scale(profileDict, metric)
+        for metric in metrics], dtype=np.float64)
+    integrals = get_time_weighted_integral(profileDict, means) * \
+            scales[:, np.newaxis]
+
+    results = {}
+    for metric, integral in zip(metrics, integrals):
+        totalMetric = get_total_metric_name(metricDict, metric)
+        total = error = relError = None
+        if totalMetric is not None:
+            total = np.array(metricDict[totalMetric]["sums"][:len(integral)],
+                    dtype=np.float64)
+            if len(total) > 0:
+                error = float(integral[-1] - total[-1])
+                relError = error / total[-1] if total[-1] != 0 else None
+        results[metric] = {"integral" : integral, "total_metric" : totalMetric,
+                "total" : total, "error" : error, "relative_error" : relError}
+    return results
+#### End of function integrate_rates
+
+def get_integration_report(fileList, metrics=None, loadFunc=load_profile):
+    """
+    Integrates the rate metrics of each of a list of profiles
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        metrics (list): Names of the rate metrics to integrate. Default is all
+            of the rate metrics of each profile
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of dictionaries, one per file and metric, with the fields in
+        reportFields. The integral and total are the final values
+    """
+    rows = []
+    for filename in fileList:
+        results = integrate_rates(filename, metrics, loadFunc)
+        for metric in sorted(results):
+            result = results[metric]
+            integral = result["integral"]
+            total = result["total"]
+            rows.append({"file" : filename, "metric" : metric,
+                "integral" : float(integral[-1]) if len(integral) > 0 else 0.,
+                "total_metric" : result["total_metric"],
+                "total" : float(total[-1]) if total is not None and
+                    len(total) > 0 else None,
+                "error" : result["error"],
+                "relative_error" : result["relative_error"]})
+    return rows
+#### End of function get_integration_report
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Integrates the rate metrics" +
+            " (e.g. Lustre, POSIX and MPI bytes per second) of JSON format MAP" +
+            " files over time, weighting each sample by the length of its" +
+            " window, and reports the error of each integral against the" +
+            " running total recorded for the metric where there is one")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--metrics", help="Names of the rate metrics to" +
+            " integrate. Default is all of the rate metrics of each file",
+            nargs="+", default=None)
+    parser.add_argument("--csv", help="Write the report in CSV format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+
+    if session is None:
+        session = ProfileSession()
+    rows = get_integration_report(fileList, args.metrics, session.load)
+
+    if args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=reportFields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print_table(rows, reportFields)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
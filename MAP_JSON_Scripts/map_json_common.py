@@ -14,7 +14,410 @@
 # limitations under the License.
 #
 import numbers
+import json
+import mmap
+import os
+import sys
 import datetime as dt
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+import json_dict_common as jdc
+
+# Extensions of the names of profile archives
+archiveExtensions = (".h5", ".hdf5")
+# Extension added to the name of a JSON export for its byte offset index, and
+# the version of the index format
+indexExtension = ".idx"
+indexVersion = 1
+# Format of the start time of a run, without its time offset
+startTimeFormat = "%Y-%m-%dT%H:%M:%S"
+
+def load_profile(filename):
+    """
+    Reads the JSON export of an Arm MAP profile into a dictionary. A profile
+    stored in an archive is read when the name is of the form
+    <archive>.h5:<run id>, and any other file with
+    json_dict_common.load_json_file
+
+    Args:
+        filename (str): Name of the JSON file exported from a MAP profile
+
+    Returns:
+        Dictionary representing the MAP profile
+    """
+    archivePath = split_archive_path(filename)
+    if archivePath is not None:
+        return read_archive_profile(*archivePath)
+    return jdc.load_json_file(filename)
+#### End of function load_profile
+
+def split_archive_path(filename):
+    """
+    Splits a name of the form <archive>.h5:<run id> into the name of the
+    archive and the identifier of the run
+
+    Args:
+        filename (str): Name of a file, or of a run in an archive
+
+    Returns:
+        Tuple of (archive name, run id), or None if the name does not refer to
+        a run in an archive
+    """
+    sepInd = filename.rfind(":")
+    if sepInd < 0 or not filename[:sepInd].lower().endswith(archiveExtensions):
+        return None
+    return filename[:sepInd], filename[sepInd + 1:]
+#### End of function split_archive_path
+
+def profile_exists(filename):
+    """
+    Indicates whether a profile can be read, i.e. whether the JSON file, or
+    the archive holding the run, exists
+
+    Args:
+        filename (str): Name of a file, or of a run in an archive
+
+    Returns:
+        True if the file or archive exists
+    """
+    archivePath = split_archive_path(filename)
+    return os.path.isfile(filename if archivePath is None else archivePath[0])
+#### End of function profile_exists
+
+def get_output_base_name(filename):
+    """
+    Gets the name from which to derive the names of the files written for a
+    profile. For a run in an archive this is <archive>_<run id>.json, next to
+    the archive, so that outputs are JSON files and differ between runs
+
+    Args:
+        filename (str): Name of a file, or of a run in an archive
+
+    Returns:
+        The name of the file, or the name derived from the archive and run
+    """
+    archivePath = split_archive_path(filename)
+    if archivePath is None:
+        return filename
+    return os.path.splitext(archivePath[0])[0] + "_" + archivePath[1] + ".json"
+#### End of function get_output_base_name
+
+def get_run_id(filename):
+    """
+    Gets the identifier of a run from the name of its JSON export, which is
+    the file name without the folder or extension. For a run in an archive it
+    is the run id given after the name of the archive
+    """
+    filename = filename.strip()
+    archivePath = split_archive_path(filename)
+    if archivePath is not None:
+        return archivePath[1]
+    return os.path.splitext(os.path.basename(filename))[0]
+#### End of function get_run_id
+
+def get_run_ids(fileList, runIds=None):
+    """
+    Gets the identifier of each run in a list, checking that no two runs
+    share an identifier, as the output of one would replace the other (e.g.
+    in a Parquet export or in an archive)
+
+    Args:
+        fileList (list): List of the names of JSON exports of MAP profiles
+        runIds (list): Identifiers to use for the runs, in the same order.
+            Default is to derive them from the file names (see get_run_id)
+
+    Returns:
+        List of the identifier of each run
+
+    Raises:
+        ValueError: If the number of identifiers given does not match the
+            number of files, or if two runs have the same identifier
+    """
+    if runIds is None:
+        runIds = [get_run_id(filename) for filename in fileList]
+    elif len(runIds) != len(fileList):
+        raise ValueError("Got " + str(len(runIds)) + " run ids for " +
+                str(len(fileList)) + " files")
+
+    seen = {}
+    for filename, runId in zip(fileList, runIds):
+        if runId in seen:
+            raise ValueError("Files " + seen[runId] + " and " + filename.strip() +
+                    " have the same run id " + runId + ". Give the run ids with" +
+                    " --runIds")
+        seen[runId] = filename.strip()
+    return list(runIds)
+#### End of function get_run_ids
+
+def open_archive(archiveName, mode="r"):
+    """
+    Opens an archive of MAP profiles. Each run is stored as a group named
+    after its run id, with the "info" block stored as attributes and each
+    field of each metric stored as a chunked, compressed dataset
+
+    Args:
+        archiveName (str): Name of the archive file
+        mode (str): Mode to open the file in, as for h5py.File
+
+    Returns:
+        An open h5py.File
+    """
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("The h5py package is required to read and write" +
+                " profile archives")
+    return h5py.File(archiveName, mode)
+#### End of function open_archive
+
+def get_archive_run_ids(archiveName):
+    """
+    Gets the identifiers of the runs stored in an archive
+
+    Args:
+        archiveName (str): Name of the archive file
+
+    Returns:
+        Sorted list of run ids
+    """
+    with open_archive(archiveName) as archive:
+        return sorted(archive.keys())
+#### End of function get_archive_run_ids
+
+def read_archive_info(archiveName, runId):
+    """
+    Reads the "info" block of a run stored in an archive, without reading any
+    of its samples
+
+    Args:
+        archiveName (str): Name of the archive file
+        runId (str): Identifier of the run
+
+    Returns:
+        The "info" dictionary of the profile
+    """
+    with open_archive(archiveName) as archive:
+        return json.loads(archive[runId].attrs["info"])
+#### End of function read_archive_info
+
+def get_archive_sample_range(archiveName, runId, startTime, endTime):
+    """
+    Gets the indices of the samples whose windows start in the given range of
+    time, for use with read_archive_metric
+
+    Args:
+        archiveName (str): Name of the archive file
+        runId (str): Identifier of the run
+        startTime (float): Start of the range in milliseconds (inclusive)
+        endTime (float): End of the range in milliseconds (exclusive)
+
+    Returns:
+        Tuple of (start index, end index), where the end index is exclusive
+    """
+    import numpy as np
+
+    offsets = read_archive_window_start_times(archiveName, runId)
+    return (int(np.searchsorted(offsets, startTime, side="left")),
+            int(np.searchsorted(offsets, endTime, side="left")))
+#### End of function get_archive_sample_range
+
+def read_archive_samples(dataset, startInd=0, endInd=None):
+    """
+    Reads a window of the samples stored in a dataset of an archive, decoding
+    the dataset if it is stored with the sample codec
+
+    Args:
+        dataset (h5py.Dataset): Dataset of samples in an open archive
+        startInd (int): Index of the first sample to read (inclusive)
+        endInd (int): Index of the last sample to read (exclusive). Default is
+            to read to the last sample
+
+    Returns:
+        NumPy array of the values of the samples
+    """
+    if dataset.attrs.get("codec") != "gorilla":
+        return dataset[startInd:endInd]
+
+    from sample_codec import decode_sample_window
+    count = int(dataset.attrs["count"])
+    startInd, endInd, _ = slice(startInd, endInd).indices(count)
+    return decode_sample_window(lambda start, end: dataset[start:end].tobytes(),
+            dataset.attrs["block_offsets"], int(dataset.attrs["block_size"]),
+            startInd, endInd)
+#### End of function read_archive_samples
+
+def read_archive_window_start_times(archiveName, runId, startInd=0,
+        endInd=None):
+    """
+    Reads the start times of the sampling windows of a run stored in an
+    archive
+
+    Args:
+        archiveName (str): Name of the archive file
+        runId (str): Identifier of the run
+        startInd (int): Index of the first sample to read (inclusive)
+        endInd (int): Index of the last sample to read (exclusive). Default is
+            to read to the last sample
+
+    Returns:
+        NumPy array of start times of the sampling windows
+    """
+    with open_archive(archiveName) as archive:
+        return read_archive_samples(archive[runId]["window_start_offsets"],
+                startInd, endInd)
+#### End of function read_archive_window_start_times
+
+def read_archive_metric(archiveName, runId, metricName, field="means",
+        startInd=0, endInd=None):
+    """
+    Reads a window of the samples of one field of one metric of a run stored
+    in an archive. Only the chunks of the archive which overlap the window are
+    read and decompressed
+
+    Args:
+        archiveName (str): Name of the archive file
+        runId (str): Identifier of the run
+        metricName (str): Name of the metric, e.g. "cpu_time_percentage".
+            Activity timelines are named "activity/<timeline>", e.g.
+            "activity/main_thread", with the activity as the field
+        field (str): Field of the metric, e.g. "means"
+        startInd (int): Index of the first sample to read (inclusive)
+        endInd (int): Index of the last sample to read (exclusive). Default is
+            to read to the last sample
+
+    Returns:
+        NumPy array of the values of the samples. Missing values are NaN
+    """
+    if metricName.startswith("activity/"):
+        datasetName = metricName + "/" + field
+    else:
+        datasetName = "metrics/" + metricName + "/" + field
+    with open_archive(archiveName) as archive:
+        return read_archive_samples(archive[runId][datasetName], startInd,
+                endInd)
+#### End of function read_archive_metric
+
+def read_archive_profile(archiveName, runId):
+    """
+    Reads a run stored in an archive back into a dictionary with the same
+    layout as the JSON export of the profile
+
+    Args:
+        archiveName (str): Name of the archive file
+        runId (str): Identifier of the run
+
+    Returns:
+        Dictionary representing the MAP profile
+    """
+    with open_archive(archiveName) as archive:
+        group = archive[runId]
+        profileDict = json.loads(group.attrs["header"])
+        profileDict["info"] = json.loads(group.attrs["info"])
+        sampleDict = {"count" : int(group.attrs["count"]),
+                "window_start_offsets" : read_archive_samples(
+                    group["window_start_offsets"]).tolist(),
+                "metrics" : {}}
+        for metric, metricGroup in group["metrics"].items():
+            sampleDict["metrics"][metric] = dict((field,
+                read_archive_samples(data).tolist())
+                for field, data in metricGroup.items())
+        if "activity" in group:
+            sampleDict["activity"] = {}
+            for timeline, timelineGroup in group["activity"].items():
+                sampleDict["activity"][timeline] = dict((activity,
+                    read_archive_samples(data).tolist())
+                    for activity, data in timelineGroup.items())
+        profileDict["samples"] = sampleDict
+    return profileDict
+#### End of function read_archive_profile
+
+def get_index_file_name(filename):
+    """
+    Gets the name of the sidecar file holding the byte offset index of a JSON
+    export (see index_json.py)
+    """
+    return filename + indexExtension
+#### End of function get_index_file_name
+
+def load_profile_index(filename):
+    """
+    Reads the byte offset index of a JSON export from its sidecar file
+
+    Args:
+        filename (str): Name of the JSON export of a MAP file
+
+    Returns:
+        The index, or None if the file has not been indexed or has changed
+        since it was indexed
+    """
+    try:
+        with open(get_index_file_name(filename), "r") as f:
+            index = json.load(f)
+        fileStat = os.stat(filename)
+    except (IOError, OSError, ValueError):
+        return None
+    if index.get("version") != indexVersion or \
+            index.get("size") != fileStat.st_size or \
+            index.get("mtime") != fileStat.st_mtime:
+        return None
+    return index
+#### End of function load_profile_index
+
+def read_indexed_value(filename, path, index=None):
+    """
+    Reads a single value from a JSON export using its byte offset index. Only
+    the bytes of the value are read and parsed
+
+    Args:
+        filename (str): Name of the JSON export of a MAP file
+        path (str): Path of the value, with keys separated by "/", e.g. "info"
+            or "samples/metrics/mpi_sent/means"
+        index (dict): Index of the file. If None it is read from the sidecar
+            file
+
+    Returns:
+        The value stored at the path
+    """
+    if index is None:
+        index = load_profile_index(filename)
+        if index is None:
+            raise IOError("No up to date index for " + filename +
+                    ". Run index_json.py to create it")
+    try:
+        start, length = index["spans"][path]
+    except KeyError:
+        raise KeyError("Value " + path + " is not in the index of " + filename)
+    with open(filename, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return json.loads(buf[start:start + length].decode("utf-8"))
+        finally:
+            buf.close()
+#### End of function read_indexed_value
+
+def read_indexed_metric(filename, metricName, field="means", index=None):
+    """
+    Reads the samples of one field of one metric from a JSON export using its
+    byte offset index
+
+    Args:
+        filename (str): Name of the JSON export of a MAP file
+        metricName (str): Name of the metric, e.g. "cpu_time_percentage".
+            Activity timelines are named "activity/<timeline>", e.g.
+            "activity/main_thread", with the activity as the field
+        field (str): Field of the metric, e.g. "means"
+        index (dict): Index of the file. If None it is read from the sidecar
+            file
+
+    Returns:
+        List of the values of the samples
+    """
+    if metricName.startswith("activity/"):
+        path = "samples/" + metricName + "/" + field
+    else:
+        path = "samples/metrics/" + metricName + "/" + field
+    return read_indexed_value(filename, path, index)
+#### End of function read_indexed_metric
 
 def get_sample_count(profileDict):
     """
@@ -29,7 +432,7 @@ def get_sample_count(profileDict):
     """
     assert isinstance(profileDict, dict)
 
-    return profileDict["samples"]["count"]
+    return int(profileDict["samples"]["count"])
 #### End of function get_sample_count
 
 def set_sample_count(profileDict, sampleCount):
@@ -55,6 +458,15 @@ def get_samples(profileDict):
     return profileDict["samples"]["metrics"]
 #### End of function get_samples
 
+def is_running_total(metricName):
+    """
+    Indicates whether a metric is a counter of a running total, such as
+    lustre_rchar_total, whose value at each sample is the total up to the end
+    of that sample rather than a value for the sample's window
+    """
+    return metricName.endswith("_total")
+#### End of function is_running_total
+
 def get_runtime(profileDict):
     """
     Gets the runtime (in milliseconds) of an application run
@@ -112,6 +524,31 @@ def get_window_start_times(profileDict):
     return profileDict["samples"]["window_start_offsets"]
 #### End of function get_window_start_times
 
+def get_window_end_times(profileDict):
+    """
+    Gets the times of the end of the sampling windows used in the profiled
+    run. Each window ends where the next one starts, and the last window ends
+    at the end of the run (the runtime after the start of the first window,
+    which also holds for truncated profiles)
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+
+    Returns:
+        List of end times of sampling window
+    """
+    startTimes = get_window_start_times(profileDict)
+    if len(startTimes) == 0:
+        return []
+    lastEnd = startTimes[0] + float(get_runtime(profileDict))
+    if lastEnd <= startTimes[-1]:
+        # Assume that the last window is as long as the one before it
+        lastEnd = startTimes[-1] + (startTimes[-1] - startTimes[-2]
+                if len(startTimes) > 1 else 0)
+    return list(startTimes[1:]) + [lastEnd]
+#### End of function get_window_end_times
+
 def get_metric_samples(metricDict, metricNames):
     """
     Returns a dictionary of samples for the given metric name
@@ -137,7 +574,7 @@ def get_metric_samples(metricDict, metricNames):
         try:
             retDict[metricName] = metricDict[metricName]
         except KeyError:
-            print("Metric " + metricName + " does not exist - skipping")
+            print("Metric " + metricName + " does not exist - skipping", file=sys.stderr)
             pass
 
     return retDict
@@ -212,7 +649,7 @@ def get_activity_samples(activityDict, metricNames, activityName="main_thread"):
     try:
        subDict = activityDict[activityName]
     except KeyError:
-        print("Activity " + activityName + " not found")
+        print("Activity " + activityName + " not found", file=sys.stderr)
         return retDict
 
     if(isinstance(metricNames, str)):
@@ -527,33 +964,38 @@ def __update_truncate_runtime(profileDict, newNumSamples, origNumSamples):
     get_runtime(profileDict)
 #### End of function __update_truncate_runtime
 
-def __truncate_info(infoDict, startInd, endInd, origNumSamples):
+def remove_whole_run_info(infoDict):
     """
-    Updates the 'info' section of the JSON export of a MAP profile in the case
-    that the profile is truncated. Some metrics need to be removed from this,
-    as they are valid only in the case that all of the samples are available
+    Removes the sections of the 'info' dictionary of a MAP profile which are
+    only valid when all of the samples of the profiled run are available, for
+    use when the samples are truncated or merged
 
     Args:
         infoDict (dict): Dictionary of the 'info' top-level section of a JSON
                          file which is an export of a MAP profile
-        startInd (int): Index for the start of the truncated profile
-        endInd (int): Index for the end of the truncated profile
-    """
-    if endInd - startInd + 1 == origNumSamples:
-        return
 
-    # Remove sections of the info dictionary that cannot be updated with
-    # reliable information during truncation
+    Returns:
+        Nothing. infoDict is modified in place
+    """
     keys_to_del=["metrics"]
     for key in keys_to_del:
-        del infoDict[key]
+        if key in infoDict:
+            del infoDict[key]
+#### End of function remove_whole_run_info
 
-    # Update the runtime
-    currentRuntime= int(infoDict["runtime"])
-    infoDict["runtime"]= int( (endInd - startInd + 1) / float(origNumSamples) *
-            currentRuntime)
+def get_start_time(infoDict):
+    """
+    Gets the time at which a profiled run started
 
-    # Update the start time
+    Args:
+        infoDict (dict): Dictionary of the 'info' top-level section of a JSON
+                         file which is an export of a MAP profile
+
+    Returns:
+        Tuple of (datetime object of the start time, string of the time
+        offset, e.g. "+01:00", which is empty if the time has no offset). The
+        datetime object holds the offset when there is one
+    """
     timestr= infoDict["start_time"]
     offsetInd= -1
     tCharInd= timestr.rfind("T")
@@ -568,15 +1010,48 @@ def __truncate_info(infoDict, startInd, endInd, origNumSamples):
     currStartTimeStr= timestr[:offsetInd] if offsetInd > 0 and offsetInd > tCharInd else timestr
     # Create a datetime object from the string representation of the date and
     # time
-    dateFormatStr= "%Y-%m-%dT%H:%M:%S"
-    currentStartTime= dt.datetime.strptime(currStartTimeStr, dateFormatStr)
+    startTime= dt.datetime.strptime(currStartTimeStr, startTimeFormat)
+    if offsetStr:
+        hours, _, minutes= offsetStr[1:].partition(":")
+        offset= dt.timedelta(hours=int(hours), minutes=int(minutes or 0))
+        startTime= startTime.replace(tzinfo=dt.timezone(-offset
+            if offsetStr[0] == "-" else offset))
+    return startTime, offsetStr
+#### End of function get_start_time
+
+def __truncate_info(infoDict, startInd, endInd, origNumSamples):
+    """
+    Updates the 'info' section of the JSON export of a MAP profile in the case
+    that the profile is truncated. Some metrics need to be removed from this,
+    as they are valid only in the case that all of the samples are available
+
+    Args:
+        infoDict (dict): Dictionary of the 'info' top-level section of a JSON
+                         file which is an export of a MAP profile
+        startInd (int): Index for the start of the truncated profile
+        endInd (int): Index for the end of the truncated profile
+    """
+    if endInd - startInd + 1 == origNumSamples:
+        return
+
+    # Remove sections of the info dictionary that cannot be updated with
+    # reliable information during truncation
+    remove_whole_run_info(infoDict)
+
+    # Update the runtime
+    currentRuntime= int(infoDict["runtime"])
+    infoDict["runtime"]= int( (endInd - startInd + 1) / float(origNumSamples) *
+            currentRuntime)
+
+    # Update the start time
+    currentStartTime, _= get_start_time(infoDict)
     # Calculate how many seconds need to be added to the date to reach the new
     # start index
     startOffsetS= int( startInd / float(origNumSamples) * currentRuntime)
     # Get a date time object for the updated start time
     newStartTime= currentStartTime + dt.timedelta(seconds=startOffsetS/1000)
     # Update the dictionary
-    infoDict["start_time"]= newStartTime.strftime(dateFormatStr)
+    infoDict["start_time"]= newStartTime.strftime(startTimeFormat)
 #### End of function __truncate_info
 
 def truncate_profile(profileDict, startInd, endInd):
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import argparse
+import os
+import sys
+import map_json_common as mjc
+from index_json import build_profile_index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+class ProfileReader(object):
+    """
+    Reads single values, such as the samples of one field of one metric, from
+    the JSON export of a MAP profile. Profiles which are already loaded in a
+    session are read from memory. Otherwise the byte offset index of the file
+    is used (see index_json.py), so that only the values which are asked for
+    are parsed and the rest of the file is not held in memory
+    """
+
+    def __init__(self, filename, session=None):
+        """
+        Args:
+            filename (str): Name of the JSON export of a MAP file
+            session (ProfileSession): Session holding loaded profiles
+        """
+        self.filename = filename
+        self.profileDict = None
+        self.index = None
+        if (session is not None and filename in session) or \
+                mjc.split_archive_path(filename) is not None:
+            loadFunc = mjc.load_profile if session is None else session.load
+            self.profileDict = loadFunc(filename)
+        else:
+            self.index = mjc.load_profile_index(filename)
+            if self.index is None:
+                self.index = build_profile_index(filename)
+
+    def __contains__(self, path):
+        if self.index is not None:
+            return path in self.index["spans"]
+        try:
+            self.get(path)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, path):
+        """
+        Returns the value at the given path, with keys separated by "/", e.g.
+        "samples/metrics/mpi_sent/means"
+        """
+        if self.index is not None:
+            return mjc.read_indexed_value(self.filename, path, self.index)
+        value = self.profileDict
+        for key in path.split("/"):
+            value = value[key]
+        return value
+
+    def get_keys(self, path):
+        """
+        Returns the keys of the object at the given path
+        """
+        if self.index is not None:
+            prefix = path + "/" if path else ""
+            return [key[len(prefix):] for key in self.index["spans"]
+                    if key.startswith(prefix) and "/" not in key[len(prefix):]]
+        return list(self.get(path).keys() if path else self.profileDict.keys())
+#### End of class ProfileReader
+
+def get_start_sort_key(infoDict):
+    """
+    Gets a key by which to sort runs by the time at which they started,
+    comparing times with different offsets in UTC
+    """
+    startTime, _ = mjc.get_start_time(infoDict)
+    if startTime.tzinfo is not None:
+        startTime = startTime.replace(tzinfo=None) - startTime.utcoffset()
+    return startTime
+#### End of function get_start_sort_key
+
+def get_merged_names(readers, path):
+    """
+    Gets the union of the keys of the objects at the given path of several
+    profiles, in the order in which they are first found
+    """
+    names = []
+    for reader in readers:
+        if path in reader:
+            names += [name for name in reader.get_keys(path) if name not in names]
+    return names
+#### End of function get_merged_names
+
+def __write_array(f, readers, path, counts):
+    """
+    Writes the concatenation of the arrays at the given path of each profile.
+    Profiles without the array have their samples written as null
+    """
+    f.write("[")
+    first = True
+    for reader, count in zip(readers, counts):
+        if count == 0:
+            continue
+        if path in reader:
+            items = json.dumps(reader.get(path))[1:-1]
+        else:
+            items = ", ".join(["null"] * count)
+        if items:
+            f.write(items if first else ", " + items)
+            first = False
+    f.write("]")
+#### End of function __write_array
+
+def __write_sample_section(f, readers, section, counts, indent):
+    """
+    Writes the "metrics" or "activity" section of the merged samples, with the
+    union of the series of all of the profiles
+    """
+    path = "samples/" + section
+    f.write(json.dumps(section) + ": {")
+    for nameInd, name in enumerate(get_merged_names(readers, path)):
+        f.write(("," if nameInd > 0 else "") + "\n" + indent * 3 +
+                json.dumps(name) + ": {")
+        for fieldInd, field in enumerate(get_merged_names(readers,
+                path + "/" + name)):
+            f.write(("," if fieldInd > 0 else "") + "\n" + indent * 4 +
+                    json.dumps(field) + ": ")
+            __write_array(f, readers, path + "/" + name + "/" + field, counts)
+        f.write("\n" + indent * 3 + "}")
+    f.write("\n" + indent * 2 + "}")
+#### End of function __write_sample_section
+
+def merge_profiles(fileList, outfile, sortByStart=True, session=None):
+    """
+    Merges the JSON exports of several MAP profiles of one logical run, such
+    as the runs of a job which was checkpointed and restarted, into a single
+    profile. The samples are concatenated in time order, with the window start
+    offsets of each run following on from the end of the run before, and the
+    runtimes are summed. Metrics and activities which are missing from a run
+    have null (NaN) samples for that run. The info section is that of the
+    first run, without the sections which are only valid for the samples of
+    a whole run (see remove_whole_run_info)
+
+    The merged profile is written one array at a time, and only one array of
+    one input is held in memory at a time, unless the input is already loaded
+    in the session
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP files
+        outfile (str): Name of the file to write the merged profile to
+        sortByStart (bool): Indicates whether to order the runs by their start
+            times rather than the order in which they are given
+        session (ProfileSession): Session holding loaded profiles
+
+    Returns:
+        Dictionary of the info section of the merged profile
+    """
+    assert len(fileList) > 0
+
+    readers = [ProfileReader(filename, session) for filename in fileList]
+    infos = [reader.get("info") for reader in readers]
+    if sortByStart and all("start_time" in info for info in infos):
+        order = sorted(range(len(readers)),
+                key=lambda ind: get_start_sort_key(infos[ind]))
+        readers = [readers[ind] for ind in order]
+        infos = [infos[ind] for ind in order]
+
+    # Each run's windows follow on from the end of the run before
+    counts = []
+    offsets = []
+    runtime = 0
+    mergedEnd = None
+    for reader, info in zip(readers, infos):
+        count = int(reader.get("samples/count"))
+        runProfile = {"info" : info, "samples" : {"window_start_offsets" :
+            reader.get("samples/window_start_offsets")[:count]}}
+        startTimes = mjc.get_window_start_times(runProfile)
+        if len(startTimes) > 0:
+            shift = 0 if mergedEnd is None else mergedEnd - startTimes[0]
+            # Keep integer offsets as integers
+            if shift == int(shift):
+                shift = int(shift)
+            offsets += [start + shift for start in startTimes]
+            mergedEnd = mjc.get_window_end_times(runProfile)[-1] + shift
+        counts.append(count)
+        runtime += mjc.get_runtime(runProfile)
+
+    mergedProfile = {"info" : dict(infos[0]), "samples" : {}}
+    if len(readers) > 1:
+        mjc.remove_whole_run_info(mergedProfile["info"])
+    mjc.set_runtime(mergedProfile, runtime)
+    mjc.set_sample_count(mergedProfile, sum(counts))
+
+    indent = "    "
+    with open(outfile, "w") as f:
+        f.write("{\n" + indent + '"info": ' +
+                json.dumps(mergedProfile["info"], sort_keys=True))
+        # Other top-level values are taken from the first run
+        for key in readers[0].get_keys(""):
+            if key not in ["info", "samples"]:
+                f.write(",\n" + indent + json.dumps(key) + ": " +
+                        json.dumps(readers[0].get(key), sort_keys=True))
+        f.write(",\n" + indent + '"samples": {\n' + indent * 2 + '"count": ' +
+                json.dumps(mergedProfile["samples"]["count"]) + ",\n" +
+                indent * 2 + '"window_start_offsets": ' + json.dumps(offsets) +
+                ",\n" + indent * 2)
+        __write_sample_section(f, readers, "metrics", counts, indent)
+        if any("samples/activity" in reader for reader in readers):
+            f.write(",\n" + indent * 2)
+            __write_sample_section(f, readers, "activity", counts, indent)
+        f.write("\n" + indent + "}\n}\n")
+
+    return mergedProfile["info"]
+#### End of function merge_profiles
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Merges the JSON exports of" +
+            " several MAP profiles of one logical run, such as the runs of a" +
+            " job which was checkpointed and restarted, into one continuous" +
+            " profile. The samples are concatenated in order of the start" +
+            " times of the runs, and metrics missing from a run are filled" +
+            " with null values")
+
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("-o", "--outfile", help="Name of the file to write the" +
+            " merged profile to", required=True)
+    parser.add_argument("--keepOrder", help="Merge the runs in the order in" +
+            " which they are given rather than by start time",
+            action="store_true")
+
+    # Parse the arguments
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+
+    if session is None:
+        session = ProfileSession()
+    merge_profiles(fileList, args.outfile, not args.keepOrder, session)
+    # Any earlier contents of the output file are no longer valid
+    session.evict(args.outfile)
+    print("Merged " + str(len(fileList)) + " profiles into " + args.outfile)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Load imbalance of the metrics of MAP profiles. Each sample of a metric holds
+# the minimum, mean and maximum over the processes, so the imbalance at each
+# sample is (max - mean) / max, the fraction of the time of the slowest
+# process which the others spend waiting, along with max / min
+#
+import argparse
+import csv
+import heapq
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from map_json_common import *
+from time_weighting import get_time_weighted_mean
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from plot_data_common import print_table
+
+# Whole run values by which metrics can be ranked
+rankCriteria = ["imbalance", "ratio", "peak"]
+metricFields = ["file", "metric", "imbalance", "ratio", "mean_imbalance",
+        "peak", "peak_time"]
+windowFields = ["file", "metric", "sample", "time", "imbalance", "ratio"]
+
+def get_metric_arrays(profileDict, metrics=None):
+    """
+    Gets the minimums, means and maximums over processes of the samples of
+    the metrics of a profile as 2-D arrays
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metrics (list): Names of the metrics to get. Default is all of the
+            metrics which have minimums and maximums, other than running
+            totals (see is_running_total), whose spread over processes grows
+            with the length of the run rather than with its imbalance
+
+    Returns:
+        Tuple of (list of metric names, 2-D NumPy arrays of mins, means and
+        maxs with one row per metric and one column per sample). Missing
+        samples are NaN
+    """
+    metricDict = get_samples(profileDict)
+    fields = ["mins", "means", "maxs"]
+    if metrics is None:
+        metrics = [metric for metric in metricDict if
+                not is_running_total(metric) and
+                all(field in metricDict[metric] for field in fields)]
+    for metric in metrics:
+        if metric not in metricDict:
+            raise KeyError("Unable to find metric " + metric + " in profile")
+
+    numSamples = get_sample_count(profileDict)
+    arrays = []
+    for field in fields:
+        values = np.full((len(metrics), numSamples), np.nan)
+        for row, metric in enumerate(metrics):
+            samples = np.array(metricDict[metric][field][:numSamples],
+                    dtype=np.float64)
+            values[row, :len(samples)] = samples
+        arrays.append(values)
+    return [metrics] + arrays
+#### End of function get_metric_arrays
+
+def get_imbalance_ratios(mins, means, maxs):
+    """
+    Gets the imbalance ratios (max - mean) / max and max / min of values
+    which may be arrays of any shape. Ratios with a divisor which is not
+    positive are NaN
+
+    Returns:
+        Tuple of NumPy arrays (imbalance, ratio)
+    """
+    mins, means, maxs = [np.asarray(values, dtype=np.float64) for values in
+            [mins, means, maxs]]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        imbalance = np.where(maxs > 0, (maxs - means) / maxs, np.nan)
+        ratio = np.where(mins > 0, maxs / mins, np.nan)
+    return imbalance, ratio
+#### End of function get_imbalance_ratios
+
+def get_profile_imbalance(profile, metrics=None, loadFunc=load_profile):
+    """
+    Gets the imbalance of every metric of a profile at each sample and over
+    the whole run, all metrics at once
+
+    Args:
+        profile: Name of the JSON export of a MAP profile, or the dictionary
+            of values representing it
+        metrics (list): Names of the metrics. Default is all of them
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Dictionary with the fields "metrics" (list of names), "times"
+        (NumPy array of the start of each window), "sample_imbalance" and
+        "sample_ratio" (2-D NumPy arrays of the ratios at each sample),
+        "imbalance" and "ratio" (ratios of the time weighted means of the
+        maximums, means and minimums of each metric), "mean_imbalance" (time
+        weighted mean of the imbalance at each sample), "peak" (greatest
+        imbalance at any sample) and "peak_time"
+    """
+    profileDict = profile if isinstance(profile, dict) else loadFunc(profile)
+    metrics, mins, means, maxs = get_metric_arrays(profileDict, metrics)
+    numSamples = mins.shape[1]
+    times = np.array(get_window_start_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    sampleImbalance, sampleRatio = get_imbalance_ratios(mins, means, maxs)
+
+    result = {"metrics" : metrics, "times" : times,
+            "sample_imbalance" : sampleImbalance, "sample_ratio" : sampleRatio}
+    if len(metrics) == 0 or numSamples == 0:
+        for field in ["imbalance", "ratio", "mean_imbalance", "peak",
+                "peak_time"]:
+            result[field] = np.full(len(metrics), np.nan)
+        return result
+
+    runMins, runMeans, runMaxs = [get_time_weighted_mean(profileDict, values)
+            for values in [mins, means, maxs]]
+    result["imbalance"], result["ratio"] = get_imbalance_ratios(runMins,
+            runMeans, runMaxs)
+    result["mean_imbalance"] = get_time_weighted_mean(profileDict,
+            sampleImbalance)
+    # Metrics with no valid samples have no peak
+    present = ~np.all(np.isnan(sampleImbalance), axis=1)
+    peakInds = np.argmax(np.where(np.isnan(sampleImbalance), -np.inf,
+        sampleImbalance), axis=1)
+    rows = np.arange(len(metrics))
+    result["peak"] = np.where(present, sampleImbalance[rows, peakInds], np.nan)
+    result["peak_time"] = np.where(present, times[peakInds], np.nan)
+    return result
+#### End of function get_profile_imbalance
+
+def get_top_metrics(result, k=10, criterion="imbalance"):
+    """
+    Gets the k most imbalanced metrics of a profile, using a heap rather than
+    sorting all of the metrics
+
+    Args:
+        result (dict): Imbalance of a profile (see get_profile_imbalance)
+        k (int): Number of metrics to return
+        criterion (str): Field of result by which to rank the metrics. One
+            of rankCriteria
+
+    Returns:
+        List of the indices of the metrics in result["metrics"], most
+        imbalanced first. Metrics for which the criterion is NaN are left out
+    """
+    assert criterion in rankCriteria
+    values = result[criterion]
+    return heapq.nlargest(k, np.flatnonzero(~np.isnan(values)),
+            key=lambda ind: values[ind])
+#### End of function get_top_metrics
+
+def get_top_windows(result, k=10):
+    """
+    Gets the k most imbalanced samples over all of the metrics of a profile.
+    The k most imbalanced samples of each metric are first selected with a
+    partial sort, and the overall k taken from these with a heap
+
+    Args:
+        result (dict): Imbalance of a profile (see get_profile_imbalance)
+        k (int): Number of samples to return
+
+    Returns:
+        List of tuples of (metric index, sample index), most imbalanced first
+    """
+    values = np.where(np.isnan(result["sample_imbalance"]), -np.inf,
+            result["sample_imbalance"])
+    numSamples = values.shape[1]
+    if k <= 0 or values.size == 0:
+        return []
+    if k < numSamples:
+        candidates = np.argpartition(values, numSamples - k, axis=1)[:,
+                numSamples - k:]
+    else:
+        candidates = np.tile(np.arange(numSamples), (values.shape[0], 1))
+    pairs = [(row, int(col)) for row in range(values.shape[0]) for col in
+            candidates[row] if values[row, col] > -np.inf]
+    return heapq.nlargest(k, pairs, key=lambda pair: values[pair])
+#### End of function get_top_windows
+
+def __to_value(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+#### End of function __to_value
+
+def summarise_imbalance(profile, metrics=None, k=10, criterion="imbalance",
+        loadFunc=load_profile):
+    """
+    Gets the rows of the imbalance report of a profile
+
+    Args:
+        profile: Name of the JSON export of a MAP profile, or the dictionary
+            of values representing it
+        metrics (list): Names of the metrics. Default is all of them
+        k (int): Number of metrics and of samples to report
+        criterion (str): One of rankCriteria
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of (list of dictionaries with the fields in metricFields for
+        the k most imbalanced metrics, list of dictionaries with the fields
+        in windowFields for the k most imbalanced samples)
+    """
+    result = get_profile_imbalance(profile, metrics, loadFunc)
+    name = profile if not isinstance(profile, dict) else None
+    metricRows = [dict([("file", name), ("metric", result["metrics"][ind])] +
+        [(field, __to_value(result[field][ind])) for field in metricFields[2:]])
+        for ind in get_top_metrics(result, k, criterion)]
+    windowRows = [{"file" : name, "metric" : result["metrics"][row],
+        "sample" : col, "time" : __to_value(result["times"][col]),
+        "imbalance" : __to_value(result["sample_imbalance"][row, col]),
+        "ratio" : __to_value(result["sample_ratio"][row, col])}
+        for row, col in get_top_windows(result, k)]
+    return metricRows, windowRows
+#### End of function summarise_imbalance
+
+def get_imbalance_report(fileList, metrics=None, k=10, criterion="imbalance",
+        jobs=1, loadFunc=load_profile):
+    """
+    Gets the imbalance report of each of a list of profiles, processing
+    several files at once if requested
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        metrics (list): Names of the metrics. Default is all of them
+        k (int): Number of metrics and of samples to report per file
+        criterion (str): One of rankCriteria
+        jobs (int): Number of files to process concurrently. Each worker
+            reads its own profiles, so loadFunc is only used with one job
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of (list of the metric rows, list of the sample rows) of all of
+        the files, in the order of fileList (see summarise_imbalance)
+    """
+    if jobs > 1 and len(fileList) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(summarise_imbalance, filename, metrics,
+                k, criterion) for filename in fileList]
+            summaries = [future.result() for future in futures]
+    else:
+        summaries = [summarise_imbalance(filename, metrics, k, criterion,
+            loadFunc) for filename in fileList]
+    return [row for metricRows, _ in summaries for row in metricRows], \
+            [row for _, windowRows in summaries for row in windowRows]
+#### End of function get_imbalance_report
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Reports the load imbalance" +
+            " of the metrics of JSON format MAP files, from the minimum, mean" +
+            " and maximum over processes of each sample. The most imbalanced" +
+            " metrics of each file and the most imbalanced samples are listed")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("--metrics", help="Names of the metrics to report." +
+            " Default is all of them other than running totals (metrics" +
+            " named *_total)", nargs="+", default=None)
+    parser.add_argument("-k", "--top", help="Number of metrics and of samples" +
+            " to list per file. Default is 10", type=int, default=10)
+    parser.add_argument("--rankBy", help="Whole run value by which to rank the" +
+            " metrics: imbalance is (max - mean) / max of the time weighted" +
+            " means, ratio is max / min, and peak is the greatest imbalance" +
+            " of any sample. Default is imbalance", choices=rankCriteria,
+            default="imbalance")
+    parser.add_argument("-j", "--jobs", help="Number of input files to" +
+            " process concurrently", type=int, default=1)
+    outGroup = parser.add_mutually_exclusive_group()
+    outGroup.add_argument("--csv", help="Write the metric report in CSV format",
+            action="store_true")
+    outGroup.add_argument("--json", help="Write both reports in JSON format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+    if args.top < 1:
+        parser.error("the number to list must be positive")
+
+    if session is None:
+        session = ProfileSession()
+    try:
+        metricRows, windowRows = get_imbalance_report(fileList, args.metrics,
+                args.top, args.rankBy, args.jobs, session.load)
+    except KeyError as err:
+        parser.error(err.args[0])
+
+    if args.json:
+        print(json.dumps({"metrics" : metricRows, "samples" : windowRows},
+            indent=4))
+    elif args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=metricFields)
+        writer.writeheader()
+        writer.writerows(metricRows)
+    else:
+        print_table(metricRows, metricFields)
+        print("")
+        print_table(windowRows, windowFields)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import json
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from derived_metrics import is_expression, get_metric_values, ExpressionCache
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+
+pyramidStats = ["mins", "maxs", "means"]
+# Extension added to the name of a JSON export for its persisted pyramid, and
+# the version of the pyramid format
+pyramidExtension = ".pyr.npz"
+pyramidVersion = 1
+
+def get_metric_series(profileDict, metricName, activityName="main_thread"):
+    """
+    Gets the minimum, maximum and mean samples of a metric. If the name is not
+    that of a sampled metric, the activity timeline with that name is used,
+    for which the three are the same. An expression over metrics (see
+    derived_metrics.py) is evaluated on each of the three fields
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metricName (str): Name of a sampled metric or of an activity, or an
+            expression
+        activityName (str): Name of the activity timeline to look in
+
+    Returns:
+        Tuple of NumPy arrays (mins, maxs, means)
+    """
+    if is_expression(metricName, profileDict):
+        cache = ExpressionCache()
+        return tuple(get_metric_values(profileDict, metricName, stat, cache)
+                for stat in pyramidStats)
+
+    if metricName in get_samples(profileDict):
+        sampleDict = get_metric_samples_for_keys(get_samples(profileDict),
+                [metricName], pyramidStats)
+        return tuple(np.array(samples, dtype=np.float64)
+                for samples in sampleDict[metricName])
+
+    sampleDict = {}
+    if "activity" in profileDict["samples"]:
+        sampleDict = get_activity_samples(profileDict["samples"]["activity"],
+                [metricName], activityName)
+    if not sampleDict:
+        raise KeyError("Unable to find metric " + metricName + " in profile")
+    samples = np.array(sampleDict[metricName], dtype=np.float64)
+    return samples, samples, samples
+#### End of function get_metric_series
+
+def get_activity_names(profileDict, activityName="main_thread"):
+    try:
+        return list(profileDict["samples"]["activity"][activityName].keys())
+    except KeyError:
+        return []
+#### End of function get_activity_names
+
+class MetricPyramid(object):
+    """
+    Aggregates of the samples of a metric at power of two resolutions. Level
+    zero holds the samples themselves, and each bin of level k combines two
+    bins of level k - 1: the minimum of the minimums, the maximum of the
+    maximums, and the mean of the means weighted by the length of the window
+    of each sample. All levels share the window times of the samples
+    """
+
+    def __init__(self, starts, ends, levels):
+        """
+        Args:
+            starts (array): Start times of the sampling windows
+            ends (array): End times of the sampling windows
+            levels (list): List with one tuple of (mins, maxs, means) arrays
+                per level, starting from the samples
+        """
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.levels = levels
+
+    @staticmethod
+    def build(starts, ends, mins, maxs, means):
+        """
+        Builds the pyramid of aggregates of the given samples
+
+        Args:
+            starts (array): Start times of the sampling windows
+            ends (array): End times of the sampling windows
+            mins, maxs, means (array): Samples of the metric
+
+        Returns:
+            A MetricPyramid
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        widths = ends - starts
+        levels = [(mins, maxs, means)]
+        while len(widths) > 1:
+            numPairs = len(widths) // 2
+            evens = slice(0, 2 * numPairs, 2)
+            odds = slice(1, 2 * numPairs, 2)
+            # Missing samples carry no weight in the mean
+            weights = np.where(np.isnan(means), 0.0, widths)
+            weighted = np.where(np.isnan(means), 0.0, means * widths)
+            pairWeights = weights[evens] + weights[odds]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                pairMeans = (weighted[evens] + weighted[odds]) / pairWeights
+            pairMins = np.fmin(mins[evens], mins[odds])
+            pairMaxs = np.fmax(maxs[evens], maxs[odds])
+            pairWidths = widths[evens] + widths[odds]
+            if len(widths) % 2 == 1:
+                # The last bin has no partner, and is carried up unchanged
+                pairMins = np.append(pairMins, mins[-1])
+                pairMaxs = np.append(pairMaxs, maxs[-1])
+                pairMeans = np.append(pairMeans, means[-1])
+                pairWidths = np.append(pairWidths, widths[-1])
+            mins, maxs, means, widths = pairMins, pairMaxs, pairMeans, pairWidths
+            levels.append((mins, maxs, means))
+        return MetricPyramid(starts, ends, levels)
+    #### End of function build
+
+    def get_range(self, startTime=None, endTime=None, maxPoints=1000):
+        """
+        Gets the aggregates of the samples whose windows overlap a range of
+        time, from the finest level with at most the given number of bins in
+        the range
+
+        Args:
+            startTime (float): Start of the range in milliseconds. Default is
+                the start of the run
+            endTime (float): End of the range in milliseconds. Default is the
+                end of the run
+            maxPoints (int): Largest number of bins to return
+
+        Returns:
+            Tuple of NumPy arrays (starts, ends, mins, maxs, means) with the
+            start and end time and the aggregates of each bin
+        """
+        assert maxPoints > 0
+        numSamples = len(self.starts)
+        firstInd = 0 if startTime is None else \
+                int(np.searchsorted(self.ends, startTime, side="right"))
+        lastInd = numSamples if endTime is None else \
+                int(np.searchsorted(self.starts, endTime, side="left"))
+        if lastInd <= firstInd:
+            empty = np.zeros(0, dtype=np.float64)
+            return empty, empty, empty, empty, empty
+
+        level = 0
+        while ((lastInd - 1) >> level) - (firstInd >> level) + 1 > maxPoints \
+                and level + 1 < len(self.levels):
+            level += 1
+        firstBin = firstInd >> level
+        lastBin = ((lastInd - 1) >> level) + 1
+        binSize = 1 << level
+        starts = self.starts[firstBin * binSize:lastBin * binSize:binSize]
+        ends = self.ends[np.minimum(np.arange(firstBin + 1, lastBin + 1) *
+            binSize, numSamples) - 1]
+        mins, maxs, means = self.levels[level]
+        return (starts, ends, mins[firstBin:lastBin], maxs[firstBin:lastBin],
+                means[firstBin:lastBin])
+    #### End of function get_range
+#### End of class MetricPyramid
+
+def build_metric_pyramid(profileDict, metricName):
+    """
+    Builds the pyramid of aggregates of a single metric or activity of a
+    profile
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        metricName (str): Name of a sampled metric or of an activity
+
+    Returns:
+        A MetricPyramid
+    """
+    mins, maxs, means = get_metric_series(profileDict, metricName)
+    numSamples = get_sample_count(profileDict)
+    starts = get_window_start_times(profileDict)[:numSamples]
+    ends = get_window_end_times(profileDict)[:numSamples]
+    return MetricPyramid.build(starts, ends, mins[:numSamples],
+            maxs[:numSamples], means[:numSamples])
+#### End of function build_metric_pyramid
+
+def get_pyramid_file_name(filename):
+    """
+    Gets the name of the file a profile's pyramids are persisted to
+    """
+    return filename + pyramidExtension
+#### End of function get_pyramid_file_name
+
+def save_profile_pyramids(filename, profileDict):
+    """
+    Builds the pyramids of all of the metrics and main thread activities of a
+    profile, and saves them to a file alongside the profile
+
+    Args:
+        filename (str): Name of the JSON export of the profile
+        profileDict (dict): Dictionary of values representing the profile
+
+    Returns:
+        Dictionary of MetricPyramid keyed by metric name
+    """
+    fileStat = os.stat(filename)
+    pyramids = {}
+    for metricName in list(get_samples(profileDict).keys()) + \
+            get_activity_names(profileDict):
+        if metricName not in pyramids:
+            pyramids[metricName] = build_metric_pyramid(profileDict, metricName)
+
+    arrays = {}
+    starts = ends = np.zeros(0)
+    for ind, metricName in enumerate(sorted(pyramids)):
+        pyramid = pyramids[metricName]
+        starts, ends = pyramid.starts, pyramid.ends
+        for level, stats in enumerate(pyramid.levels):
+            for stat, data in zip(pyramidStats, stats):
+                arrays[str(ind) + "/" + str(level) + "/" + stat] = data
+    meta = {"version" : pyramidVersion, "size" : fileStat.st_size,
+            "mtime" : fileStat.st_mtime, "metrics" : sorted(pyramids),
+            "levels" : [len(pyramids[name].levels) for name in sorted(pyramids)]}
+    with open(get_pyramid_file_name(filename), "wb") as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta)), starts=starts,
+                ends=ends, **arrays)
+    return pyramids
+#### End of function save_profile_pyramids
+
+def load_metric_pyramid(filename, metricName):
+    """
+    Loads the pyramid of one metric from the file saved alongside a profile.
+    Only the arrays of that metric are read
+
+    Args:
+        filename (str): Name of the JSON export of the profile
+        metricName (str): Name of a sampled metric or of an activity
+
+    Returns:
+        A MetricPyramid, or None if the pyramids have not been saved, are out
+        of date or do not include the metric
+    """
+    try:
+        fileStat = os.stat(filename)
+        data = np.load(get_pyramid_file_name(filename))
+    except (IOError, OSError, ValueError):
+        return None
+    with data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != pyramidVersion or \
+                meta.get("size") != fileStat.st_size or \
+                meta.get("mtime") != fileStat.st_mtime or \
+                metricName not in meta["metrics"]:
+            return None
+        ind = meta["metrics"].index(metricName)
+        levels = [tuple(data[str(ind) + "/" + str(level) + "/" + stat]
+            for stat in pyramidStats) for level in range(meta["levels"][ind])]
+        return MetricPyramid(data["starts"], data["ends"], levels)
+#### End of function load_metric_pyramid
+
+def get_metric_pyramid(profile, metricName, loadFunc=load_profile):
+    """
+    Gets the pyramid of a metric. For a file name, the pyramid saved alongside
+    the profile is used, and the pyramids of the profile are built and saved
+    if they are missing or out of date. For a profile dictionary, the pyramid
+    is built in memory
+
+    Args:
+        profile: Name of the JSON export of a profile, or the dictionary of
+            values representing it
+        metricName (str): Name of a sampled metric or of an activity
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        A MetricPyramid
+    """
+    if isinstance(profile, dict):
+        return build_metric_pyramid(profile, metricName)
+    profileDict = None
+    if is_expression(metricName):
+        # Only the pyramids of the metrics themselves are saved
+        profileDict = loadFunc(profile)
+        if is_expression(metricName, profileDict):
+            return build_metric_pyramid(profileDict, metricName)
+
+    pyramid = load_metric_pyramid(profile, metricName)
+    if pyramid is not None:
+        return pyramid
+    if profileDict is None:
+        profileDict = loadFunc(profile)
+    try:
+        pyramids = save_profile_pyramids(profile, profileDict)
+    except (IOError, OSError):
+        # The profile may be in a read only folder, or in an archive
+        return build_metric_pyramid(profileDict, metricName)
+    if metricName not in pyramids:
+        return build_metric_pyramid(profileDict, metricName)
+    return pyramids[metricName]
+#### End of function get_metric_pyramid
+
+def get_metric_range(profile, metric, t0=None, t1=None, max_points=1000,
+        loadFunc=load_profile):
+    """
+    Gets the minimum, maximum and mean of a metric over the windows between
+    two times, at the finest resolution which gives at most max_points values
+
+    Args:
+        profile: Name of the JSON export of a profile, or the dictionary of
+            values representing it
+        metric (str): Name of a sampled metric or of an activity
+        t0 (float): Start of the range in milliseconds. Default is the start
+            of the run
+        t1 (float): End of the range in milliseconds. Default is the end of
+            the run
+        max_points (int): Largest number of values to return
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of NumPy arrays (starts, ends, mins, maxs, means) with the start
+        and end time and the aggregates of each value
+    """
+    return get_metric_pyramid(profile, metric, loadFunc).get_range(t0, t1,
+            max_points)
+#### End of function get_metric_range
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Builds the pyramids of" +
+            " minimum, maximum and mean aggregates of the metrics in JSON" +
+            " format MAP files at power of two resolutions, and saves them" +
+            " alongside each file (<file>" + pyramidExtension + ")")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if session is None:
+        session = ProfileSession()
+    for infile in args.infiles:
+        pyramids = save_profile_pyramids(infile, session.load(infile))
+        print("Written pyramids of " + str(len(pyramids)) + " metrics to " +
+                get_pyramid_file_name(infile))
+#### End of function main
+
+if __name__ == "__main__":
+    main()
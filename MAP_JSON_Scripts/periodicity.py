@@ -0,0 +1,117 @@
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Detection of the period of signals sampled at equal intervals from their
+# autocorrelation, shared by the detection of phases and of iterations
+#
+import numpy as np
+
+def get_autocorrelation(signals, summed=False):
+    """
+    Gets the autocorrelation of each of a set of signals, using the FFT of
+    all of them at once. The mean of each signal is removed, and missing
+    (NaN) values are taken to be the mean
+
+    Args:
+        signals (array): 2-D array with one row per signal
+        summed (bool): Indicates whether to sum the autocovariances of the
+            signals before normalising, so that each signal is weighted by
+            its variance, and return a single autocorrelation
+
+    Returns:
+        2-D NumPy array with the autocorrelation of each signal at each lag,
+        normalised to one at lag zero, or a 1-D NumPy array if summed. Rows of
+        signals which do not vary are zero
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    numSamples = signals.shape[1]
+    with np.errstate(invalid="ignore"):
+        centred = signals - np.nanmean(signals, axis=1, keepdims=True) \
+                if numSamples > 0 and signals.shape[0] > 0 else signals
+    centred = np.where(np.isnan(centred), 0., centred)
+    # Zero padding to twice the length gives the linear rather than the
+    # circular correlation
+    spectra = np.fft.rfft(centred, n=2 * numSamples, axis=1)
+    acf = np.fft.irfft(spectra * np.conj(spectra), n=2 * numSamples,
+            axis=1)[:, :numSamples]
+    if summed:
+        acf = acf.sum(axis=0, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        acf = np.where(acf[:, :1] > 0, acf / acf[:, :1], 0.)
+    return acf[0] if summed else acf
+#### End of function get_autocorrelation
+
+def get_acf_peaks(acf, maxLag=None):
+    """
+    Finds the peaks of an autocorrelation after it first falls below zero
+
+    Args:
+        acf (array): Autocorrelation at each lag, normalised to one at lag
+            zero
+        maxLag (int): Largest lag to search. Default is half of the lags
+
+    Returns:
+        NumPy array of the lags of the peaks which are above zero
+    """
+    acf = np.asarray(acf, dtype=np.float64)
+    if maxLag is None:
+        maxLag = len(acf) // 2
+    maxLag = min(maxLag, len(acf) - 1)
+    belowZero = np.flatnonzero(acf[:maxLag] < 0)
+    if len(belowZero) == 0:
+        return np.array([], dtype=np.int64)
+    lags = np.arange(max(belowZero[0], 1), maxLag)
+    isPeak = (acf[lags] > 0) & (acf[lags] >= acf[lags - 1]) & \
+            (acf[lags] > acf[lags + 1])
+    return lags[isPeak]
+#### End of function get_acf_peaks
+
+def find_period(acf, minStrength=0.3, peakFraction=0.8, maxLag=None):
+    """
+    Finds the dominant period of an autocorrelation, refined by fitting a
+    parabola to its peak. The autocorrelation of a periodic signal has peaks
+    at each multiple of the period, and a set up phase or a slow trend can
+    make a later one the highest, so the period is the first peak after the
+    autocorrelation first falls below zero which is within peakFraction of
+    the highest
+
+    Args:
+        acf (array): Autocorrelation at each lag, normalised to one at lag
+            zero
+        minStrength (float): Smallest autocorrelation at the peak for the
+            signal to be taken as periodic
+        peakFraction (float): Fraction of the highest peak which the first
+            peak has to reach to be taken as the period
+        maxLag (int): Largest lag to search. Default is half of the lags
+
+    Returns:
+        Tuple of (period in samples, autocorrelation at the peak), or (None,
+        None) if there is no period
+    """
+    acf = np.asarray(acf, dtype=np.float64)
+    peaks = get_acf_peaks(acf, maxLag)
+    if len(peaks) == 0 or acf[peaks].max() < minStrength:
+        return None, None
+    lag = int(peaks[np.flatnonzero(acf[peaks] >= peakFraction *
+        acf[peaks].max())[0]])
+    strength = float(acf[lag])
+
+    period = float(lag)
+    if 0 < lag < len(acf) - 1:
+        left, centre, right = acf[lag - 1], acf[lag], acf[lag + 1]
+        curvature = left - 2 * centre + right
+        if curvature < 0:
+            period += 0.5 * (left - right) / curvature
+    return period, strength
+#### End of function find_period
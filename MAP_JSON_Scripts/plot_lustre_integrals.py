@@ -13,29 +13,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import json
 import argparse
 from map_json_common import *
-
-def plot_lustre_read_approx_integrals(profileDict):
+from integrate_rates import integrate_rates
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
+
+def get_lustre_read_approx_integrals(profileDict):
+    """
+    Gets the approximate integral of the Lustre read rate, along with the
+    total bytes read from Lustre recorded in the profile
+
+    Args:
+        profileDict (dict): Dictionary of the JSON format of a MAP profile
+
+    Returns:
+        Tuple of lists (approximate bytes read, actual bytes read)
+    """
     assert isinstance(profileDict, dict)
 
-    # Get the field for the lustre read rate
-    samples= get_metric_key_samples(profileDict["samples"]["metrics"], ["lustre_bytes_read"], "means")
-    lustReadRate= samples["lustre_bytes_read"]
+    # Integrate the Lustre read rate over the sampling windows, which are
+    # of uneven length
+    result= integrate_rates(profileDict, ["lustre_bytes_read"])["lustre_bytes_read"]
+    lustReadRate= result["integral"].tolist()
 
-    # Get the field for the total bytes read from lustre
+    # Get the field for the total bytes read from Lustre
     samples= get_metric_key_samples(profileDict["samples"]["metrics"], ["lustre_rchar_total"], "sums")
     lustReadTotal= samples["lustre_rchar_total"]
 
-    # Calcualte the approximate integral for the lustre read rate
-    sampleLen= get_sample_interval(profileDict) / 1000. # convert to seconds rather than milliseconds
-    numNodes= get_num_nodes(profileDict)
+    return lustReadRate, lustReadTotal
+#### End of function get_lustre_read_approx_integrals
+
+def plot_lustre_read_approx_integrals(profileDict):
+    import matplotlib.pyplot as plt
 
-    lustReadRate[0]= lustReadRate[0] * sampleLen * numNodes
-    for i in range(1,len(lustReadRate)):
-        lustReadRate[i] = lustReadRate[i-1] + lustReadRate[i] * sampleLen * numNodes
+    lustReadRate, lustReadTotal= get_lustre_read_approx_integrals(profileDict)
 
     # Plot the approximate integrals
     lineHandles= []
@@ -47,24 +64,35 @@ def plot_lustre_read_approx_integrals(profileDict):
     plt.legend(handles=lineHandles, loc=1, bbox_to_anchor=(0.5, 1.1))
 #### End of plot_lustre_read_approx_integrals
 
-def plot_lustre_write_approx_integrals(profileDict):
+def get_lustre_write_approx_integrals(profileDict):
+    """
+    Gets the approximate integral of the Lustre write rate, along with the
+    total bytes written to Lustre recorded in the profile
+
+    Args:
+        profileDict (dict): Dictionary of the JSON format of a MAP profile
+
+    Returns:
+        Tuple of lists (approximate bytes written, actual bytes written)
+    """
     assert isinstance(profileDict, dict)
 
-    # Get the samples for the Lustre write rate
-    samples= get_metric_key_samples(profileDict["samples"]["metrics"], ["lustre_bytes_written"], "means")
-    lustWriteRate= samples["lustre_bytes_written"]
+    # Integrate the Lustre write rate over the sampling windows, which are
+    # of uneven length
+    result= integrate_rates(profileDict, ["lustre_bytes_written"])["lustre_bytes_written"]
+    lustWriteRate= result["integral"].tolist()
 
-    # Get the field for the rate of MPI collective calls
+    # Get the field for the total bytes written to Lustre
     samples= get_metric_key_samples(profileDict["samples"]["metrics"], ["lustre_wchar_total"], "sums")
     lustWriteTotal= samples["lustre_wchar_total"]
 
-    # Calculate the approximate integral for the lustre write rate
-    sampleLen= get_sample_interval(profileDict) / 1000. # convert to milliseconds
-    numNodes= get_num_nodes(profileDict)
+    return lustWriteRate, lustWriteTotal
+#### End of function get_lustre_write_approx_integrals
 
-    lustWriteRate[0]= lustWriteRate[0] * sampleLen * numNodes
-    for i in range(1,len(lustWriteRate)):
-        lustWriteRate[i] = lustWriteRate[i-1] + lustWriteRate[i] * sampleLen * numNodes
+def plot_lustre_write_approx_integrals(profileDict):
+    import matplotlib.pyplot as plt
+
+    lustWriteRate, lustWriteTotal= get_lustre_write_approx_integrals(profileDict)
 
     # Plot the approximate integral
     lineHandles= []
@@ -77,26 +105,51 @@ def plot_lustre_write_approx_integrals(profileDict):
     plt.show()
 #### End of function plot_lustre_write_approx_integrals
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot multiple time dependent metrics" +
         " contained in the JSON export of an Allinea MAP file")
 
     # Add a file to read input from
-    parser.add_argument("infile", help="JSON file to read MAP profile information from",
-        type=argparse.FileType('r'))
+    parser.add_argument("infile", help="JSON file to read MAP profile information from")
+    add_emit_data_argument(parser)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the JSON as a dictionary
-    profileDict = json.load(args.infile)
+    profileDict = session.load(args.infile)
 
     # Read in a single JSON file and plot the metrics
-    fileName = args.infile.name.split('/')[-1]
-
+    fileName = os.path.basename(args.infile)
+
+    if args.emitData:
+        # Write out the integrals and totals rather than plotting them
+        writeRate, writeTotal = get_lustre_write_approx_integrals(profileDict)
+        readRate, readTotal = get_lustre_read_approx_integrals(profileDict)
+        emit_plot_data([(label, range(len(data)), data) for label, data in
+            [("Approx bytes written", writeRate), ("Actual bytes written", writeTotal),
+             ("Approx bytes read", readRate), ("Actual bytes read", readTotal)]],
+            args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Plot the write rate integrals as well as the totals
     plot_lustre_write_approx_integrals(profileDict)
     # Plot the read reate integrals as well as the totals
     plot_lustre_read_approx_integrals(profileDict)
     plt.show()
-#### End of main program
+#### End of function main
+
+if __name__ == "__main__":
+    main()
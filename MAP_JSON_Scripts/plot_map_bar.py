@@ -13,94 +13,53 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
 from math import log
 from map_json_common import *
+from time_weighting import get_time_weighted_mean
+from derived_metrics import get_metric_values
+import os
 import sys
-sys.path.append('../JSON_Common')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
+from scaling_models import scalingDefs, modelNames, get_scaling_label, \
+        is_decreasing, get_ideal_line, get_fitted_lines
 
-scalingDefs = { 'constant' : (lambda x, y : 1.),
-            'lineard' : (lambda x, y : float(x) / y),
-            'lineari' : (lambda x, y : float(y) / x),
-            'quadraticd' : (lambda x, y : float(x**2) / y**2),
-            'quadratici' : (lambda x, y : float(y**2) / x**2)
-            }
-
-def get_ideal_func(expected):
-    return scalingDefs[expected]
-#### End of function get_ideal_func
-
-def get_scaling_label(expected):
-    assert isinstance(expected, str)
-    return expected[0:-1] if expected[-1] == "i" or expected[-1] == "d" else expected
-#### End of function get_scaling_label
-
-def is_decreasing(scaling):
-    assert isinstance(scaling, str)
-    return scaling[-1] == "d"
-#### End of function is_decreasing
-
-def get_ideal_line(initTime, coreCounts, expected):
-    """
-    Gets data for an ideal scaling line in either the weak or strong case.
-
-    Args:
-        initTime (float): The initial time from which to draw an ideal scaling
-        coreCounts (list): List of counts of cores from which the ideal line
-            can be calculated
-        expected (str): Indicates what sort of scaling is expected for the
-            ideal line
-    """
-
-    idealData = [0. for _ in coreCounts]
-    idealData[0] = initTime
-
-    scalingFunc = get_ideal_func(expected)
-    for i in range(1,len(coreCounts)):
-        idealData[i] = idealData[i-1] * scalingFunc(coreCounts[i-1], coreCounts[i])
-
-    return idealData
-#### End of function get_ideal_line
-
-def get_avgs(fileList, metric, threads, indFrom, indTo):
+def get_avgs(fileList, metric, threads, indFrom, indTo, loadFunc=load_profile):
     # Initialise the y-data to an empty list
     ys = dict()
     xs = []
     # For each file
     for filename in fileList:
         # Read the JSON dictionary in
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
 
         # Get the number of threads / processes used
         numProcs = get_num_threads(profileDict) if threads else get_num_processes(profileDict)
         xs.append(numProcs)
 
-        # Get the mean of the metric
+        # Get the mean of the metric, which can be an expression over metrics
         #profileDict= profileDict["samples"]["metrics"]
-        means = get_dict_field_val(profileDict["samples"]["metrics"], [metric, "means"])
-        if indTo == -1:
-            indTo = len(means)
-
-        means = means[indFrom:indTo]
+        means = get_metric_values(profileDict, metric, "means")
 
-        # Take the average of the mean
-        ys[numProcs] = get_avg_over_samples(means)
+        # Take the average of the mean, weighted by the length of each
+        # sampling window
+        ys[numProcs] = get_time_weighted_mean(profileDict, means, indFrom, indTo)
 
     return xs, ys
 #### End of function get_avgs
 
-def get_total(fileList, metric, threads, indFrom, indTo):
+def get_total(fileList, metric, threads, indFrom, indTo, loadFunc=load_profile):
     ys = dict()
     xs = []
     # For each file
     for filename in fileList:
         # Read the JSON dictionary in
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
 
         # Get the number of processes / threads used
         numProcs = get_num_threads(profileDict) if threads else get_num_processes(profileDict)
@@ -108,8 +67,7 @@ def get_total(fileList, metric, threads, indFrom, indTo):
 
         # Get the 'total' of the metric. It is assumed that the metric
         # requested stores a running total 
-        profileDict= profileDict["samples"]["metrics"]
-        totals= get_dict_field_val(profileDict, [metric, "sums"])
+        totals= get_metric_values(profileDict, metric, "sums")
 
         # Get the last value in the metric
         ys[numProcs] = totals[indTo] - totals[indFrom]
@@ -117,25 +75,42 @@ def get_total(fileList, metric, threads, indFrom, indTo):
     return xs, ys
 #### End of function get_total
 
-def plot_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom, indTo):
+def get_bar_data(fileList, metric, threads, logy, getTotal, indFrom, indTo,
+        loadFunc=load_profile):
+    """
+    Gets the heights of the bars drawn by plot_bar
+
+    Returns:
+        Tuple of the sorted process (or thread) counts and the list of bar
+        heights for each count
+    """
     if (getTotal):
-        [xs, ys] = get_total(fileList, metric, threads, indFrom, indTo)
+        [xs, ys] = get_total(fileList, metric, threads, indFrom, indTo, loadFunc)
     else:
-        [xs, ys] = get_avgs(fileList, metric, threads, indFrom, indTo)
-    # The data to plot on the x-axis should be evenly spaced
-    xData = range(len(xs))
-    # Get the width of an individual bar
-    barWidth = 0.95
+        [xs, ys] = get_avgs(fileList, metric, threads, indFrom, indTo, loadFunc)
 
     # Sort the keys by the number of processes
     sortedKeys = sorted(ys.keys())
-    xInd= 0
-    barHandles= []
     if logy:
         for key in sortedKeys:
             ys[key] = log(ys[key], 10)
-    for key in sortedKeys:
-        barData= ys[key]
+    return sortedKeys, [ys[key] for key in sortedKeys]
+#### End of function get_bar_data
+
+def plot_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom, indTo,
+        loadFunc=load_profile):
+    import matplotlib.pyplot as plt
+
+    sortedKeys, yData = get_bar_data(fileList, metric, threads, logy, getTotal,
+            indFrom, indTo, loadFunc)
+    # The data to plot on the x-axis should be evenly spaced
+    xData = range(len(sortedKeys))
+    # Get the width of an individual bar
+    barWidth = 0.95
+
+    xInd= 0
+    barHandles= []
+    for barData in yData:
         barHandles.append(plt.bar(xData[xInd], barData, width=barWidth, color='r',
             align='center', label=metric))
         xInd += 1
@@ -147,20 +122,47 @@ def plot_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom, indTo):
     plt.ylabel(ylabel)
 #### End of function plot_bar
 
-def plot_line(fileList, metric, threads, logy, ylabel, getTotal, expectedScaling,
-        indFrom, indTo):
+def get_line_data(fileList, metric, threads, getTotal, expectedScaling, indFrom,
+        indTo, fitModels=None, loadFunc=load_profile):
+    """
+    Gets the lines drawn by plot_line. Lines of the fitted scaling models in
+    fitModels follow the expected scaling line
+
+    Returns:
+        Tuple of the sorted process (or thread) counts and a list of tuples of
+        (label, yData) for each line
+    """
     if (getTotal):
-        [xs, ys] = get_total(fileList, metric, threads, indFrom, indTo)
+        [xs, ys] = get_total(fileList, metric, threads, indFrom, indTo, loadFunc)
     else:
-        [xs, ys] = get_avgs(fileList, metric, threads, indFrom, indTo)
-
-    xData = range(len(xs))
+        [xs, ys] = get_avgs(fileList, metric, threads, indFrom, indTo, loadFunc)
 
     sortedKeys = sorted(ys.keys())
     yData = []
     for key in sortedKeys:
         yData.append(ys[key])
 
+    lines = [("actual", yData)]
+    if expectedScaling:
+        idealInit = max(yData) if is_decreasing(expectedScaling) else min(yData)
+        lines.append((get_scaling_label(expectedScaling),
+            get_ideal_line(idealInit, sortedKeys, expectedScaling)))
+    if fitModels:
+        lines += get_fitted_lines(sortedKeys, [yData], fitModels)
+
+    return sortedKeys, lines
+#### End of function get_line_data
+
+def plot_line(fileList, metric, threads, logy, ylabel, getTotal, expectedScaling,
+        indFrom, indTo, fitModels=None, loadFunc=load_profile):
+    import matplotlib.pyplot as plt
+
+    sortedKeys, lines = get_line_data(fileList, metric, threads, getTotal,
+            expectedScaling, indFrom, indTo, fitModels, loadFunc)
+
+    xData = range(len(sortedKeys))
+    yData = lines[0][1]
+
     handles=[]
     handle, = plt.semilogy(xData, yData, 'r-', label='actual') if logy else plt.plot(xData, yData, label='actual')
     #if logy:
@@ -170,13 +172,15 @@ def plot_line(fileList, metric, threads, logy, ylabel, getTotal, expectedScaling
 
     handles.append(handle)
 
+    pltFunc = plt.semilogy if logy else plt.plot
     if expectedScaling:
-        pltFunc = plt.semilogy if logy else plt.plot
-        idealInit = max(yData) if is_decreasing(expectedScaling) else min(yData)
         #handle, = pltFunc(xData, get_ideal_line(idealInit, sortedKeys, expectedScaling), 'k-', label="expected")
-        handle, = pltFunc(xData, get_ideal_line(idealInit, sortedKeys, expectedScaling), 
-                'k-', label=get_scaling_label(expectedScaling))
+        handle, = pltFunc(xData, lines[1][1], 'k-', label=lines[1][0])
+        handles.append(handle)
+    for label, fitData in lines[2 if expectedScaling else 1:]:
+        handle, = pltFunc(xData, fitData, '--', label=label)
         handles.append(handle)
+    if len(handles) > 1:
         plt.legend(handles=handles, loc=1, bbox_to_anchor=(1.1, 1.1))
         #plt.legend(handles=handles, loc=1, bbox_to_anchor=(0.25, 1.1))
 
@@ -187,7 +191,16 @@ def plot_line(fileList, metric, threads, logy, ylabel, getTotal, expectedScaling
     plt.ylabel(ylabel)
 ### End of function plot_line
 
-if (__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a bar chart" +
             " of the averages of different metrics stored in a series of JSON files, assumed to" +
             " be the export of a MAP profile. It is also assumed " +
@@ -199,7 +212,8 @@ if (__name__ == "__main__"):
         type=argparse.FileType('r'))
     parser.add_argument("metric", help="Name of a metric to plot. This is the " +
             "name of the metric under the 'samples -> metrics' level of the JSON " +
-            "export of a MAP file")
+            "export of a MAP file, or an expression over metrics (see " +
+            "derived_metrics.py), e.g. 'lustre_bytes_read / io_reads_rate'")
     # Add an argument to show if the strong scaling is for threads or processes
     parser.add_argument("--threads", help="Indicates whether threads or processes" +
             " should used in the scaling analysis", action="store_true",
@@ -215,6 +229,9 @@ if (__name__ == "__main__"):
             " for the model. This should be one of ['constant', 'linear[i/d]'," +
             " 'quadratic[i/d]']. The i or d suffix indicates increasing or " +
             "decreasing scale", choices=sorted(scalingDefs.keys()), default=None)
+    parser.add_argument("--fit", help="Scaling models to fit to the data of a" +
+            " line graph by least squares, drawn alongside it",
+            choices=modelNames, nargs="+", default=None)
     defaultYLabel = "Proportion of Time (%)"
     parser.add_argument("--ylabel", help="Label for the y-axis. Default is " +
         defaultYLabel.replace('%','%%'), default=defaultYLabel)
@@ -222,20 +239,42 @@ if (__name__ == "__main__"):
             " taking values", type=int, default=0)
     parser.add_argument("--indTo", help="Zero based index up to which to take values",
             type=int, default=-1)
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the list of files
     fileList = [line.strip() for line in args.infile.readlines()]
     fileList.sort()
 
+    if args.emitData:
+        # Write out the data that would be plotted and stop
+        if not args.line:
+            sortedKeys, yData = get_bar_data(fileList, args.metric, args.threads,
+                    args.logY, args.isTotal, args.indFrom, args.indTo, session.load)
+            emit_plot_data([(args.metric, sortedKeys, yData)], args.emitData)
+        else:
+            sortedKeys, lines = get_line_data(fileList, args.metric, args.threads,
+                    args.isTotal, args.expected, args.indFrom, args.indTo,
+                    args.fit, session.load)
+            emit_plot_data([(label, sortedKeys, yData) for label, yData in lines],
+                    args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Plot the summary of the metric in a bar chart
     if not args.line:
         plot_bar(fileList, args.metric, args.threads, args.logY, args.ylabel,
-                args.isTotal, args.indFrom, args.indTo)
+                args.isTotal, args.indFrom, args.indTo, session.load)
     else:
         plot_line(fileList, args.metric, args.threads, args.logY, args.ylabel, 
-                args.isTotal, args.expected, args.indFrom, args.indTo)
+                args.isTotal, args.expected, args.indFrom, args.indTo, args.fit,
+                session.load)
 
     plt.show()
+#### End of function main
 
+if __name__ == "__main__":
+    main()
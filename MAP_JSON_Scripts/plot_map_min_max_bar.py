@@ -13,17 +13,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
 from math import log
 from map_json_common import *
+from time_weighting import get_time_weighted_mean
 
+import os
 import sys
-sys.path.append('../JSON_Common')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
 
-def get_min_max(fileList, metric, threads, indFrom, indTo):
+def get_min_max(fileList, metric, threads, indFrom, indTo, loadFunc=load_profile):
     # Initialise the y-date to an empty list
     ys = dict()
     xs = []
@@ -31,8 +35,7 @@ def get_min_max(fileList, metric, threads, indFrom, indTo):
     # For each file
     for filename in fileList:
         # Read the JSON dictionary
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
 
 
         # Get the number of threads / processes used
@@ -40,28 +43,25 @@ def get_min_max(fileList, metric, threads, indFrom, indTo):
         xs.append(numProcs)
 
         # Get the min and the max of the metric
-        profileDict = profileDict["samples"]["metrics"]
-        data = [get_dict_field_val(profileDict, [metric, field]) for field in
+        metricDict = profileDict["samples"]["metrics"]
+        data = [get_dict_field_val(metricDict, [metric, field]) for field in
                 ["mins", "means", "maxs"]]
-        if not indTo:
-            indTo == len(data[0])
-
-        for i, _ in enumerate(data):
-            data[i] = data[i][indFrom:indTo]
 
-        ys[numProcs] = [get_avg_over_samples(dataItem) for dataItem in data]
+        # Average each field, weighting by the length of each sampling window
+        ys[numProcs] = get_time_weighted_mean(profileDict, data, indFrom,
+                indTo).tolist()
 
     return xs, ys
 #### End of function get_min_max
 
-def get_min_max_total(fileList, metric, threads, indFrom, indTo):
+def get_min_max_total(fileList, metric, threads, indFrom, indTo,
+        loadFunc=load_profile):
     ys = dict()
     xs = []
     # For each file
     for filename in fileList:
         # Read the JSON dictionary
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
 
         #Get the number of processes / threads used
         numProcs = get_num_threads(profileDict) if threads else get_num_processes(profileDict)
@@ -78,31 +78,50 @@ def get_min_max_total(fileList, metric, threads, indFrom, indTo):
     return xs, ys
 #### End of function get_min_max_total
 
-def plot_min_max_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom,
-        indTo):
+def get_min_max_bar_data(fileList, metric, threads, logy, getTotal, indFrom,
+        indTo, loadFunc=load_profile):
+    """
+    Gets the values of the min, mean and max drawn by plot_min_max_bar
+
+    Returns:
+        Tuple of the sorted process (or thread) counts and a list of [min,
+        mean, max] for each count
+    """
     if (getTotal):
-        [xs, ys] = get_min_max_total(fileList, metric, threads, indFrom, indTo)
+        [xs, ys] = get_min_max_total(fileList, metric, threads, indFrom, indTo,
+                loadFunc)
     else:
-        [xs, ys] = get_min_max(fileList, metric, threads, indFrom, indTo)
+        [xs, ys] = get_min_max(fileList, metric, threads, indFrom, indTo, loadFunc)
+
+    # Sort the keys by the number of processes
+    sortedKeys = sorted(ys.keys())
+    barValues = []
+    for key in sortedKeys:
+        barData= ys[key]
+        if logy:
+            barData = [log(x,10) if x > 0 else x for x in barData]
+        barValues.append(barData)
+    return sortedKeys, barValues
+#### End of function get_min_max_bar_data
+
+def plot_min_max_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom,
+        indTo, loadFunc=load_profile):
+    import matplotlib.pyplot as plt
+
+    sortedKeys, barValues = get_min_max_bar_data(fileList, metric, threads, logy,
+            getTotal, indFrom, indTo, loadFunc)
     # The data to plot on the x-axis should be evenly spaced
-    xData = range(len(xs))
-    # Turn the number of processes into string labels
-    xs = [str(x) for x in xs]
+    xData = range(len(sortedKeys))
     # Get the width of an individual bar
     barWidth = 0.95
 
-    # Sort the keys by the number of processes
-    sortedKeys = sorted(ys.keys())
     xInd= 0
     barHandles= []
     colors = ['r', 'g', 'b']
     labels = ['min', 'mean', 'max']
-    for key in sortedKeys:
-        barData= ys[key]
+    for barData in barValues:
         bottom = 0.
         # We assume that the max is greater than the min, and so we can 
-        if logy:
-            barData = [log(x,10) if x > 0 else x for x in barData]
         for i in range(len(barData)-1, 0, -1):
             barData[i] -= barData[i-1]
         for cnt, barDatum in enumerate(barData):
@@ -123,7 +142,16 @@ def plot_min_max_bar(fileList, metric, threads, logy, ylabel, getTotal, indFrom,
     plt.legend(loc=1, bbox_to_anchor=(1.1, 1.1))
 #### End of function plot_bar
 
-if (__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a stacked bar " +
             "chart of the minimum, maximum and mean of a metric given a set of " +
             "files that are assumed to be the JSON export of a MAP profile. The " +
@@ -152,18 +180,32 @@ if (__name__ == "__main__"):
             " taking values", type=int, default=0)
     parser.add_argument("--indTo", help="Zero based index up to which to take values",
             type=int, default=-1)
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the list of files
     fileList = [line.strip() for line in args.infile.readlines()]
     fileList.sort()
 
+    if args.emitData:
+        # Write out the min, mean and max rather than plotting them
+        sortedKeys, barValues = get_min_max_bar_data(fileList, args.metric,
+                args.threads, args.logY, args.isTotal, args.indFrom, args.indTo,
+                session.load)
+        emit_plot_data([(label, sortedKeys, [barData[i] for barData in barValues])
+            for i, label in enumerate(["min", "mean", "max"])], args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Plot the summary of the metric in a bar chart
     plot_min_max_bar(fileList, args.metric, args.threads, args.logY, args.ylabel, args.isTotal,
-            args.indFrom, args.indTo)
+            args.indFrom, args.indTo, session.load)
 
     plt.show()
-#### End of main function
-
+#### End of function main
 
+if __name__ == "__main__":
+    main()
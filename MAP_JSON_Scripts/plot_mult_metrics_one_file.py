@@ -13,10 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import json
 import argparse
 from map_json_common import *
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
 
 def plot_sample_metric_fields(xData, yDataDict, fields=["means"]):
     """
@@ -34,6 +39,8 @@ def plot_sample_metric_fields(xData, yDataDict, fields=["means"]):
         Handles to the lines plotted. This can be used to add a legend to a
         graph
     """
+    import matplotlib.pyplot as plt
+
     assert isinstance(xData, list)
     assert isinstance(yDataDict, dict)
     legend_handles = []
@@ -61,6 +68,8 @@ def plot_activity_metric(xData, yDataDict):
         List of handles to the lines plotted. This can be used in creating
         a legend for the plot
     """
+    import matplotlib.pyplot as plt
+
     assert isinstance(xData, list)
     assert isinstance(yDataDict, dict)
     legend_handles = []
@@ -75,24 +84,22 @@ def plot_activity_metric(xData, yDataDict):
     return legend_handles
 #### End of function plot_activity_metric
 
-def plot_metrics_single(profileDict, metricFile, plotTitle=None):
+def get_metrics_single_data(profileDict, metricNames):
     """
-    Plots the metrics given in the metricFile
+    Gets the sampled metrics and activity timelines for the metric names
+    given, along with the times at which they were sampled
 
     Args:
         profileDict (dict): Dictionary containing profile data from an Allinea
             MAP profile
-        metricFile (file): File containing a list of metrics to plot
-        plotTitle (str): Title to plot
+        metricNames (list): List of names of metrics to get
 
     Returns:
-        Nothing
+        Tuple of (times, subDict, activityDict), where subDict holds the
+        sampled metrics found and activityDict the activity timelines found
     """
     assert isinstance(profileDict, dict)
 
-    # Read the names of the metrics
-    metricNames = metricFile.readlines()
-
     # Get the times to plot on an x-axis
     times = get_window_start_times(profileDict)
 
@@ -108,6 +115,32 @@ def plot_metrics_single(profileDict, metricFile, plotTitle=None):
     activityDict = get_activity_samples(activityDict,
             metricNames)
 
+    return times, subDict, activityDict
+#### End of function get_metrics_single_data
+
+def plot_metrics_single(profileDict, metricFile, plotTitle=None):
+    """
+    Plots the metrics given in the metricFile
+
+    Args:
+        profileDict (dict): Dictionary containing profile data from an Allinea
+            MAP profile
+        metricFile (file): File containing a list of metrics to plot
+        plotTitle (str): Title to plot
+
+    Returns:
+        Nothing
+    """
+    import matplotlib.pyplot as plt
+
+    assert isinstance(profileDict, dict)
+
+    # Read the names of the metrics
+    metricNames = metricFile.readlines()
+
+    times, subDict, activityDict = get_metrics_single_data(profileDict,
+            metricNames)
+
     # Plot the sampled metrics passed in
     # Create a new figure
     plt.figure()
@@ -125,24 +158,51 @@ def plot_metrics_single(profileDict, metricFile, plotTitle=None):
 #### End of function plot_metrics_single
 
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot multiple time dependent metrics" +
         " contained in the JSON export of an Allinea MAP file")
 
     # Add a file to read input from
-    parser.add_argument("infile", help="JSON file to read MAP profile information from",
-        type=argparse.FileType('r'))
+    parser.add_argument("infile", help="JSON file to read MAP profile information from")
     # Add a file to read metrics from
     parser.add_argument("metricFile", help="Name of a file containing metrics to be plotted",
         type=argparse.FileType('r'))
+    add_emit_data_argument(parser)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the JSON as a dictionary
-    profileDict = json.load(args.infile)
-
+    profileDict = session.load(args.infile)
+
+    if args.emitData:
+        # Write out the means of the metrics and the activity timelines
+        times, subDict, activityDict = get_metrics_single_data(profileDict,
+                args.metricFile.readlines())
+        seriesList = [(metricName, times, subDict[metricName]["means"])
+                for metricName in subDict]
+        seriesList.extend([(metricName, times, activityDict[metricName])
+                for metricName in activityDict])
+        emit_plot_data(seriesList, args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Read in a single JSON file and plot the metrics
-    fileName = args.infile.name.split('/')[-1]
+    fileName = os.path.basename(args.infile)
     plot_metrics_single(profileDict, args.metricFile, fileName)
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
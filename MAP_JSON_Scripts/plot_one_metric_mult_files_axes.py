@@ -13,12 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import json
 import argparse
 from map_json_common import *
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
 
-def read_metric_from_files(fileList, metricName):
+def read_metric_from_files(fileList, metricName, loadFunc=load_profile):
     """
     Returns the values of the metric identified by the metric name from the
     list of files passed in. 
@@ -27,21 +32,25 @@ def read_metric_from_files(fileList, metricName):
         fileList (list): List of names of JSON files, assumed to be JSON
             representations of MAP profiles.
         metricName (str): Name of the metric to get the values for
+        loadFunc (function): Function used to read a profile given its file
+            name
 
     Returns:
         Dictionary of sampled metrics read in from the list of files passed in where
-        the key is the number of processes used and the value is the list of samples
+        the key is the number of processes used and the value is a tuple of the
+        list of samples, the runtime and the start times of the samples
     """
     retDict = {}
     for filename in fileList:
         # Read the appropriate data from the given file
-        profileDict = {}
-        with open(filename, "r") as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
 
         numProcs = get_num_processes(profileDict)
         numThreads = get_num_threads(profileDict)
         runtime = get_runtime(profileDict)
+        # Times of the samples from the start of the run
+        startTimes = get_window_start_times(profileDict)
+        startTimes = [startTime - startTimes[0] for startTime in startTimes]
 
         # If no data has been read move on to the next file
         if (not profileDict or len(profileDict) == 0):
@@ -50,7 +59,8 @@ def read_metric_from_files(fileList, metricName):
         sampleDict = get_metric_key_samples(profileDict["samples"]["metrics"], 
                 [metricName])
         if (sampleDict and len(sampleDict) != 0):
-            retDict.update({(numProcs, numThreads) : (list(sampleDict.values())[0], runtime)})
+            retDict.update({(numProcs, numThreads) : (list(sampleDict.values())[0],
+                runtime, startTimes)})
             continue
 
         # Try and read from the activity timeline
@@ -65,7 +75,8 @@ def read_metric_from_files(fileList, metricName):
             raise KeyError("Unable to find metric " + metricName + " in JSON " +
                     "profile " + filename)
 
-        retDict.update({(numProcs, numThreads) : (list(sampleDict.values())[0], runtime)})
+        retDict.update({(numProcs, numThreads) : (list(sampleDict.values())[0],
+            runtime, startTimes)})
 
     return retDict
 #### End of function read_metric_from_files
@@ -111,20 +122,21 @@ def get_min_max_x(data, getAbsolute):
 def get_x_data(data, convertToTime):
     """
     Gets the x-axis data to plot from the data passed in. The data is of the
-    form (yvalues, time). The convertToTime parameter indicates whether to
-    return just the range of the values passed in, or whether to convert this
-    to a (zero-based) time
+    form (yvalues, time, startTimes). The convertToTime parameter indicates
+    whether to return just the range of the values passed in, or whether to
+    convert this to a (zero-based) time. The start times of the sampling
+    windows are used as the times, as the windows are of uneven length
     """
     numSamples= len(data[0])
     if (not convertToTime):
         return range(numSamples)
 
-    spacing = float(data[1]) / numSamples
-    return [i*spacing for i in range(numSamples)]
+    return data[2][:numSamples]
 ### End of function get_x_data
 
 def plot_metric_from_files(fileList, metricName, yLabel=None,
-        setXAbsolute=False, setXAxisConstant=False, setYAxisConstant=False):
+        setXAbsolute=False, setXAxisConstant=False, setYAxisConstant=False,
+        loadFunc=load_profile):
     """
     Plots the metric identified by the metric name from the list of files
     passed in. The list of files are assumed to be of a series of programs
@@ -141,12 +153,15 @@ def plot_metric_from_files(fileList, metricName, yLabel=None,
         setXAxisConstant: Indicates that the x-axes used should show the
             have the same bounds
         setYAxisConstant: Indicates the the y-axis used should be constant
+        loadFunc (function): Function used to read a profile given its file
+            name
 
     Returns:
         Nothing
     """
+    import matplotlib.pyplot as plt
 
-    yData = read_metric_from_files(fileList, metricName)
+    yData = read_metric_from_files(fileList, metricName, loadFunc)
     assert (len(yData) != 0)
 
     # Assume that data has been read, as otherwise the above function should
@@ -189,7 +204,16 @@ def plot_metric_from_files(fileList, metricName, yLabel=None,
     #plt.draw()
 #### End of function plot_metric_from_files
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a single time dependent metric" +
         " contained in the JSON export of multiple Allinea MAP files")
 
@@ -211,14 +235,30 @@ if __name__ == "__main__":
     parser.add_argument("--yConstant", help="Indicates that all graphs should" +
             " have the same scaling on the y-axis", action="store_true",
             default=False)
+    add_emit_data_argument(parser)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Get the list of files to plot from
     fileList = [line.strip() for line in args.infile.readlines()]
 
+    if args.emitData:
+        # Write out the metric read from each of the files
+        yData = read_metric_from_files(fileList, args.metricName, session.load)
+        emit_plot_data([("Procs: " + str(key), get_x_data(yData[key], args.showTime),
+            yData[key][0]) for key in sorted(yData.keys())], args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
+
     # Plot the single time-dependent metric from the given file
     plot_metric_from_files(fileList, args.metricName, args.metricDescription,
-            args.showTime, args.xConstant, args.yConstant)
+            args.showTime, args.xConstant, args.yConstant, session.load)
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -13,17 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import json
 import argparse
 from map_json_common import *
+from metric_pyramid import get_metric_range, pyramidStats
+from derived_metrics import is_expression, get_metric_values
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
 
-def read_metric_from_file(infile, metricName, fieldnames):
+def read_metric_from_file(infile, metricName, fieldnames, loadFunc=load_profile):
     retDict = {}
     # Read the appropriate data from the given file
-    profileDict = {}
-    with open(infile, "r") as f:
-        profileDict = json.load(f)
+    profileDict = loadFunc(infile)
 
     # If no data has been read move on to the next file
     if (not profileDict or len(profileDict) == 0):
@@ -31,6 +36,12 @@ def read_metric_from_file(infile, metricName, fieldnames):
 
     numProcs = get_num_processes(profileDict)
 
+    # Evaluate an expression over the metrics for each of the fields
+    if is_expression(metricName, profileDict):
+        retDict.update({numProcs : [get_metric_values(profileDict, metricName,
+            fieldname).tolist() for fieldname in fieldnames]})
+        return retDict
+
     # Try and read from the sample metrics
     sampleDict = get_metric_samples_for_keys(profileDict["samples"]["metrics"], 
             [metricName], fieldnames)
@@ -56,9 +67,18 @@ def read_metric_from_file(infile, metricName, fieldnames):
     return retDict
 #### End of function read_metric_from_files
 
-def plot_metric_from_file(infile, metricName, fieldnames, yLabel=None,
-        indFrom=0, indTo=-1):
-    yData = list(read_metric_from_file(infile, metricName, fieldnames).values())[0]
+def get_metric_from_file_data(infile, metricName, fieldnames, indFrom=0,
+        indTo=-1, loadFunc=load_profile):
+    """
+    Gets the samples of the given fields of a metric between the given
+    indices, along with the sample numbers to plot them against
+
+    Returns:
+        Tuple of (xData, yData) where yData is a list with the samples of each
+        field
+    """
+    yData = list(read_metric_from_file(infile, metricName, fieldnames,
+        loadFunc).values())[0]
     assert (len(yData) != 0)
     assert isinstance(indFrom, int)
     assert isinstance(indTo, int)
@@ -73,7 +93,35 @@ def plot_metric_from_file(infile, metricName, fieldnames, yLabel=None,
     # have raised an error
     # Get the xData to plot against
     xData = range(len(yData[0]))
-    
+
+    return xData, yData
+#### End of function get_metric_from_file_data
+
+def get_metric_range_data(infile, metricName, fieldnames, timeFrom=None,
+        timeTo=None, maxPoints=1000, loadFunc=load_profile):
+    """
+    Gets the given fields of a metric between two times from the pyramid of
+    aggregates of the metric, at a resolution of at most the given number of
+    points, along with the times to plot them against
+
+    Returns:
+        Tuple of (xData, yData) where xData holds the start times in
+        milliseconds and yData is a list with the values of each field
+    """
+    for fieldname in fieldnames:
+        if fieldname not in pyramidStats:
+            raise ValueError("Only the fields " + ", ".join(pyramidStats) +
+                    " can be plotted over a range of time")
+    starts, _, mins, maxs, means = get_metric_range(infile, metricName, timeFrom,
+            timeTo, maxPoints, loadFunc)
+    stats = {"mins" : mins, "maxs" : maxs, "means" : means}
+    return starts.tolist(), [stats[fieldname].tolist() for fieldname in fieldnames]
+#### End of function get_metric_range_data
+
+def plot_metric_fields(xData, yData, metricName, fieldnames, yLabel=None,
+        xLabel="Sample number"):
+    import matplotlib.pyplot as plt
+
     # Now plot the data
     lineStyle = ['r-', 'b-', 'g-', 'k-', 'r--', 'g--']
     lineHandles = []
@@ -87,7 +135,7 @@ def plot_metric_from_file(infile, metricName, fieldnames, yLabel=None,
         lineHandle, = plt.plot(xData, lineData, lineStyle[cnt % len(lineStyle)],
                 label=lineLabels[fieldnames[cnt]])
         lineHandles.append(lineHandle)
-    plt.xlabel("Sample number")
+    plt.xlabel(xLabel)
     if (not yLabel):
         plt.ylabel(str(metricName))
     else:
@@ -95,16 +143,34 @@ def plot_metric_from_file(infile, metricName, fieldnames, yLabel=None,
     #plt.legend(handles=lineHandles, loc=1, bbox_to_anchor=(1.1, 1.1))
     plt.legend(handles=lineHandles, loc=1, bbox_to_anchor=(0.3, 0.9))
     plt.draw()
+#### End of function plot_metric_fields
+
+def plot_metric_from_file(infile, metricName, fieldnames, yLabel=None,
+        indFrom=0, indTo=-1, loadFunc=load_profile):
+    xData, yData = get_metric_from_file_data(infile, metricName, fieldnames,
+            indFrom, indTo, loadFunc)
+    plot_metric_fields(xData, yData, metricName, fieldnames, yLabel)
 #### End of function plot_metric_from_files
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a single time dependent metric" +
         " contained in the JSON export of multiple Allinea MAP files")
 
     # Add a file to read input from
     parser.add_argument("infile", help="Export to JSON of a MAP file to plot a metric from")
     # Add a file to read metrics from
-    parser.add_argument("metricName", help="Name of the metric to plot")
+    parser.add_argument("metricName", help="Name of the metric to plot, or an" +
+            " expression over metrics (see derived_metrics.py), e.g." +
+            " 'mpi_sent / (collective_mpi + point_to_point_mpi)'")
     parser.add_argument("fields", 
             help="Name of the fields to plot. Should be one of 'sums', 'maxs', 'mins', 'means' or 'vars'",
             nargs="+")
@@ -115,12 +181,54 @@ if __name__ == "__main__":
             " from which to start plotting the metric", type=int, default=0)
     parser.add_argument("--indTo", help="Zero based index of the sample number" +
             " at which to end plotting the metric", type=int, default=-1)
+    parser.add_argument("--timeFrom", help="Time in milliseconds from which to" +
+            " plot the metric. Implies --maxPoints", type=float, default=None)
+    parser.add_argument("--timeTo", help="Time in milliseconds up to which to" +
+            " plot the metric. Implies --maxPoints", type=float, default=None)
+    parser.add_argument("--maxPoints", help="Plot at most this many points," +
+            " taken from the pyramid of aggregates of the metric saved" +
+            " alongside the profile (see metric_pyramid.py). Only the mins," +
+            " maxs and means fields can be plotted. Default is 1000 when" +
+            " --timeFrom or --timeTo is given", type=int, default=None)
+    add_emit_data_argument(parser)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
+
+    if args.maxPoints is not None or args.timeFrom is not None or \
+            args.timeTo is not None:
+        maxPoints = 1000 if args.maxPoints is None else args.maxPoints
+        xData, yData = get_metric_range_data(args.infile, args.metricName,
+                args.fields, args.timeFrom, args.timeTo, maxPoints,
+                session.load)
+        if args.emitData:
+            emit_plot_data(list(zip(args.fields, [xData] * len(yData), yData)),
+                    args.emitData)
+            return
+
+        import matplotlib.pyplot as plt
+        plot_metric_fields(xData, yData, args.metricName, args.fields,
+                args.metricDescription, "Time (ms)")
+        plt.show()
+        return
+
+    if args.emitData:
+        # Write out the samples of each of the fields
+        xData, yData = get_metric_from_file_data(args.infile, args.metricName,
+                args.fields, args.indFrom, args.indTo, session.load)
+        emit_plot_data(list(zip(args.fields, [xData] * len(yData), yData)),
+                args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
 
     # Plot the single time-dependent metric from the given file
     plot_metric_from_file(args.infile, args.metricName, args.fields, args.metricDescription,
-            args.indFrom, args.indTo)
+            args.indFrom, args.indTo, session.load)
     plt.show()
+#### End of function main
 
+if __name__ == "__main__":
+    main()
@@ -13,25 +13,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import json
 import argparse
 from map_json_common import *
 from operator import add
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot information" +
         " contained in the JSON export of an Allinea MAP file")
 
     # Add a file to read input from
-    parser.add_argument("infile", help="JSON file to read MAP profile information from",
-        type=argparse.FileType('r'))
+    parser.add_argument("infile", help="JSON file to read MAP profile information from")
+    add_emit_data_argument(parser)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the JSON as a dictionary
-    profileDict = json.load(args.infile)
+    profileDict = session.load(args.infile)
 
     # Get the CPU activity data
     cpuData = get_cpu_activity(profileDict)
@@ -48,6 +64,13 @@ if __name__ == "__main__":
     # Get the x-axis to plot against
     xData = range(len(mpiData))
 
+    if args.emitData:
+        # Write out the activity rather than plotting it
+        emit_plot_data([("cpu", xData, cpuData), ("io", xData, ioData),
+            ("openmp", xData, openmpData), ("mpi", xData, mpiData)], args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     cpuHandle = plt.bar(xData, cpuData, color='g', label="cpu", width=1.0)
     bottom = cpuData
     ioHandle = plt.bar(xData, ioData, color='r', label="io", bottom=bottom, width=1.0)
@@ -60,8 +83,12 @@ if __name__ == "__main__":
     plt.xticks([], [])
     plt.ylabel("% time")
     plt.legend(handles=legend_handles, loc=1, bbox_to_anchor=(1.1, 1.1))
-    plotTitle = args.infile.name.split('/')[-1]
+    plotTitle = os.path.basename(args.infile)
     print(plotTitle)
     plt.title(plotTitle)
 
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import csv
+import json
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from metric_pyramid import get_activity_names, get_metric_series
+from time_weighting import get_time_weighted_mean
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from plot_data_common import print_table
+
+# Values by which the metrics can be ranked. growth is the ratio of the mean
+# of the largest run to that of the smallest, slope the power of the number
+# of processes with which the mean grows, and variance the coefficient of
+# variation over time within a run, averaged over the runs
+rankCriteria = ["growth", "slope", "variance"]
+rankFields = ["metric", "score", "first_mean", "last_mean", "growth", "slope",
+        "variance", "peak"]
+
+def get_profile_statistics(profileDict, names=None, includeActivity=True):
+    """
+    Gets summary statistics over time of every metric of a profile, with the
+    arithmetic done for all of the metrics at once
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        names (list): Names of the metrics and activities. Default is all of
+            the sampled metrics
+        includeActivity (bool): Indicates whether to include the main thread
+            activities when names is not given
+
+    Returns:
+        Tuple of (list of names, dictionary of NumPy arrays with a value per
+        name keyed by "mean" (time weighted mean of the means), "variance"
+        (time weighted coefficient of variation of the means) and "peak"
+        (greatest of the maxs))
+    """
+    if names is None:
+        names = list(get_samples(profileDict))
+        if includeActivity:
+            names += get_activity_names(profileDict)
+    numSamples = get_sample_count(profileDict)
+    means = np.full((len(names), numSamples), np.nan)
+    maxs = np.full((len(names), numSamples), np.nan)
+    for row, name in enumerate(names):
+        _, nameMaxs, nameMeans = get_metric_series(profileDict, name)
+        means[row, :len(nameMeans)] = nameMeans[:numSamples]
+        maxs[row, :len(nameMaxs)] = nameMaxs[:numSamples]
+
+    stats = {}
+    if len(names) == 0 or numSamples == 0:
+        for stat in ["mean", "variance", "peak"]:
+            stats[stat] = np.full(len(names), np.nan)
+        return names, stats
+    stats["mean"] = get_time_weighted_mean(profileDict, means)
+    deviations = (means - stats["mean"][:, np.newaxis]) ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats["variance"] = np.sqrt(get_time_weighted_mean(profileDict,
+            deviations)) / np.abs(stats["mean"])
+    present = ~np.all(np.isnan(maxs), axis=1)
+    stats["peak"] = np.where(present, np.nanmax(np.where(present[:,
+        np.newaxis], maxs, 0.), axis=1), np.nan)
+    return names, stats
+#### End of function get_profile_statistics
+
+def get_series_statistics(fileList, names=None, threads=False,
+        loadFunc=load_profile):
+    """
+    Gets the summary statistics of the metrics of each profile of a scaling
+    series
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        names (list): Names of the metrics and activities. Default is all of
+            the sampled metrics and activities of any of the profiles, other
+            than the running totals, which grow with the length of the run
+        threads (bool): Indicates whether to scale against the number of
+            threads rather than of processes
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of (list of names, NumPy array of the number of processes (or
+        threads) of each profile, dictionary of 2-D NumPy arrays keyed as for
+        get_profile_statistics with one row per profile, in increasing order
+        of processes, and one column per name). Metrics missing from a
+        profile are NaN. A KeyError is raised for a name found in none of
+        the profiles
+    """
+    profileStats = []
+    procs = []
+    allNames = [] if names is None else list(names)
+    for filename in fileList:
+        profileDict = loadFunc(filename)
+        if names is None:
+            profileNames = [name for name in get_samples(profileDict) if
+                    not is_running_total(name)]
+            profileNames += get_activity_names(profileDict)
+        else:
+            # A metric need not be recorded in every run of a series
+            available = set(get_samples(profileDict)) | \
+                    set(get_activity_names(profileDict))
+            profileNames = [name for name in names if name in available]
+        profileNames, stats = get_profile_statistics(profileDict, profileNames)
+        procs.append(get_num_threads(profileDict) if threads else
+                get_num_processes(profileDict))
+        profileStats.append((profileNames, stats))
+        if names is None:
+            allNames += [name for name in profileNames if name not in allNames]
+
+    for name in allNames:
+        if not any(name in profileNames for profileNames, _ in profileStats):
+            raise KeyError("Unable to find metric " + name + " in any profile")
+    columns = dict((name, col) for col, name in enumerate(allNames))
+    order = np.argsort(procs, kind="stable")
+    seriesStats = {}
+    for stat in ["mean", "variance", "peak"]:
+        values = np.full((len(fileList), len(allNames)), np.nan)
+        for row, ind in enumerate(order):
+            profileNames, stats = profileStats[ind]
+            values[row, [columns[name] for name in profileNames]] = stats[stat]
+        seriesStats[stat] = values
+    return allNames, np.array(procs, dtype=np.float64)[order], seriesStats
+#### End of function get_series_statistics
+
+def get_scaling_slopes(procs, values):
+    """
+    Gets the slope of the least squares fit of log(value) against
+    log(procs) of each column of values, for all columns at once. Values
+    which are missing or not positive are left out of the fit of their column
+
+    Args:
+        procs (array): Number of processes of each row
+        values (array): 2-D array with one row per run
+
+    Returns:
+        NumPy array of the slope of each column, NaN where fewer than two
+        distinct numbers of processes have values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        logValues = np.where(values > 0, np.log(values), np.nan)
+    used = ~np.isnan(logValues)
+    x = np.where(used, np.log(np.asarray(procs, dtype=np.float64))[:,
+        np.newaxis], 0.)
+    y = np.where(used, logValues, 0.)
+    counts = used.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xMean = x.sum(axis=0) / counts
+        yMean = y.sum(axis=0) / counts
+        xDev = np.where(used, x - xMean, 0.)
+        sxx = (xDev ** 2).sum(axis=0)
+        slopes = (xDev * (y - yMean)).sum(axis=0) / sxx
+    return np.where((counts >= 2) & (sxx > 0), slopes, np.nan)
+#### End of function get_scaling_slopes
+
+def get_growth(values):
+    """
+    Gets the ratio of the last to the first value which is present in each
+    column of values
+
+    Args:
+        values (array): 2-D array with one row per run
+
+    Returns:
+        NumPy array of the growth of each column, NaN where the first value
+        is not positive or fewer than two values are present
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    cols = np.arange(values.shape[1])
+    first = values[np.argmax(present, axis=0), cols]
+    last = values[values.shape[0] - 1 - np.argmax(present[::-1], axis=0), cols]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((present.sum(axis=0) >= 2) & (first > 0), last / first,
+                np.nan)
+#### End of function get_growth
+
+def get_top_indices(scores, k, reverse=False):
+    """
+    Gets the indices of the k largest (or smallest) scores, using a partial
+    selection of the k before sorting only those
+
+    Args:
+        scores (array): Score of each item. NaN scores are never selected
+        k (int): Number of indices to return
+        reverse (bool): Indicates whether to select the smallest scores
+
+    Returns:
+        NumPy array of the indices, best first
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(scores))
+    keys = scores[valid] if reverse else -scores[valid]
+    if k < len(valid):
+        selected = np.argpartition(keys, k)[:k]
+    else:
+        selected = np.arange(len(valid))
+    return valid[selected[np.argsort(keys[selected], kind="stable")]]
+#### End of function get_top_indices
+
+def rank_metrics(fileList, k=10, criterion="growth", names=None, threads=False,
+        reverse=False, loadFunc=load_profile):
+    """
+    Ranks the metrics of a scaling series by how they change with the number
+    of processes, or by how much they vary over time
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        k (int): Number of metrics to return
+        criterion (str): One of rankCriteria
+        names (list): Names of the metrics and activities to rank. Default is
+            all of them other than the running totals
+        threads (bool): Indicates whether to scale against the number of
+            threads rather than of processes
+        reverse (bool): Indicates whether to return the smallest scores
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of dictionaries with the fields in rankFields, best first
+    """
+    assert criterion in rankCriteria
+
+    names, procs, stats = get_series_statistics(fileList, names, threads,
+            loadFunc)
+    if len(names) == 0:
+        return []
+    means = stats["mean"]
+    scores = {"growth" : get_growth(means),
+            "slope" : get_scaling_slopes(procs, means),
+            "variance" : __nan_mean(stats["variance"])}
+    present = ~np.isnan(means)
+    cols = np.arange(len(names))
+    firstMeans = means[np.argmax(present, axis=0), cols]
+    lastMeans = means[len(procs) - 1 - np.argmax(present[::-1], axis=0), cols]
+    peaks = np.fmax.reduce(stats["peak"], axis=0)
+
+    columns = [("score", scores[criterion]), ("first_mean", firstMeans),
+            ("last_mean", lastMeans), ("growth", scores["growth"]),
+            ("slope", scores["slope"]), ("variance", scores["variance"]),
+            ("peak", peaks)]
+    rows = []
+    for ind in get_top_indices(scores[criterion], k, reverse):
+        row = {"metric" : names[ind]}
+        for field, values in columns:
+            row[field] = None if np.isnan(values[ind]) else float(values[ind])
+        rows.append(row)
+    return rows
+#### End of function rank_metrics
+
+def __nan_mean(values):
+    # Mean of each column ignoring NaN, without warning for all NaN columns
+    counts = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(np.isnan(values), 0., values).sum(axis=0) / counts
+#### End of function __nan_mean
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Ranks the metrics and" +
+            " activities of a scaling series of JSON format MAP files, to" +
+            " find those which change most with the number of processes or" +
+            " vary most over time. The time weighted mean of every metric of" +
+            " every file is computed at once, and the top metrics selected" +
+            " without sorting all of them")
+    parser.add_argument("infiles", help="JSON files which are exports of MAP" +
+            " files", nargs="*")
+    parser.add_argument("-l", "--fileList", help="Text file to read a list of" +
+            " input files from", default=None)
+    parser.add_argument("-k", "--top", help="Number of metrics to list." +
+            " Default is 10", type=int, default=10)
+    parser.add_argument("--rankBy", help="growth ranks by the ratio of the" +
+            " mean of the largest run to that of the smallest, slope by the" +
+            " power of the number of processes with which the mean grows" +
+            " (a log-log least squares fit), and variance by the coefficient" +
+            " of variation over time within each run. Default is growth",
+            choices=rankCriteria, default="growth")
+    parser.add_argument("--smallest", help="List the metrics with the" +
+            " smallest rather than the largest scores", action="store_true")
+    parser.add_argument("--metrics", help="Names of the metrics and activities" +
+            " to rank. Default is all of them other than running totals" +
+            " (metrics named *_total)", nargs="+", default=None)
+    parser.add_argument("--threads", help="Scale against the number of" +
+            " threads rather than of processes", action="store_true")
+    outGroup = parser.add_mutually_exclusive_group()
+    outGroup.add_argument("--csv", help="Write the ranking in CSV format",
+            action="store_true")
+    outGroup.add_argument("--json", help="Write the ranking in JSON format",
+            action="store_true")
+
+    args = parser.parse_args(argv)
+
+    fileList = list(args.infiles)
+    if args.fileList:
+        with open(args.fileList, "r") as listFile:
+            fileList += [line.strip() for line in listFile if line.strip()]
+    if len(fileList) == 0:
+        parser.error("no input files given")
+    if args.top < 1:
+        parser.error("the number to list must be positive")
+
+    if session is None:
+        session = ProfileSession()
+    try:
+        rows = rank_metrics(fileList, args.top, args.rankBy, args.metrics,
+                args.threads, args.smallest, session.load)
+    except KeyError as err:
+        parser.error(err.args[0])
+
+    if args.json:
+        print(json.dumps(rows, indent=4))
+    elif args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=rankFields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print_table(rows, rankFields)
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import os
+import sys
+import numpy as np
+from map_json_common import *
+from metric_pyramid import get_metric_series, pyramidStats
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from plot_data_common import *
+from profile_session import ProfileSession
+
+resampleStats = pyramidStats
+plotModes = ["overlay", "difference", "aggregate"]
+
+def resample_windows(starts, ends, mins, maxs, means, binEdges):
+    """
+    Resamples the samples of a metric, taken over contiguous windows, onto
+    bins with the given edges. The mean of a bin is the mean of the samples
+    weighted by the time each window overlaps the bin, and the minimum and
+    maximum of a bin are the minimum of the minimums and the maximum of the
+    maximums of all of the windows which overlap it, so that peaks shorter
+    than a bin are not lost
+
+    Args:
+        starts (array): Start times of the sampling windows
+        ends (array): End times of the sampling windows, each being the start
+            of the next
+        mins, maxs, means (array): Samples of the metric. Missing samples are
+            NaN
+        binEdges (array): Increasing edges of the bins, in the same units as
+            the window times
+
+    Returns:
+        Tuple of NumPy arrays (mins, maxs, means) with a value per bin. Bins
+        which no window overlaps are NaN
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    binEdges = np.asarray(binEdges, dtype=np.float64)
+    numBins = len(binEdges) - 1
+    if len(starts) == 0:
+        empty = np.full(numBins, np.nan)
+        return empty, empty.copy(), empty.copy()
+
+    # Running integrals of the metric and of the time covered by samples, at
+    # the window boundaries. Both are linear within a window
+    boundaries = np.append(starts, ends[-1])
+    widths = ends - starts
+    present = ~np.isnan(means)
+    integral = np.concatenate(([0.], np.cumsum(np.where(present,
+        means * widths, 0.))))
+    covered = np.concatenate(([0.], np.cumsum(np.where(present, widths, 0.))))
+    binIntegrals = np.diff(np.interp(binEdges, boundaries, integral))
+    binCovered = np.diff(np.interp(binEdges, boundaries, covered))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        binMeans = np.where(binCovered > 0, binIntegrals / binCovered, np.nan)
+
+    # Windows [firstInds, lastInds) overlap each bin. Reducing over the
+    # interleaved indices gives the reduction over each of these ranges at
+    # the even positions, and a NaN is appended so that an index may equal
+    # the number of windows
+    firstInds = np.searchsorted(ends, binEdges[:-1], side="right")
+    lastInds = np.searchsorted(starts, binEdges[1:], side="left")
+    bounds = np.minimum(np.column_stack((firstInds, lastInds)).ravel(),
+            len(starts))
+    overlapped = lastInds > firstInds
+    binMins = np.fmin.reduceat(np.append(mins, np.nan), bounds)[::2]
+    binMaxs = np.fmax.reduceat(np.append(maxs, np.nan), bounds)[::2]
+    binMins[~overlapped] = np.nan
+    binMaxs[~overlapped] = np.nan
+    return binMins, binMaxs, binMeans
+#### End of function resample_windows
+
+def resample_window_means(starts, ends, means, binEdges):
+    """
+    Resamples the means of several metrics sampled over the same windows onto
+    bins with the given edges, as resample_windows does, but for all of the
+    metrics at once. The interpolation of the running integrals at the bin
+    edges is the same for every metric, so it is only worked out once
+
+    Args:
+        starts (array): Start times of the sampling windows
+        ends (array): End times of the sampling windows
+        means (array): 2-D array of samples with one row per metric. Missing
+            samples are NaN
+        binEdges (array): Increasing edges of the bins
+
+    Returns:
+        2-D NumPy array of the time weighted mean of each metric in each bin.
+        Bins which no window overlaps are NaN
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    means = np.atleast_2d(np.asarray(means, dtype=np.float64))
+    binEdges = np.asarray(binEdges, dtype=np.float64)
+    if len(starts) == 0:
+        return np.full((means.shape[0], len(binEdges) - 1), np.nan)
+
+    boundaries = np.append(starts, ends[-1])
+    widths = ends - starts
+    present = ~np.isnan(means)
+    zeros = np.zeros((means.shape[0], 1))
+    integral = np.concatenate((zeros, np.cumsum(np.where(present,
+        means * widths, 0.), axis=1)), axis=1)
+    covered = np.concatenate((zeros, np.cumsum(np.where(present, widths, 0.),
+        axis=1)), axis=1)
+
+    # Position of each bin edge within the windows, clamped to the run as
+    # np.interp does
+    inds = np.clip(np.searchsorted(boundaries, binEdges, side="right") - 1, 0,
+            len(starts) - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fracs = np.clip(np.where(widths[inds] > 0, (binEdges -
+            boundaries[inds]) / widths[inds], 0.), 0., 1.)
+    binIntegrals = np.diff(integral[:, inds] * (1. - fracs) +
+            integral[:, inds + 1] * fracs, axis=1)
+    binCovered = np.diff(covered[:, inds] * (1. - fracs) +
+            covered[:, inds + 1] * fracs, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(binCovered > 0, binIntegrals / binCovered, np.nan)
+#### End of function resample_window_means
+
+def get_run_windows(profileDict, metricName):
+    """
+    Gets the windows of a profile relative to the start of its first window,
+    along with the samples of a metric in each
+
+    Returns:
+        Tuple of NumPy arrays (starts, ends, mins, maxs, means)
+    """
+    numSamples = get_sample_count(profileDict)
+    starts = np.array(get_window_start_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    ends = np.array(get_window_end_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    if len(starts) > 0:
+        ends -= starts[0]
+        starts -= starts[0]
+    mins, maxs, means = get_metric_series(profileDict, metricName)
+    return starts, ends, mins[:numSamples], maxs[:numSamples], means[:numSamples]
+#### End of function get_run_windows
+
+def resample_metric(fileList, metricName, numBins=500, normalised=True,
+        loadFunc=load_profile):
+    """
+    Resamples a metric of each of a list of profiles onto a common time grid,
+    so that the runs can be overlaid, subtracted or aggregated bin by bin. On
+    a normalised grid the time of each run goes from 0 at its start to 1 at
+    its end. Otherwise the grid spans the longest run in milliseconds, and
+    the bins after the end of a shorter run are NaN
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        metricName (str): Name of a sampled metric or of an activity
+        numBins (int): Number of bins of the grid
+        normalised (bool): Indicates whether to use normalised rather than
+            absolute time
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        Tuple of (NumPy array of the numBins + 1 edges of the bins, dictionary
+        of 2-D NumPy arrays keyed by "mins", "maxs" and "means", with one row
+        per run in the order of fileList and one column per bin)
+    """
+    assert numBins > 0
+
+    runWindows = [get_run_windows(loadFunc(filename), metricName)
+            for filename in fileList]
+    runEnds = [ends[-1] if len(ends) > 0 else 0. for _, ends, _, _, _ in
+            runWindows]
+    binEdges = np.linspace(0., 1. if normalised else max(runEnds + [0.]),
+            numBins + 1)
+
+    stats = dict((stat, np.full((len(fileList), numBins), np.nan))
+            for stat in resampleStats)
+    for run, (starts, ends, mins, maxs, means) in enumerate(runWindows):
+        if normalised and runEnds[run] > 0:
+            starts = starts / runEnds[run]
+            ends = ends / runEnds[run]
+        binStats = resample_windows(starts, ends, mins, maxs, means, binEdges)
+        for stat, values in zip(resampleStats, binStats):
+            stats[stat][run] = values
+    return binEdges, stats
+#### End of function resample_metric
+
+def get_resampled_plot_data(fileList, metricName, stat="means", numBins=500,
+        normalised=True, mode="overlay", loadFunc=load_profile):
+    """
+    Gets the lines drawn by plot_resampled_metric
+
+    Args:
+        fileList (list): Names of the JSON exports of MAP profiles
+        metricName (str): Name of a sampled metric or of an activity
+        stat (str): One of "mins", "maxs" or "means"
+        numBins (int): Number of bins of the common grid
+        normalised (bool): Indicates whether to use normalised time
+        mode (str): "overlay" for a line per run, "difference" for the
+            difference of each run from the first, or "aggregate" for the
+            minimum, mean and maximum over the runs of each bin
+        loadFunc (function): Function used to read a profile from file
+
+    Returns:
+        List of tuples of (label, xData, yData), with the centre of each bin
+        as the x data
+    """
+    assert stat in resampleStats
+    assert mode in plotModes
+
+    binEdges, stats = resample_metric(fileList, metricName, numBins, normalised,
+            loadFunc)
+    xData = ((binEdges[:-1] + binEdges[1:]) / 2.).tolist()
+    values = stats[stat]
+    labels = [get_run_label(loadFunc(filename)) for filename in fileList]
+
+    if mode == "difference":
+        return [(label + " - " + labels[0], xData, (values[run] -
+            values[0]).tolist()) for run, label in enumerate(labels)
+            if run > 0]
+    if mode == "aggregate":
+        with np.errstate(invalid="ignore"):
+            return [("min over runs", xData, np.fmin.reduce(values).tolist()),
+                    ("mean over runs", xData, __nan_mean(values).tolist()),
+                    ("max over runs", xData, np.fmax.reduce(values).tolist())]
+    return [(label, xData, values[run].tolist())
+            for run, label in enumerate(labels)]
+#### End of function get_resampled_plot_data
+
+def __nan_mean(values):
+    # Mean of each column ignoring NaN, without warning for all NaN columns
+    counts = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(np.isnan(values), 0., values).sum(axis=0) / counts
+#### End of function __nan_mean
+
+def get_run_label(profileDict):
+    return "Procs: " + str((get_num_processes(profileDict),
+        get_num_threads(profileDict)))
+#### End of function get_run_label
+
+def plot_resampled_metric(fileList, metricName, stat="means", numBins=500,
+        normalised=True, mode="overlay", yLabel=None, loadFunc=load_profile):
+    import matplotlib.pyplot as plt
+
+    lines = get_resampled_plot_data(fileList, metricName, stat, numBins,
+            normalised, mode, loadFunc)
+    lineStyle = ['r-', 'g-', 'b-', 'k-', 'r--', 'g--']
+    lineHandles = []
+    for count, (label, xData, yData) in enumerate(lines):
+        lineHandle, = plt.plot(xData, yData, lineStyle[count % len(lineStyle)],
+                label=label)
+        lineHandles.append(lineHandle)
+    plt.xlabel("Fraction of runtime" if normalised else "Time (ms)")
+    plt.ylabel(yLabel if yLabel else str(metricName))
+    plt.legend(handles=lineHandles, loc=1)
+    plt.draw()
+#### End of function plot_resampled_metric
+
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
+    parser = argparse.ArgumentParser(description="Resamples a time dependent" +
+            " metric from the JSON export of multiple Allinea MAP files onto" +
+            " a common time grid, using the sampling windows of each run, and" +
+            " plots the runs on the same axes")
+
+    parser.add_argument("infile", help="File containing list of JSON files" +
+            " (assumed to be exports of Allinea MAP files) to read metric" +
+            " information from", type=argparse.FileType('r'))
+    parser.add_argument("metricName", help="Name of the metric to plot")
+    parser.add_argument("--stat", help="Statistic of the metric to plot. Bins" +
+            " take the minimum of the mins and the maximum of the maxs of" +
+            " the samples overlapping them, and the time weighted mean of the" +
+            " means. Default is means", choices=resampleStats, default="means")
+    parser.add_argument("--bins", help="Number of bins of the common grid." +
+            " Default is 500", type=int, default=500)
+    parser.add_argument("--absolute", help="Use a grid of absolute time in" +
+            " milliseconds rather than of the fraction of each run's" +
+            " runtime", action="store_true")
+    parser.add_argument("--mode", help="overlay plots each run, difference" +
+            " plots each run minus the first run, and aggregate plots the" +
+            " minimum, mean and maximum over the runs. Default is overlay",
+            choices=plotModes, default="overlay")
+    parser.add_argument("--metricDescription", help="Description of the metric name passed in." +
+            " This is used as the y-label of the output graph", default=None)
+    add_emit_data_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.bins < 1:
+        parser.error("the number of bins must be positive")
+    if session is None:
+        session = ProfileSession()
+
+    fileList = [line.strip() for line in args.infile.readlines() if line.strip()]
+
+    if args.emitData:
+        emit_plot_data(get_resampled_plot_data(fileList, args.metricName,
+            args.stat, args.bins, not args.absolute, args.mode, session.load),
+            args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
+    plot_resampled_metric(fileList, args.metricName, args.stat, args.bins,
+            not args.absolute, args.mode, args.metricDescription, session.load)
+    plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
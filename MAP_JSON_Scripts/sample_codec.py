@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Compression of the sample arrays of MAP profiles, in the style of the
+# Gorilla time series codec. Values are stored as the XOR of each float with
+# the previous one, as the delta of deltas for integer times, or as the deltas
+# of scaled integers for values with few decimal places. Runs of zero
+# residuals (i.e. repeated values) are run-length encoded, and the remaining
+# residuals are split into byte planes so that the many zero high or low
+# bytes compress well. Encoding and decoding work on whole NumPy arrays
+#
+import struct
+import zlib
+import numpy as np
+
+codecMagic = b"MJS1"
+floatKind = 0
+intKind = 1
+decimalKind = 2
+# Largest number of decimal places for which values are stored as integers
+maxDecimalPlaces = 6
+# Magic, kind, number of values, number of runs, mask of stored byte planes
+headerStruct = struct.Struct("<4sBQIB")
+# First value and first delta of delta-of-delta encoded integers, or first
+# value and number of decimal places of decimal values
+intHeaderStruct = struct.Struct("<qq")
+
+def __encode_residuals(residuals):
+    """
+    Encodes an array of unsigned 64 bit residuals, run-length encoding the
+    zeros and storing the bytes of the non-zero residuals by plane
+
+    Returns:
+        Tuple of (number of runs, mask of stored byte planes, encoded bytes)
+    """
+    nonZero = residuals != 0
+    # Lengths of alternating runs of zero and non-zero residuals, starting
+    # with a (possibly empty) run of zeros
+    changeInds = np.flatnonzero(np.diff(nonZero)) + 1
+    bounds = np.concatenate(([0], changeInds, [len(residuals)]))
+    runs = np.diff(bounds).astype(np.uint32)
+    if len(residuals) > 0 and nonZero[0]:
+        runs = np.concatenate(([0], runs)).astype(np.uint32)
+
+    planes = residuals[nonZero].astype("<u8").view(np.uint8).reshape(-1, 8).T
+    planeMask = 0
+    planeBytes = []
+    for ind in range(8):
+        if planes[ind].any():
+            planeMask |= 1 << ind
+            planeBytes.append(planes[ind].tobytes())
+    return len(runs), planeMask, runs.astype("<u4").tobytes() + b"".join(planeBytes)
+#### End of function __encode_residuals
+
+def __decode_residuals(numValues, numRuns, planeMask, body):
+    runs = np.frombuffer(body, dtype="<u4", count=numRuns)
+    nonZero = np.repeat(np.resize(np.array([False, True]), numRuns), runs)
+    numNonZero = len(runs) and int(runs[1::2].sum())
+
+    planes = np.zeros((numNonZero, 8), dtype=np.uint8)
+    offset = 4 * numRuns
+    for ind in range(8):
+        if planeMask & (1 << ind):
+            planes[:, ind] = np.frombuffer(body, dtype=np.uint8,
+                    count=numNonZero, offset=offset)
+            offset += numNonZero
+
+    residuals = np.zeros(numValues, dtype=np.uint64)
+    residuals[nonZero] = planes.view("<u8").ravel()
+    return residuals
+#### End of function __decode_residuals
+
+def get_decimal_places(values):
+    """
+    Gets the smallest number of decimal places with which all of the values of
+    an array can be written exactly, e.g. 0 for integers and 2 for [1.25, 3.5]
+
+    Args:
+        values (array): NumPy array of float64 values
+
+    Returns:
+        The number of decimal places, or None if the values are not finite
+        or need more than maxDecimalPlaces
+    """
+    # Negative zero is not preserved by integers
+    if not np.all(np.isfinite(values)) or np.any(np.signbit(values) & (values == 0)):
+        return None
+    for places in range(maxDecimalPlaces + 1):
+        scale = 10.0**places
+        scaled = np.round(values * scale)
+        if np.all(np.abs(scaled) < 2.0**53) and np.all(scaled / scale == values):
+            return places
+    return None
+#### End of function get_decimal_places
+
+def __zigzag(ints):
+    # Map signed to unsigned integers so that small negative values have few
+    # set bits
+    return ((ints << 1) ^ (ints >> 63)).view(np.uint64)
+
+def __unzigzag(residuals):
+    return (residuals >> np.uint64(1)).view(np.int64) ^ \
+            -(residuals.view(np.int64) & 1)
+
+def encode_samples(values, level=6):
+    """
+    Encodes an array of sample values. Integer arrays (such as
+    window_start_offsets) are stored as the delta of deltas, values with few
+    decimal places as the deltas of the values scaled to integers, and other
+    arrays as the XOR of consecutive floats. Missing values (None) are stored
+    as NaN
+
+    Args:
+        values (list): List or array of sample values
+        level (int): zlib compression level applied to the encoded residuals
+
+    Returns:
+        Encoded bytes
+    """
+    values = np.array(values, dtype=np.float64)
+    numValues = len(values)
+    places = get_decimal_places(values) if numValues > 2 else None
+
+    if places == 0:
+        ints = values.astype(np.int64)
+        deltas = np.diff(ints)
+        numRuns, planeMask, body = __encode_residuals(__zigzag(np.diff(deltas)))
+        header = headerStruct.pack(codecMagic, intKind, numValues, numRuns,
+                planeMask) + intHeaderStruct.pack(int(ints[0]), int(deltas[0]))
+    elif places is not None:
+        ints = np.round(values * 10.0**places).astype(np.int64)
+        numRuns, planeMask, body = __encode_residuals(__zigzag(np.diff(ints)))
+        header = headerStruct.pack(codecMagic, decimalKind, numValues, numRuns,
+                planeMask) + intHeaderStruct.pack(int(ints[0]), places)
+    else:
+        bits = values.view(np.uint64)
+        residuals = bits.copy()
+        residuals[1:] ^= bits[:-1]
+        numRuns, planeMask, body = __encode_residuals(residuals)
+        header = headerStruct.pack(codecMagic, floatKind, numValues, numRuns,
+                planeMask)
+    return header + zlib.compress(body, level)
+#### End of function encode_samples
+
+def decode_samples(data):
+    """
+    Decodes an array of sample values encoded by encode_samples
+
+    Args:
+        data (bytes): Encoded bytes
+
+    Returns:
+        NumPy array of float64 values
+    """
+    data = bytes(data)
+    magic, kind, numValues, numRuns, planeMask = headerStruct.unpack_from(data)
+    if magic != codecMagic:
+        raise ValueError("Data is not encoded sample values")
+    offset = headerStruct.size
+
+    if kind == intKind:
+        first, firstDelta = intHeaderStruct.unpack_from(data, offset)
+        offset += intHeaderStruct.size
+        dods = __unzigzag(__decode_residuals(numValues - 2, numRuns, planeMask,
+            zlib.decompress(data[offset:])))
+        deltas = np.empty(numValues - 1, dtype=np.int64)
+        deltas[0] = firstDelta
+        np.cumsum(dods, out=deltas[1:])
+        deltas[1:] += firstDelta
+        ints = np.empty(numValues, dtype=np.int64)
+        ints[0] = first
+        np.cumsum(deltas, out=ints[1:])
+        ints[1:] += first
+        return ints.astype(np.float64)
+
+    if kind == decimalKind:
+        first, places = intHeaderStruct.unpack_from(data, offset)
+        offset += intHeaderStruct.size
+        deltas = __unzigzag(__decode_residuals(numValues - 1, numRuns,
+            planeMask, zlib.decompress(data[offset:])))
+        ints = np.empty(numValues, dtype=np.int64)
+        ints[0] = first
+        np.cumsum(deltas, out=ints[1:])
+        ints[1:] += first
+        return ints / 10.0**places
+
+    residuals = __decode_residuals(numValues, numRuns, planeMask,
+            zlib.decompress(data[offset:]))
+    return np.bitwise_xor.accumulate(residuals).view(np.float64)
+#### End of function decode_samples
+
+def encode_sample_blocks(values, blockSize, level=6):
+    """
+    Encodes an array of sample values as independent blocks, so that a
+    window of samples can be decoded without decoding the whole array
+
+    Args:
+        values (list): List or array of sample values
+        blockSize (int): Number of samples in each block
+        level (int): zlib compression level
+
+    Returns:
+        Tuple of (encoded bytes of all of the blocks, NumPy array of the byte
+        offset of the start of each block, with the total length appended)
+    """
+    assert blockSize > 0
+    values = np.array(values, dtype=np.float64)
+    blocks = [encode_samples(values[start:start + blockSize], level)
+            for start in range(0, len(values), blockSize)]
+    offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(block) for block in blocks])
+    return b"".join(blocks), offsets
+#### End of function encode_sample_blocks
+
+def decode_sample_window(readBytes, offsets, blockSize, startInd=0,
+        endInd=None):
+    """
+    Decodes a window of samples from an array encoded by encode_sample_blocks
+
+    Args:
+        readBytes (function): Function taking (start, end) byte offsets and
+            returning those bytes of the encoded data, so that only the blocks
+            overlapping the window need to be read
+        offsets (array): Byte offsets of the blocks, as returned by
+            encode_sample_blocks
+        blockSize (int): Number of samples in each block
+        startInd (int): Index of the first sample to decode (inclusive)
+        endInd (int): Index of the last sample to decode (exclusive). Default
+            is to decode to the last sample
+
+    Returns:
+        NumPy array of float64 values
+    """
+    numBlocks = len(offsets) - 1
+    if numBlocks <= 0:
+        return np.zeros(0, dtype=np.float64)
+    firstBlock = min(max(startInd, 0) // blockSize, numBlocks - 1)
+    lastBlock = numBlocks if endInd is None else \
+            min(-(-endInd // blockSize), numBlocks)
+    if lastBlock <= firstBlock:
+        return np.zeros(0, dtype=np.float64)
+
+    data = readBytes(int(offsets[firstBlock]), int(offsets[lastBlock]))
+    base = int(offsets[firstBlock])
+    values = np.concatenate([decode_samples(data[int(offsets[ind]) - base:
+        int(offsets[ind + 1]) - base]) for ind in range(firstBlock, lastBlock)])
+    windowStart = max(startInd, 0) - firstBlock * blockSize
+    windowEnd = None if endInd is None else endInd - firstBlock * blockSize
+    return values[windowStart:windowEnd]
+#### End of function decode_sample_window
@@ -16,6 +16,11 @@
 import argparse # For command line argument parsing
 import os.path # For checking for file existence
 import json # For JSON parsing
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
+from map_json_common import profile_exists
 
 def print_indented(indentLevel, outStr):
     """
@@ -81,7 +86,16 @@ def print_metric_names(sampleDict):
     print_dict_keys(sampleDict["metrics"], "Sampled (i.e. time-series) metric names:")
 #### End of function print_metric_names
         
-if(__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     # Main program
     # Set up the correct program arguments
     # Create a parser for the option passed in
@@ -90,16 +104,17 @@ if(__name__ == "__main__"):
             " what the metrics mean see the Allinea Forge userguide.")
     parser.add_argument("filename", help="Name of a JSON file with Allinea MAP profile data")
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Check that the file exists
-    if(not os.path.isfile(args.filename)):
+    if(not profile_exists(args.filename)):
         raise IOError("File " + args.filename + " does not exist")
     
     # Read data from the filename passed in, assuming that it is in JSON format.
     # Let the json.load function perform error checking
-    with open(args.filename, 'r') as jsonFile:
-        profileDict = json.load(jsonFile)
+    if session is None:
+        session = ProfileSession()
+    profileDict = session.load(args.filename)
     assert isinstance(profileDict, dict)
 
     # Show the global metrics
@@ -107,3 +122,7 @@ if(__name__ == "__main__"):
 
     # Show the names of the sample metrics
     print_metric_names(profileDict["samples"])
+#### End of function main
+
+if __name__ == "__main__":
+    main()
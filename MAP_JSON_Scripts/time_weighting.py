@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Aggregation of the samples of MAP profiles weighted by the length of each
+# sampling window. MAP doubles its sampling interval as a run gets longer, so
+# the windows are of uneven length and a plain mean of the samples gives too
+# much weight to the start of the run
+#
+import numpy as np
+from map_json_common import *
+
+def get_window_lengths(profileDict):
+    """
+    Gets the length of each sampling window of a profiled run
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+
+    Returns:
+        NumPy array of the lengths of the windows in milliseconds
+    """
+    numSamples = get_sample_count(profileDict)
+    starts = np.array(get_window_start_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    ends = np.array(get_window_end_times(profileDict)[:numSamples],
+            dtype=np.float64)
+    return ends - starts
+#### End of function get_window_lengths
+
+def __get_weighted_samples(profileDict, samples, first, last):
+    """
+    Returns the samples between first and last (exclusive, with -1 for the
+    end) as a 2-D float array with one row per series, along with the window
+    lengths, which are zero for missing samples
+    """
+    values = np.array(samples, dtype=np.float64)
+    values = np.atleast_2d(values)
+    lengths = get_window_lengths(profileDict)
+    numSamples = min(values.shape[-1], len(lengths))
+    if last == -1 or last is None or last > numSamples:
+        last = numSamples
+    values = values[:, first:last]
+    weights = np.where(np.isnan(values), 0.0, lengths[first:last])
+    return values, weights
+#### End of function __get_weighted_samples
+
+def get_time_weighted_mean(profileDict, samples, first=0, last=-1):
+    """
+    Gets the mean of samples of a profile, weighting each sample by the length
+    of its sampling window. Missing samples (None or NaN) are ignored. When
+    all of the windows have zero length the samples are weighted equally
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        samples (list): Samples of a metric, or a list of the samples of
+            several metrics
+        first (int): Index of the first sample to include
+        last (int): Index of the sample at which to stop (exclusive). -1
+            indicates the end of the samples
+
+    Returns:
+        The mean, or a NumPy array of the mean of each list of samples. NaN
+        if there are no samples
+    """
+    values, weights = __get_weighted_samples(profileDict, samples, first, last)
+    totals = weights.sum(axis=1)
+    noLength = totals <= 0
+    weights[noLength] = ~np.isnan(values[noLength])
+    totals = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(weights > 0, values * weights, 0.0).sum(axis=1) / totals
+    return means if np.ndim(samples) > 1 else float(means[0])
+#### End of function get_time_weighted_mean
+
+def get_time_weighted_total(profileDict, samples, first=0, last=-1):
+    """
+    Gets the integral over time of samples of a rate, i.e. the sum of each
+    sample multiplied by the length of its window in seconds. Missing samples
+    are taken to be zero
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        samples (list): Samples of a rate per second, or a list of the samples
+            of several rates
+        first (int): Index of the first sample to include
+        last (int): Index of the sample at which to stop (exclusive). -1
+            indicates the end of the samples
+
+    Returns:
+        The total, or a NumPy array of the total of each list of samples
+    """
+    values, weights = __get_weighted_samples(profileDict, samples, first, last)
+    totals = np.where(weights > 0, values * weights, 0.0).sum(axis=1) / 1000.
+    return totals if np.ndim(samples) > 1 else float(totals[0])
+#### End of function get_time_weighted_total
+
+def get_time_weighted_integral(profileDict, samples, first=0, last=-1):
+    """
+    Gets the running integral over time of samples of a rate, i.e. the total
+    (see get_time_weighted_total) up to the end of each window
+
+    Args:
+        profileDict (dict): Dictionary of values representing an Arm MAP
+            profiled run
+        samples (list): Samples of a rate per second, or a list of the samples
+            of several rates
+        first (int): Index of the first sample to include
+        last (int): Index of the sample at which to stop (exclusive). -1
+            indicates the end of the samples
+
+    Returns:
+        NumPy array of the integral at the end of each window, with one row
+        per list of samples if several are given
+    """
+    values, weights = __get_weighted_samples(profileDict, samples, first, last)
+    integrals = np.cumsum(np.where(weights > 0, values * weights, 0.0),
+            axis=1) / 1000.
+    return integrals if np.ndim(samples) > 1 else integrals[0]
+#### End of function get_time_weighted_integral
@@ -1,9 +1,15 @@
 import json
 import argparse
 import map_json_common as mjc
+import os
 import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from profile_session import ProfileSession
 
 def generate_out_filename(infileName, startInd, endInd):
+    # A run in an archive is written to a JSON file next to the archive
+    infileName = mjc.get_output_base_name(infileName)
     dotInd= infileName.rfind(".")
     slashInd= infileName.rfind("/")
     suffix= "_trunc" + str(startInd) + "-" + str(endInd)
@@ -12,7 +18,19 @@ def generate_out_filename(infileName, startInd, endInd):
     return outFName
 #### End of function generate_out_filename
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+
+    Returns:
+        0 if the profile was truncated, or 1 if the index range is invalid
+    """
     parser = argparse.ArgumentParser(description="Takes a start and end index" +
     " and truncates the samples in a JSON file to contain only the given" +
     " samples.") 
@@ -27,22 +45,34 @@ if __name__ == "__main__":
             " at which to end (inclusive)", type=int, default=-1)
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    # Open the JSON file for reading
-    with open(args.infile, "r") as f:
-        profileDict = json.load(f)
+    # Read the JSON file
+    if session is None:
+        session = ProfileSession()
+    profileDict = session.load(args.infile)
 
     # Ensure that the number of samples we want to obtain are in the right range
     if (args.startInd < 0 or args.startInd >= args.endInd or 
         args.endInd >= mjc.get_sample_count(profileDict)):
-        print("Invalid index range [" + str(args.startInd) + ", " + str(args.endInd) + "]")
-        sys.exit(1)
+        # Return the status rather than exit, so that a chain of subcommands
+        # reports which subcommand failed
+        print("Invalid index range [" + str(args.startInd) + ", " +
+                str(args.endInd) + "]", file=sys.stderr)
+        return 1
 
+    # The profile is truncated in place, so the session no longer holds the
+    # contents of the input file
+    session.evict(args.infile)
     mjc.truncate_profile(profileDict, args.startInd, args.endInd)
 
     outFileName= generate_out_filename(args.infile, args.startInd, args.endInd)
     with open(outFileName, "w") as f:
         json.dump(profileDict, f, sort_keys=True, indent=4)
+    session.put(outFileName, profileDict)
     print("Truncated JSON samples written to " + outFileName)
-#### End of main function
+    return 0
+#### End of function main
+
+if __name__ == "__main__":
+    sys.exit(main())
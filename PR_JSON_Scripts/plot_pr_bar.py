@@ -13,43 +13,67 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
 from pr_json_common import *
+import os
 import sys
-sys.path.append('../JSON_Common')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
 
-def plot_metrics_as_bar(fileList, metricList, labelList, threads, ylabel):
+def get_metrics_bar_data(fileList, metricList, threads, loadFunc=load_json_file):
     """
-    Plot metrics on a bar char from the list of metrics supplied, where the
-    metric values are read from the list of files supplied. It is assumed that
-    the list of files are generated from a series of runs which show strong
-    scaling of a code
+    Reads the metrics in the list of metrics supplied from each of the files
+    supplied
 
     Args:
         fileList (list): List of filenames from which to read information
         metricList (list): List of metrics to read
-        labelList (list): List of labels for the metrics to use in the legend
         threads (bool): Indicates whether threads or processes are used
-        ylabel (str): Label for the y-axis
+        loadFunc (function): Function used to read a profile given its file
+            name
 
     Returns:
-        Nothing
+        Dictionary of the form {numProcs : [list, of, metric, values]}
     """
-
     yData = {}
     for filename in fileList:
-        profileDict = {}
         # Read the json in from file
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
         # Get the number of processes or threads used
         numProcs = get_num_threads(profileDict) if threads else get_num_processes(profileDict)
 
         # Read the given metrics and update the values to plot
         yData.update({numProcs : get_dict_field_vals(profileDict, metricList)})
+    return yData
+#### End of function get_metrics_bar_data
+
+def plot_metrics_as_bar(fileList, metricList, labelList, threads, ylabel,
+        loadFunc=load_json_file):
+    """
+    Plot metrics on a bar char from the list of metrics supplied, where the
+    metric values are read from the list of files supplied. It is assumed that
+    the list of files are generated from a series of runs which show strong
+    scaling of a code
+
+    Args:
+        fileList (list): List of filenames from which to read information
+        metricList (list): List of metrics to read
+        labelList (list): List of labels for the metrics to use in the legend
+        threads (bool): Indicates whether threads or processes are used
+        ylabel (str): Label for the y-axis
+        loadFunc (function): Function used to read a profile given its file
+            name
+
+    Returns:
+        Nothing
+    """
+    import matplotlib.pyplot as plt
+
+    yData = get_metrics_bar_data(fileList, metricList, threads, loadFunc)
 
     # Plot the data
     # Get the x-axis data
@@ -87,7 +111,16 @@ def plot_metrics_as_bar(fileList, metricList, labelList, threads, ylabel):
     plt.legend(handles=barHandles, loc=1, bbox_to_anchor=(1.1, 1.1))
 #### End of function plot_metrics_as_bar
 
-if (__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a bar chart" +
             " of different metrics stored in a series of JSON files, assumed to" +
             " be the export of a Performance Report. It is also assumed " +
@@ -110,8 +143,11 @@ if (__name__ == "__main__"):
     defaultYLabel = "Proportion of Time (%)"
     parser.add_argument("--ylabel", help="Label for the y-axis. Default is " +
         defaultYLabel.replace('%','%%'), default=defaultYLabel)
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the list of files
     fileList = [line.strip() for line in args.infile.readlines()]
@@ -128,6 +164,20 @@ if (__name__ == "__main__"):
             metricList.append([val.strip() for val in vals[0].split(',')])
             labelList.append(' '.join(vals[1:]))
 
+    if args.emitData:
+        # Write out the metrics read from the files rather than plotting them
+        yData = get_metrics_bar_data(fileList, metricList, args.threads, session.load)
+        sortedKeys = sorted(yData.keys())
+        emit_plot_data([(label, sortedKeys, [yData[key][ind] for key in sortedKeys])
+            for ind, label in enumerate(labelList)], args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Plot the metrics from the files
-    plot_metrics_as_bar(fileList, metricList, labelList, args.threads, args.ylabel)
+    plot_metrics_as_bar(fileList, metricList, labelList, args.threads, args.ylabel,
+            session.load)
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
 import argparse
 import json
+import sys
 from pr_json_common import *
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
 
 mpiSubPercentages = ["collectivePercent", "p2pPercent"]
 mpiColors = ['#d0523a', '#d0382a']
@@ -34,7 +35,6 @@ cpuLabels = ["CPU"]
 allColors = cpuColors + mpiColors + ioColors
 allLabels = cpuLabels + mpiLabels + ioLabels
 fontSize = 16
-rcParams.update({'font.size' : fontSize})
 
 def plot_stacked_bar(barDict, ax, labels, colors):
     """
@@ -87,6 +87,10 @@ def plot_percent_time_bars(percentDict, timeDict, labels, colors):
         numProcessesY : [val1, ..., valn]
     }
     """
+    import matplotlib.pyplot as plt
+    from matplotlib import rcParams
+    rcParams.update({'font.size' : fontSize})
+
     percentAxes = plt.subplot(211)
     #percentAxes = plt.gca()
     plot_stacked_bar(percentDict, percentAxes, labels, colors)
@@ -103,7 +107,7 @@ def plot_percent_time_bars(percentDict, timeDict, labels, colors):
     plt.show()
 ### End of function plot_percent_time_bars
 
-def get_mpi_components_from_files(fileList, threads=False):
+def get_mpi_components_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Given a list of files to read input data from, gets a percentage of time
     spent in MPI, and a breakdown of that time in MPI
@@ -114,30 +118,28 @@ def get_mpi_components_from_files(fileList, threads=False):
     for filename in fileList:
         filename = filename.strip()
         try:
-            # Open the file for reading
-            with open(filename, "r") as infile:
-                # Read the json
-                jsonDict = json.load(infile)
-                runtime = get_runtime(jsonDict)
-                numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
-                # Read the overview data and get the percentage of overall time spent in mpi
-                subDict = get_overview_data(jsonDict)
-                mpiPercent = get_dict_field_val(subDict, ["mpi", "percent"]) #mpiTime = (percent / 100.) * runtime 
-                # Now get the sub-percentage of the mpi time
-                mpiEntry = get_dict_field_val(jsonDict, ["data", "mpi"])
-                # Get all of the percentages (as a percentage of total time)
-                mpiSubPercent = [float(get_dict_field_val(mpiEntry, [field])) * mpiPercent / 100. for field in mpiSubPercentages]
-                mpiSubTime = [runtime * subpercent / 100. for subpercent in mpiSubPercent]
-
-                percentDict[numprocs] = mpiSubPercent
-                timeDict[numprocs] = mpiSubTime
+            # Read the json
+            jsonDict = loadFunc(filename)
+            runtime = get_runtime(jsonDict)
+            numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
+            # Read the overview data and get the percentage of overall time spent in mpi
+            subDict = get_overview_data(jsonDict)
+            mpiPercent = get_dict_field_val(subDict, ["mpi", "percent"]) #mpiTime = (percent / 100.) * runtime 
+            # Now get the sub-percentage of the mpi time
+            mpiEntry = get_dict_field_val(jsonDict, ["data", "mpi"])
+            # Get all of the percentages (as a percentage of total time)
+            mpiSubPercent = [float(get_dict_field_val(mpiEntry, [field])) * mpiPercent / 100. for field in mpiSubPercentages]
+            mpiSubTime = [runtime * subpercent / 100. for subpercent in mpiSubPercent]
+
+            percentDict[numprocs] = mpiSubPercent
+            timeDict[numprocs] = mpiSubTime
         except IOError:
-            print("File " + filename + " does not exist. Skipping.")
+            print("File " + filename + " does not exist. Skipping.", file=sys.stderr)
             pass
     return percentDict, timeDict
 ### End of function get_mpi_component_from_files
 
-def get_io_components_from_files(fileList, threads=False):
+def get_io_components_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Given a list of input files to read input data from, gets a percentage of
     time spent in IO and a breakdown of that time in I/O
@@ -148,28 +150,27 @@ def get_io_components_from_files(fileList, threads=False):
     for filename in fileList:
         filename = filename.strip()
         try:
-            with open(filename, "r") as infile:
-                # Read the json
-                jsonDict = json.load(infile)
-                runtime = get_runtime(jsonDict)
-                numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
-                # Read the overview and get the percentage of overall time spent in io
-                subDict = get_overview_data(jsonDict)
-                ioPercent = get_dict_field_val(subDict, ["io", "percent"])
-                ioJson = get_dict_field_val(jsonDict, ["data", "io"])
-
-                ioSubPercent = [float(get_dict_field_val(ioJson, [field])) * ioPercent / 100. for field in ioSubPercentages]
-                ioSubTime = [runtime * subpercent / 100. for subpercent in ioSubPercent]
-
-                percentDict[numprocs] = ioSubPercent
-                timeDict[numprocs] = ioSubTime
+            # Read the json
+            jsonDict = loadFunc(filename)
+            runtime = get_runtime(jsonDict)
+            numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
+            # Read the overview and get the percentage of overall time spent in io
+            subDict = get_overview_data(jsonDict)
+            ioPercent = get_dict_field_val(subDict, ["io", "percent"])
+            ioJson = get_dict_field_val(jsonDict, ["data", "io"])
+
+            ioSubPercent = [float(get_dict_field_val(ioJson, [field])) * ioPercent / 100. for field in ioSubPercentages]
+            ioSubTime = [runtime * subpercent / 100. for subpercent in ioSubPercent]
+
+            percentDict[numprocs] = ioSubPercent
+            timeDict[numprocs] = ioSubTime
         except IOError:
-            print("File " + filename + " does not exist. Skipping.")
+            print("File " + filename + " does not exist. Skipping.", file=sys.stderr)
             pass
     return percentDict, timeDict
 ### End of function get_io_components_from_files
 
-def get_cpu_components_from_files(fileList, threads=False):
+def get_cpu_components_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Given a list of input files to read input data from, shows the percentage
     of time spent in CPU
@@ -180,30 +181,29 @@ def get_cpu_components_from_files(fileList, threads=False):
     for filename in fileList:
         filename = filename.strip()
         try:
-            with open(filename, "r") as infile:
-                # Read the JSON
-                jsonDict = json.load(infile)
-                runtime = get_runtime(jsonDict)
-                numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
-                # Read the overview and get the percentage of overall time spent in cpu
-                cpuPercent = get_dict_field_val(jsonDict, ["data", "overview", "cpu", "percent"])
+            # Read the JSON
+            jsonDict = loadFunc(filename)
+            runtime = get_runtime(jsonDict)
+            numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
+            # Read the overview and get the percentage of overall time spent in cpu
+            cpuPercent = get_dict_field_val(jsonDict, ["data", "overview", "cpu", "percent"])
                 
-                percentDict[numprocs] = [cpuPercent]
-                timeDict[numprocs] = [runtime * cpuPercent / 100.]
+            percentDict[numprocs] = [cpuPercent]
+            timeDict[numprocs] = [runtime * cpuPercent / 100.]
         except IOError:
-            print("File " + filename + " does not exist. Skipping.")
+            print("File " + filename + " does not exist. Skipping.", file=sys.stderr)
             pass
     return percentDict, timeDict
 ### End of function get_cpu_components_from_files
 
-def get_all_components_from_files(fileList, threads=False):
+def get_all_components_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Given a list of input files to read input data from, shows the percentage
     of time spent in CPU, IO and MPI, as well as breaking this down somewhat
     """
-    cpuPercent, cpuTime = get_cpu_components_from_files(fileList)
-    ioPercent, ioTime = get_io_components_from_files(fileList)
-    mpiPercent, mpiTime = get_mpi_components_from_files(fileList)
+    cpuPercent, cpuTime = get_cpu_components_from_files(fileList, threads, loadFunc)
+    ioPercent, ioTime = get_io_components_from_files(fileList, threads, loadFunc)
+    mpiPercent, mpiTime = get_mpi_components_from_files(fileList, threads, loadFunc)
 
     allPercent = cpuPercent
     for key in allPercent.keys():
@@ -216,7 +216,16 @@ def get_all_components_from_files(fileList, threads=False):
     return allPercent, allTime
 ### End of function get_all_components_from_files
 
-if (__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a stacked bar" +
             " chart of the sub-types of CPU, MPI and I/O recorded in a " +
             "performance report")
@@ -224,8 +233,11 @@ if (__name__ == "__main__"):
     parser.add_argument("infile", help="JSON file to read a list of input files from." +
             " The files are assumed to be JSON format Performance Reports",
             type=argparse.FileType('r'))
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read in the list of files from which to read Performance Report data
     fileList = [line.strip() for line in args.infile.readlines()]
@@ -238,6 +250,21 @@ if (__name__ == "__main__"):
 #    percentDict, timeDict = get_io_components_from_files(fileList)
 #    plot_percent_time_bars(percentDict, timeDict, ioLabels, ioColors)
 
-    percentDict, timeDict = get_all_components_from_files(fileList)
+    percentDict, timeDict = get_all_components_from_files(fileList,
+            loadFunc=session.load)
+    if args.emitData:
+        # Write out the percentages and times rather than plotting them
+        sortedKeys = sorted(percentDict.keys())
+        seriesList = []
+        for dataDict, units in [(percentDict, " (%)"), (timeDict, " (s)")]:
+            seriesList.extend([(label + units, sortedKeys,
+                [dataDict[key][ind] for key in sortedKeys])
+                for ind, label in enumerate(allLabels)])
+        emit_plot_data(seriesList, args.emitData)
+        return
+
     plot_percent_time_bars(percentDict, timeDict, allLabels, allColors)
+#### End of function main
 
+if __name__ == "__main__":
+    main()
@@ -13,26 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
+import sys
 from pr_json_common import *
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
+from scaling_models import scalingDefs, modelNames, get_scaling_label, \
+        is_decreasing, get_ideal_line, get_fitted_lines
 from math import nan
 
-scalings = { 'constant' : (lambda x, y : 1.),
-            'lineard' : (lambda x, y : float(x) / y),
-            'lineari' : (lambda x, y : float(y) / x),
-            'quadraticd' : (lambda x, y : float(x**2) / y**2),
-            'quadratici' : (lambda x, y : float(y**2) / x**2)
-            }
-
-def isDecreasing(name):
-    assert isinstance(name, str)
-    return name[-1] == 'd'
-#### End of function isDecreasing
-
-def read_summary_data_from_files(fileList, threads=False):
+def read_summary_data_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Reads the MPI, IO and CPU percentage fields from the list of files passed
     in. It is assumed that the files all relate to the same application, but
@@ -42,6 +34,8 @@ def read_summary_data_from_files(fileList, threads=False):
         fileList (list): List of filenames to read data from
         threads (bool): Indicates whether threads, instead of processes,
             should be read from the summary files
+        loadFunc (function): Function used to read a profile given its file
+            name
 
     Returns:
         A dictionary containing the processor count with the tuple of I/O, MPI
@@ -55,50 +49,23 @@ def read_summary_data_from_files(fileList, threads=False):
     for filename in fileList:
         filename = filename.strip()
         try:
-            # Open the file for reading
-            with open(filename, "r") as infile:
-                # Read the json
-                jsonDict = json.load(infile)
-                runtime = get_runtime(jsonDict)
-                numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
-                # Read the overview data
-                subDict = get_overview_data(jsonDict)
-                vals = [get_dict_field_val(subDict, [key, "percent"]) for key in ["io", "mpi", "cpu"]]
-                timevals = [(x / 100.) * runtime for x in vals]
-                barDict[numprocs] = vals
-                timeDict[numprocs] = timevals
+            # Read the json
+            jsonDict = loadFunc(filename)
+            runtime = get_runtime(jsonDict)
+            numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
+            # Read the overview data
+            subDict = get_overview_data(jsonDict)
+            vals = [get_dict_field_val(subDict, [key, "percent"]) for key in ["io", "mpi", "cpu"]]
+            timevals = [(x / 100.) * runtime for x in vals]
+            barDict[numprocs] = vals
+            timeDict[numprocs] = timevals
         except IOError:
-            print("File " + filename + " does not exist. Skipping.")
+            print("File " + filename + " does not exist. Skipping.", file=sys.stderr)
             pass
 
     return barDict, timeDict
 #### End of function read_summary_data_from_files
 
-def get_ideal_func(expected):
-    return scalings[expected]
-
-def get_ideal_line(initTime, coreCounts, expected):
-    """
-    Gets data for an ideal scaling line in either the weak or strong case.
-
-    Args:
-        initTime (float): The initial time from which to draw an ideal scaling
-        coreCounts (list): List of counts of cores from which the ideal line
-            can be calculated
-        expected (str): Indicates what sort of scaling is expected for the
-            ideal line
-    """
-
-    idealData = [0. for _ in coreCounts]
-    idealData[0] = initTime
-
-    scalingFunc = get_ideal_func(expected)
-    for i in range(1,len(coreCounts)):
-        idealData[i] = idealData[i-1] * scalingFunc(coreCounts[i-1], coreCounts[i])
-
-    return idealData
-#### End of function get_ideal_line
-
 def plot_bar_data(barData, threads=False):
     """
     Plots the data contained in the dictionary passed in. This should be of the
@@ -112,6 +79,8 @@ def plot_bar_data(barData, threads=False):
     Returns:
         Nothing
     """
+    import matplotlib.pyplot as plt
+
     assert isinstance(barData, dict)
 
     # Get the list of keys and sort them
@@ -147,7 +116,65 @@ def noneIfZero(myList, func):
     return None if all(item == 0 for item in myList) else func(myList)
 #### End of function noneIfZero
 
-def plot_time_data(timeData, threads=False, expected=None):
+def get_expected_lines(timeData, expected):
+    """
+    Gets the ideal scaling lines drawn alongside the I/O, MPI and CPU times of
+    a run. The data is of the form
+    { numprocs : [io, mpi, cpu] }
+
+    Args:
+        timeData (dict): A dictionary assumed to have a very specific format
+        expected (list): List of names of the expected scalings
+
+    Returns:
+        List of tuples (label, idealData) for each of the expected scalings
+    """
+    # Get the list of keys and sort them
+    sortedKeys = sorted(timeData.keys())
+
+    # Get the appropriate data
+    ioData = [timeData[key][0] for key in sortedKeys]
+    mpiData = [timeData[key][1] for key in sortedKeys]
+    cpuData = [timeData[key][2] for key in sortedKeys]
+
+    lines = []
+    for scaling in expected:
+        label = get_scaling_label(scaling)
+        # Get an ideal line
+        idealFunc = max if is_decreasing(scaling) else min
+        #idealInit = idealFunc([idealFunc(data) for data in [ioData, mpiData, cpuData]]) 
+        idealInit = idealFunc([data for data in [noneIfZero(ioData, idealFunc),
+        noneIfZero(mpiData, idealFunc), noneIfZero(cpuData, idealFunc)] if data]) * 2
+        lines.append((label, get_ideal_line(idealInit, sortedKeys, scaling)))
+    return lines
+#### End of function get_expected_lines
+
+def get_component_fit_lines(timeData, models):
+    """
+    Gets the lines of scaling models fitted to the I/O, MPI and CPU times of
+    a run. The data is of the form
+    { numprocs : [io, mpi, cpu] }
+
+    Args:
+        timeData (dict): A dictionary assumed to have a very specific format
+        models (list): List of names of the scaling models to fit
+
+    Returns:
+        List of tuples (label, fittedData) for each of the non-zero components
+        and models
+    """
+    sortedKeys = sorted(timeData.keys())
+    labels = []
+    componentData = []
+    for ind, label in enumerate(["io", "mpi", "cpu"]):
+        data = [timeData[key][ind] for key in sortedKeys]
+        if (any(data)):
+            labels.append(label)
+            componentData.append(data)
+    return get_fitted_lines(sortedKeys, componentData, models, labels)
+#### End of function get_component_fit_lines
+
+def plot_time_data(timeData, threads=False, expected=None, fitModels=None):
     """
     Plots the data given in the dictionary of time data. The keys in here are
     the number of processes that are used, and the values are the wallclock
@@ -160,10 +187,15 @@ def plot_time_data(timeData, threads=False, expected=None):
 
     Args:
         timeData (dict): A dictionary assumed to have a very specific format
+        expected (list): List of names of the expected scalings to draw
+        fitModels (list): List of names of the scaling models to fit to each
+            of the times and draw
 
     Returns:
         Nothing
     """
+    import matplotlib.pyplot as plt
+
     assert isinstance(timeData, dict)
 
     # Get the list of keys and sort them
@@ -182,15 +214,9 @@ def plot_time_data(timeData, threads=False, expected=None):
         #idealInit = (sum(ioData) + sum(mpiData) + sum(cpuData)) / \
         #    (len(ioData) + len(mpiData) + len(cpuData))
         expectedStyles = ['k-', 'k--']
-        for cnt, scaling in enumerate(expected):
-            label = scaling[0:-1] if scaling[-1] == 'i' or scaling == 'd' else scaling
+        for cnt, (label, idealData) in enumerate(get_expected_lines(timeData, expected)):
             # Plot an ideal line
-            idealFunc = max if isDecreasing(scaling) else min
-            #idealInit = idealFunc([idealFunc(data) for data in [ioData, mpiData, cpuData]]) 
-            idealInit = idealFunc([data for data in [noneIfZero(ioData, idealFunc),
-            noneIfZero(mpiData, idealFunc), noneIfZero(cpuData, idealFunc)] if data]) * 2
-            idealHandle, = ax.semilogy(x, get_ideal_line(idealInit, sortedKeys, scaling),
-                    expectedStyles[cnt], label=label)
+            idealHandle, = ax.semilogy(x, idealData, expectedStyles[cnt], label=label)
             handles.append(idealHandle)
 
     # We want a log plot of the results
@@ -203,6 +229,12 @@ def plot_time_data(timeData, threads=False, expected=None):
     if (any(cpuData)):
         cpuHandle, = ax.semilogy(x, cpuData, 'g-', label="cpu", linewidth=2)
         handles.append(cpuHandle)
+    if fitModels:
+        fitColours = {"io" : 'r', "mpi" : 'b', "cpu" : 'g'}
+        for label, fitData in get_component_fit_lines(timeData, fitModels):
+            fitHandle, = ax.semilogy(x, fitData, fitColours[label.split()[0]] +
+                    ':', label=label)
+            handles.append(fitHandle)
 
     # Set the legend, axes label and ticks
     #ax.legend(handles=handles, loc=1, bbox_to_anchor=(1.1, 1.1))
@@ -216,7 +248,16 @@ def plot_time_data(timeData, threads=False, expected=None):
     ax.set_ylabel("Wallclock time (s)")
 #### End of function plot_time_data
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a set of line " +
             "charts for the MPI, I/O and CPU activity recorded in a set of " +
             "Performance Report profiles. It is assumed that the set of profiles " +
@@ -233,17 +274,48 @@ if __name__ == "__main__":
     parser.add_argument("--expected", help="Indicates which scaling is expected" +
             " for the model. This should be one of ['constant', 'linear[i/d]'," +
             " 'quadratic[i/d]']. The i or d suffix indicates increasing or " +
-            "decreasing scale", choices=sorted(scalings.keys()), nargs="+",
+            "decreasing scale", choices=sorted(scalingDefs.keys()), nargs="+",
             default=None)
+    parser.add_argument("--fit", help="Scaling models to fit to the I/O, MPI" +
+            " and CPU times by least squares, drawn alongside them",
+            choices=modelNames, nargs="+", default=None)
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Read the list of files
     fileList = args.infile.readlines()
     # Get the summary data from the files
-    barData, timeData = read_summary_data_from_files(fileList, args.threads)
+    barData, timeData = read_summary_data_from_files(fileList, args.threads,
+            session.load)
+
+    if args.emitData:
+        # Write out the percentages, the times and the expected lines
+        sortedKeys = sorted(barData.keys())
+        seriesList = [(label + " (%)", sortedKeys, [barData[key][ind] for key in sortedKeys])
+                for ind, label in enumerate(["io", "mpi", "cpu"])]
+        if args.expected:
+            seriesList.extend([(label, sortedKeys, idealData) for label, idealData
+                in get_expected_lines(timeData, args.expected)])
+        if args.fit:
+            seriesList.extend([(label, sortedKeys, fitData) for label, fitData
+                in get_component_fit_lines(timeData, args.fit)])
+        for ind, label in enumerate(["io", "mpi", "cpu"]):
+            timeVals = [timeData[key][ind] for key in sortedKeys]
+            if (any(timeVals)):
+                seriesList.append((label + " (s)", sortedKeys, timeVals))
+        emit_plot_data(seriesList, args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Plot the summary data in a bar chart
     plot_bar_data(barData, args.threads)
     #plt.show()
-    plot_time_data(timeData, args.threads, args.expected)
+    plot_time_data(timeData, args.threads, args.expected, args.fit)
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
@@ -13,29 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
+import sys
 from pr_json_common import *
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
+from scaling_models import scalingDefs, modelNames, get_scaling_label, \
+        is_decreasing, get_ideal_line, get_fitted_lines
 
-scalings = { 'constant' : (lambda x, y : 1.),
-            'lineard' : (lambda x, y : float(x) / y),
-            'lineari' : (lambda x, y : float(y) / x),
-            'quadraticd' : (lambda x, y : float(x**2) / y**2),
-            'quadratici' : (lambda x, y : float(y**2) / x**2)
-            }
-
-def isDecreasing(name):
-    assert isinstance(name, str)
-    return name[-1] == 'd'
-#### End of function isDecreasing
-
-def get_label_name(name):
-    return name[:-1] if (name[-1] == 'i' or name[-1] == 'd') else name
-#### End of function get_label_name
-
-def read_time_data_from_files(fileList, threads=False):
+def read_time_data_from_files(fileList, threads=False, loadFunc=load_json_file):
     """
     Reads the running time and process counts from the list of files passed in
     and returns these as a dictionary of (processes : time)
@@ -44,6 +32,8 @@ def read_time_data_from_files(fileList, threads=False):
         fileList (list): List of filenames to read data from
         threads (bool): Indicates whether threads, instead of processes,
             should be read from the summary files
+        loadFunc (function): Function used to read a profile given its file
+            name
 
     Returns:
         A dictionary containing the processor count with the run time
@@ -55,48 +45,43 @@ def read_time_data_from_files(fileList, threads=False):
     for filename in fileList:
         filename = filename.strip()
         try:
-            # Open the file for reading
-            with open(filename, "r") as infile:
-                # Read the json
-                jsonDict = json.load(infile)
-                runtime = get_runtime(jsonDict)
-                numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
-                timeDict[numprocs] = runtime
+            # Read the json
+            jsonDict = loadFunc(filename)
+            runtime = get_runtime(jsonDict)
+            numprocs = get_num_threads(jsonDict) if threads else get_num_processes(jsonDict)
+            timeDict[numprocs] = runtime
         except IOError:
-            print("File " + filename + " does not exist. Skipping.")
+            print("File " + filename + " does not exist. Skipping.", file=sys.stderr)
             pass
 
     return timeDict
 #### End of function read_summary_data_from_files
 
-def get_ideal_func(expected):
-    return scalings[expected]
-#### End of function get_ideal_func
-
-def get_ideal_line(initTime, coreCounts, expected):
+def get_expected_lines(timeData, expectedScaling):
     """
-    Gets data for an ideal scaling line in either the weak or strong case.
+    Gets the ideal scaling lines drawn alongside the run times passed in
 
     Args:
-        initTime (float): The initial time from which to draw an ideal scaling
-        coreCounts (list): List of counts of cores from which the ideal line
-            can be calculated
-        expected (str): Indicates what sort of scaling is expected for the
-            ideal line
-    """
+        timeData (dict): Dictionary of the form {numProcs : runtime}
+        expectedScaling (list): List of names of the expected scalings
 
-    idealData = [0. for _ in coreCounts]
-    idealData[0] = initTime
-
-    scalingFunc = get_ideal_func(expected)
-    for i in range(1,len(coreCounts)):
-        idealData[i] = idealData[i-1] * scalingFunc(coreCounts[i-1], coreCounts[i])
+    Returns:
+        List of tuples (label, idealData) for each of the expected scalings
+    """
+    sortedKeys = sorted(timeData.keys())
+    yData = [timeData[key] for key in sortedKeys]
 
-    return idealData
-#### End of function get_ideal_line
+    lines = []
+    for expected in expectedScaling:
+        idealFunc = max if is_decreasing(expected) else min
+        idealInit = idealFunc(yData)
+        lines.append((get_scaling_label(expected),
+            get_ideal_line(idealInit, sortedKeys, expected)))
+    return lines
+#### End of function get_expected_lines
 
 def plot_time_data(timeData, number, handles=[], threads=False, labels=None,
-        expectedScaling=['lineard'], logy=True):
+        expectedScaling=['lineard'], logy=True, fitModels=None):
     """
     Plots the data given in the dictionary of time data. The keys in here are
     the number of processes that are used, and the values are the wallclock
@@ -106,10 +91,14 @@ def plot_time_data(timeData, number, handles=[], threads=False, labels=None,
         timeData (dict): A dictionary assumed to have a very specific format
         number (int): Counter indicating which set of data to plot. This has an
             effect on the style as well as the labelling of data
+        fitModels (list): List of names of the scaling models to fit to the
+            run times and draw
 
     Returns:
         Nothing
     """
+    import matplotlib.pyplot as plt
+
     assert isinstance(timeData, dict)
 
     # Get the list of keys and sort them
@@ -125,11 +114,8 @@ def plot_time_data(timeData, number, handles=[], threads=False, labels=None,
     # Plot a set of expected lines
     if number == 0:
         lineStyles = ['k-', 'k--', 'k-.']
-        for cnt, expected in enumerate(expectedScaling):
-            label = get_label_name(expected)
-            idealFunc = max if isDecreasing(expected) else min
-            idealInit = idealFunc(yData)
-            idealHandle, = pltFunc(x, get_ideal_line(idealInit, sortedKeys, expected), lineStyles[cnt], label=label)
+        for cnt, (label, idealData) in enumerate(get_expected_lines(timeData, expectedScaling)):
+            idealHandle, = pltFunc(x, idealData, lineStyles[cnt], label=label)
             #idealHandle, = pltFunc(x, get_ideal_line(idealInit, sortedKeys, expectedScaling), 'k-', label="expected")
             handles.append(idealHandle)
 
@@ -141,6 +127,12 @@ def plot_time_data(timeData, number, handles=[], threads=False, labels=None,
         label = "actual"
     lineHandle, = pltFunc(x, yData, linestyle[number], label=label, linewidth=2)
     handles.append(lineHandle)
+    if fitModels:
+        for fitLabel, fitData in get_fitted_lines(sortedKeys, [yData], fitModels,
+                [label]):
+            fitHandle, = pltFunc(x, fitData, linestyle[number][0] + ':',
+                    label=fitLabel)
+            handles.append(fitHandle)
 
     # Set the legend, axes label and ticks
     plt.xticks(x, sortedKeys)
@@ -156,7 +148,16 @@ def plot_time_data(timeData, number, handles=[], threads=False, labels=None,
     #plt.gca().set_ylim(bottom=1e3, top=4e4)
 #### End of function plot_time_data
 
-if __name__ == "__main__":
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot the running" +
             " time of a series of applications stored as JSON format" +
             " Performance Report profiles. It is assumed that the series " +
@@ -175,21 +176,52 @@ if __name__ == "__main__":
     parser.add_argument("--expected", help="Indicates which scaling is expected" +
             " for the model. This should be one of ['constant', 'linear[i/d]'," +
             " 'quadratic[i/d]']. The i or d suffix indicates increasing or " +
-            "decreasing scale", choices=sorted(scalings.keys()), default=["lineard"], nargs="+")
+            "decreasing scale", choices=sorted(scalingDefs.keys()), default=["lineard"], nargs="+")
+    parser.add_argument("--fit", help="Scaling models to fit to the run times" +
+            " of each data set by least squares, drawn alongside them",
+            choices=modelNames, nargs="+", default=None)
     parser.add_argument("--nolog", help="Indicates that a log scale should not be used",
             action="store_true", default=False)
-
-    args = parser.parse_args()
-
+    add_emit_data_argument(parser)
+
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
+
+    if args.emitData:
+        # Write out the run times of each data set, and the expected scaling
+        # for the first data set
+        seriesList = []
+        for cnt, infile in enumerate(args.infiles):
+            timeData = read_time_data_from_files(infile.readlines(), args.threads,
+                    session.load)
+            sortedKeys = sorted(timeData.keys())
+            if cnt == 0:
+                seriesList.extend([(label, sortedKeys, idealData) for label, idealData
+                    in get_expected_lines(timeData, args.expected)])
+            label = args.labels[cnt] if args.labels else "actual"
+            seriesList.append((label, sortedKeys, [timeData[key] for key in sortedKeys]))
+            if args.fit:
+                seriesList.extend([(fitLabel, sortedKeys, fitData) for fitLabel,
+                    fitData in get_fitted_lines(sortedKeys, [seriesList[-1][2]],
+                        args.fit, [label])])
+        emit_plot_data(seriesList, args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
     # Read the list of files
     handles = []
     for cnt, infile in enumerate(args.infiles):
         fileList = infile.readlines()
         # Get the summary data from the files
-        timeData = read_time_data_from_files(fileList, args.threads)
+        timeData = read_time_data_from_files(fileList, args.threads, session.load)
         # Plot the summary data in a bar chart
         plot_time_data(timeData, cnt, handles, args.threads, args.labels, args.expected,
-                not args.nolog)
+                not args.nolog, args.fit)
 
     plt.legend(handles=handles, loc=1, bbox_to_anchor=(1.1, 1.1))
     plt.show()
+#### End of function main
+
+if __name__ == "__main__":
+    main()
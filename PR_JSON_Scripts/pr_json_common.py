@@ -13,8 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import os
 import sys
-sys.path.append('../JSON_Common')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
 import json_dict_common as jdc
 
 def get_overview_data(jsonDict):
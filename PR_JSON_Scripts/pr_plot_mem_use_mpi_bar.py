@@ -13,11 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import matplotlib.pyplot as plt
 import argparse
 import json
+import sys
 from pr_json_common import *
 from json_dict_common import *
+from plot_data_common import *
+from profile_session import ProfileSession
 
 def plot_metrics_as_bar(dataDict, labels, yLabel, threads=False):
     """
@@ -34,6 +36,8 @@ def plot_metrics_as_bar(dataDict, labels, yLabel, threads=False):
     Returns:
         Nothing
     """
+    import matplotlib.pyplot as plt
+
     # Get the xData
     xData = range(len(dataDict))
 
@@ -69,7 +73,7 @@ def plot_metrics_as_bar(dataDict, labels, yLabel, threads=False):
     plt.legend(handles=barHandles, loc=1, bbox_to_anchor=(1.1, 1.1))
 #### End of function plot_metrics_as_bar
 
-def get_mem_use_mpi_percent(fileList, threads=False):
+def get_mem_use_mpi_percent(fileList, threads=False, loadFunc=load_json_file):
     """
     Gets the percentage memory usage per core and the MPI usage reported in the
     files that are passed in. It is assumed that the files are JSON representations
@@ -79,6 +83,7 @@ def get_mem_use_mpi_percent(fileList, threads=False):
     Args:
         fileList (list): List of files from which to read JSON Performance Reports data
         threads (bool): Indicates whether the number of processes or number of threads should be read
+        loadFunc (function): Function used to read a profile given its file name
 
     Returns:
         Dictionary of the format {numProcs : [memUsage, MPIUsage]}
@@ -86,10 +91,8 @@ def get_mem_use_mpi_percent(fileList, threads=False):
     # Read in the list of files
     dataDict = {}
     for filename in fileList:
-        profileDict = {}
         # Read the json in from file
-        with open(filename, 'r') as f:
-            profileDict = json.load(f)
+        profileDict = loadFunc(filename)
         # Get the total memory per-node
         memPerNode = get_mem_per_node(profileDict)
         # Get the number of nodes
@@ -113,7 +116,7 @@ def get_mem_use_mpi_percent(fileList, threads=False):
     return dataDict
 #### End of function get_mem_use_mpi_percent
 
-def plot_mem_use_mpi_percent_as_bar(fileList, threads=False):
+def plot_mem_use_mpi_percent_as_bar(fileList, threads=False, loadFunc=load_json_file):
     """
     Plots the percentage memory usage per core next to the MPI usage reported
     in the files that are passed in. It is assumed that the files are JSON
@@ -123,17 +126,27 @@ def plot_mem_use_mpi_percent_as_bar(fileList, threads=False):
     Args:
         fileList (list): List of files from which to read JSON Performance Reports data
         threads (bool): Indicates whether the number of processes or number of threads should be read
+        loadFunc (function): Function used to read a profile given its file name
 
     Returns:
         Nothing
     """
-    dataDict = get_mem_use_mpi_percent(fileList, threads)
+    dataDict = get_mem_use_mpi_percent(fileList, threads, loadFunc)
 
     # Plot the metrics
     plot_metrics_as_bar(dataDict, ["Memory Use", "MPI Time"], "Proportion (%)", threads)
 #### End of function plot_mem_use_mpi_percent_as_bar
 
-if (__name__ == "__main__"):
+def main(argv=None, session=None):
+    """
+    Runs the script with the given command line arguments, reading profiles
+    through the given session
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+        session (ProfileSession): Session from which to read profiles. A new
+            session is created by default
+    """
     parser = argparse.ArgumentParser(description="Utility to plot a bar chart" +
             " of the percentage memory usage vs the percentage of time spent " +
             "in MPI calls in a program run.")
@@ -146,11 +159,26 @@ if (__name__ == "__main__"):
     parser.add_argument("--threads", help="Indicates whether threads or processes" +
             " should used in the scaling analysis", action="store_true",
             default=False)
+    add_emit_data_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if session is None:
+        session = ProfileSession()
 
     # Plot the memory usage and MPI percentage run time from the file passed in
     fileList = [line.strip() for line in args.infile.readlines()]
-    plot_mem_use_mpi_percent_as_bar(fileList, args.threads)
+    if args.emitData:
+        # Write out the memory usage and MPI percentage rather than plotting
+        dataDict = get_mem_use_mpi_percent(fileList, args.threads, session.load)
+        sortedKeys = sorted(dataDict.keys())
+        emit_plot_data([(label, sortedKeys, [dataDict[key][ind] for key in sortedKeys])
+            for ind, label in enumerate(["Memory Use", "MPI Time"])], args.emitData)
+        return
+
+    import matplotlib.pyplot as plt
+    plot_mem_use_mpi_percent_as_bar(fileList, args.threads, session.load)
     plt.show()
+#### End of function main
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+import importlib
+import os
+import sys
+
+scriptRoot = os.path.dirname(os.path.abspath(__file__))
+scriptDirs = ["JSON_Common", "MAP_JSON_Scripts", "PR_JSON_Scripts"]
+
+# Name of each subcommand, the module that implements it and a description.
+# Modules are only imported when their subcommand is run
+subcommands = [
+    ("show-keys", "show_json_keys", "Show the keys in a JSON file"),
+    ("show-value", "show_json_value", "Show the value of a field in a JSON file"),
+    ("show-metrics", "show_metric_names", "Show the metrics in a MAP profile"),
+    ("truncate", "truncate_json", "Truncate the samples in a MAP profile"),
+    ("decimate", "decimate_json",
+        "Combine consecutive samples in a MAP profile"),
+    ("merge", "merge_json",
+        "Merge the MAP profiles of a restarted run into one profile"),
+    ("phases", "detect_phases",
+        "Detect the phases of MAP profiles and truncate to the main phase"),
+    ("iterations", "detect_iterations",
+        "Detect the iteration period of MAP profiles and time each iteration"),
+    ("imbalance", "metric_imbalance",
+        "Rank the metrics and samples of MAP profiles by load imbalance"),
+    ("rank", "rank_metrics",
+        "Rank the metrics of a scaling series by growth, slope or variance"),
+    ("diff", "diff_profiles",
+        "Compare a MAP profile against a baseline with pass/fail thresholds"),
+    ("derive", "derived_metrics",
+        "Evaluate expressions over the metrics of MAP profiles"),
+    ("sample-csv", "generate_sample_csv", "Write the samples of a MAP profile as CSV"),
+    ("archive", "archive_profiles",
+        "Add MAP profiles to a compressed HDF5 archive"),
+    ("index", "index_json",
+        "Index the byte offsets of the sample arrays in MAP exports"),
+    ("pyramid", "metric_pyramid",
+        "Save min/max/mean pyramids of the metrics of MAP profiles"),
+    ("export-parquet", "export_parquet",
+        "Export the samples of MAP profiles to a Parquet or Arrow dataset"),
+    ("integrate", "integrate_rates",
+        "Integrate the rate metrics of MAP profiles and check their totals"),
+    ("resample", "resample_runs",
+        "A metric of several MAP profiles on a common time grid"),
+    ("plot-bar", "plot_map_bar", "Bar chart of a metric over a MAP scaling series"),
+    ("plot-min-max", "plot_map_min_max_bar",
+        "Min, mean and max of a metric over a MAP scaling series"),
+    ("plot-lustre", "plot_lustre_integrals",
+        "Approximate Lustre read and write integrals of a MAP profile"),
+    ("plot-metrics", "plot_mult_metrics_one_file",
+        "Several metrics from one MAP profile on the same axes"),
+    ("plot-metric-files", "plot_one_metric_mult_files",
+        "One metric from several MAP profiles on the same axes"),
+    ("plot-metric-axes", "plot_one_metric_mult_files_axes",
+        "One metric from several MAP profiles on separate axes"),
+    ("plot-single", "plot_single_metric", "Fields of one metric from a MAP profile"),
+    ("plot-timelines", "plot_timelines", "Activity timelines of a MAP profile"),
+    ("pr-bar", "plot_pr_bar", "Bar chart of Performance Reports metrics"),
+    ("pr-stacked-bar", "plot_pr_stacked_bar",
+        "Stacked CPU, MPI and I/O breakdown of Performance Reports"),
+    ("pr-components", "plot_scaling_components",
+        "Scaling of CPU, MPI and I/O time in Performance Reports"),
+    ("pr-overall-time", "plot_scaling_overall_time",
+        "Scaling of the run time in Performance Reports"),
+    ("pr-mem-mpi", "pr_plot_mem_use_mpi_bar",
+        "Memory use against MPI time in Performance Reports"),
+    ("watch", "watch_exports",
+        "Regenerate outputs as exports appear in a folder"),
+    ("history", "regression_history",
+        "Flag regressions over a time ordered history of runs"),
+    ("fit-scaling", "scaling_models",
+        "Fit Amdahl, Gustafson, power law and log models to a scaling series"),
+    ("hybrid", "hybrid_surface",
+        "Grid of the times of a sweep of MPI x OpenMP configurations"),
+    ]
+
+# Token used to separate the subcommands of a chain run in a single process
+chainSeparator = "+"
+
+def add_script_paths():
+    """
+    Adds the folders containing the scripts to the module search path
+
+    Returns:
+        Nothing
+    """
+    for scriptDir in scriptDirs:
+        scriptPath = os.path.join(scriptRoot, scriptDir)
+        if scriptPath not in sys.path:
+            sys.path.append(scriptPath)
+#### End of function add_script_paths
+
+def get_subcommand_module(name):
+    """
+    Imports the module implementing the given subcommand
+
+    Args:
+        name (str): Name of the subcommand
+
+    Returns:
+        The module implementing the subcommand, or None if there is no
+        subcommand with the given name
+    """
+    for subcommand, moduleName, _ in subcommands:
+        if subcommand == name:
+            add_script_paths()
+            return importlib.import_module(moduleName)
+    return None
+#### End of function get_subcommand_module
+
+def split_chain(argv):
+    """
+    Splits a list of arguments into the arguments of each subcommand in a
+    chain. Subcommands are separated by the chain separator
+
+    Args:
+        argv (list): List of command line arguments
+
+    Returns:
+        List of lists of arguments, where the first item of each is the name
+        of a subcommand
+    """
+    chain = [[]]
+    for arg in argv:
+        if arg == chainSeparator:
+            chain.append([])
+        else:
+            chain[-1].append(arg)
+    return [link for link in chain if len(link) > 0]
+#### End of function split_chain
+
+def get_subcommand_help():
+    helpStr = "subcommands:\n"
+    for subcommand, _, description in subcommands:
+        helpStr += "  " + subcommand.ljust(20) + description + "\n"
+    return helpStr
+#### End of function get_subcommand_help
+
+def main(argv=None):
+    """
+    Runs a subcommand, or a chain of subcommands, in a single process. The
+    subcommands share a profile session, so a profile written or read by one
+    subcommand is not read again by the next
+
+    Args:
+        argv (list): Command line arguments. Default is to use sys.argv
+
+    Returns:
+        The exit status of the last subcommand run. A chain stops at the first
+        subcommand which returns a non-zero status, e.g. 1 if a comparison
+        with diff fails, as the later subcommands may need its output
+    """
+    parser = argparse.ArgumentParser(prog="allinea-json",
+            description="Runs one of the analysis scripts for JSON exports of" +
+            " Arm MAP and Performance Reports profiles. Several subcommands" +
+            " can be run in a single process by separating them with '" +
+            chainSeparator + "', e.g. truncate in.json 10 50 " + chainSeparator +
+            " sample-csv in_trunc10-50.json",
+            epilog=get_subcommand_help(),
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memoryBudget", help="Maximum size in MB of profile" +
+            " data to keep loaded between subcommands. Default is no limit",
+            type=float, default=None)
+    parser.add_argument("subcommand", help="Name of the subcommand to run")
+    parser.add_argument("args", help="Arguments to the subcommand",
+            nargs=argparse.REMAINDER)
+
+    args = parser.parse_args(argv)
+
+    chain = split_chain([args.subcommand] + args.args)
+    # Check all of the subcommands before running any of them
+    modules = []
+    for link in chain:
+        module = get_subcommand_module(link[0])
+        if module is None:
+            parser.error("unknown subcommand '" + link[0] + "'")
+        modules.append(module)
+
+    from profile_session import ProfileSession
+    memoryBudget = None if args.memoryBudget is None else \
+            int(args.memoryBudget * 1024 * 1024)
+    session = ProfileSession(memoryBudget)
+    for module, link in zip(modules, chain):
+        status = module.main(link[1:], session) or 0
+        if status != 0:
+            if len(chain) > 1:
+                print(link[0] + " failed with status " + str(status) +
+                        ", stopping the chain", file=sys.stderr)
+            return status
+    return 0
+#### End of function main
+
+if __name__ == "__main__":
+    sys.exit(main())
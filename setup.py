@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from setuptools import setup
+
+setup(
+    name="allinea_json_analysis",
+    version="0.1",
+    description="Analysis scripts for JSON exports of Arm MAP and" +
+        " Performance Reports profiles",
+    license="Apache License 2.0",
+    py_modules=["allinea_json"],
+    packages=["JSON_Common", "MAP_JSON_Scripts", "PR_JSON_Scripts"],
+    install_requires=["numpy", "matplotlib"],
+    # Packages which are only imported by the subcommands that need them
+    extras_require={
+        "archive" : ["h5py"],
+        "parquet" : ["pyarrow"],
+        "stream" : ["ijson"],
+        "watch" : ["inotify_simple"],
+    },
+    entry_points={
+        "console_scripts" : ["allinea-json = allinea_json:main"],
+    },
+)
@@ -0,0 +1,52 @@
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "MAP_JSON_Scripts"))
+from periodicity import get_autocorrelation, find_period
+from detect_iterations import get_iteration_boundaries
+
+def make_signals(numSetup=600, period=200, numIter=7, seed=0):
+    """
+    Makes the compute and I/O signals of a run which reads its input and then
+    iterates, computing for the first half of each iteration
+    """
+    rng = np.random.default_rng(seed)
+    numSamples = numSetup + period * numIter
+    compute = np.full(numSamples, 10.)
+    compute[numSetup:] = np.where(np.arange(numSamples - numSetup) % period <
+            period // 2, 95., 20.)
+    io = np.zeros(numSamples)
+    io[:numSetup] = 90.
+    return np.array([compute, io]) + rng.normal(0., 1., (2, numSamples))
+#### End of function make_signals
+
+def test_period_with_set_up_phase():
+    acf = get_autocorrelation(make_signals())
+    # The I/O of the set up phase does not oscillate
+    assert find_period(acf[1])[0] is None
+    period, strength = find_period(acf[0])
+    assert abs(period - 200) < 2
+    assert strength > 0.3
+#### End of function test_period_with_set_up_phase
+
+def test_boundaries_after_set_up_phase():
+    boundaries = get_iteration_boundaries(make_signals()[0], 200.)
+    assert len(boundaries) >= 6
+    assert abs(boundaries[0] - 600) <= 2
+    assert np.all(np.abs(np.diff(boundaries) - 200) <= 2)
+#### End of function test_boundaries_after_set_up_phase
@@ -0,0 +1,78 @@
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "MAP_JSON_Scripts"))
+from detect_phases import detect_phases, select_main_phase, get_dominant_period
+
+activityNames = ["normal_compute", "collective_mpi", "io_reads", "io_writes"]
+
+def make_profile(numSetup, period, numIter, noise=1., seed=0):
+    """
+    Makes a profile which reads its input for numSetup samples and then
+    iterates, computing for the first half of each iteration and
+    communicating for the second half
+    """
+    rng = np.random.default_rng(seed)
+    numSamples = numSetup + period * numIter
+    activity = dict((name, np.zeros(numSamples)) for name in activityNames)
+    activity["io_reads"][:numSetup] = 90.
+    activity["normal_compute"][:numSetup] = 10.
+    inFirstHalf = (np.arange(numSamples - numSetup) % period) < period // 2
+    activity["normal_compute"][numSetup:] = np.where(inFirstHalf, 95., 20.)
+    activity["collective_mpi"][numSetup:] = np.where(inFirstHalf, 5., 80.)
+    for name in activityNames:
+        activity[name] = np.clip(activity[name] + (activity[name] > 0) *
+                rng.normal(0., noise, numSamples), 0., 100.)
+    return {"info" : {"runtime" : str(numSamples * 10),
+                "number_of_processes" : 4, "number_of_nodes" : 1},
+            "samples" : {"count" : numSamples,
+                "window_start_offsets" : [10. * ind for ind in range(numSamples)],
+                "metrics" : {},
+                "activity" : {"main_thread" : dict((name, values.tolist())
+                    for name, values in activity.items())}}}
+#### End of function make_profile
+
+@pytest.mark.parametrize("numSetup, period, seed", [(60, 20, 0), (45, 12, 1),
+    (80, 30, 2)])
+def test_periodic_body_is_one_phase(numSetup, period, seed):
+    profileDict = make_profile(numSetup, period, 7, seed=seed)
+    phases = detect_phases(profileDict)
+    assert len(phases) == 2
+    # The change of phase is found to within half a period
+    assert abs(phases[1][0] - numSetup) <= period // 2
+    mainPhase = select_main_phase(profileDict, phases)
+    assert mainPhase == phases[1]
+    assert mainPhase[1] == profileDict["samples"]["count"] - 1
+#### End of function test_periodic_body_is_one_phase
+
+def test_periodic_body_without_averaging_is_split():
+    profileDict = make_profile(60, 20, 7)
+    assert len(detect_phases(profileDict, period=0)) > 2
+#### End of function test_periodic_body_without_averaging_is_split
+
+def test_dominant_period():
+    rng = np.random.default_rng(3)
+    samples = np.arange(400)
+    signals = np.array([np.where(samples % 25 < 10, 4., -4.),
+        rng.normal(size=400)]) + rng.normal(size=(2, 400))
+    # A set up phase with a different level does not hide the period
+    signals[:, :100] += 20.
+    assert get_dominant_period(signals) == 25
+    assert get_dominant_period(rng.normal(size=(3, 400))) is None
+#### End of function test_dominant_period
@@ -0,0 +1,60 @@
+#    Copyright 2015-2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "JSON_Common"))
+from regression_history import detect_regressions, RegressionHistory
+
+def get_flags(step, numRuns=60, stepRun=40, noise=0.01, seed=0):
+    """
+    Gets the flags of a history of one value with relative noise, which
+    changes by a relative step from run stepRun onwards
+    """
+    rng = np.random.default_rng(seed)
+    values = 100. * (1. + noise * rng.normal(size=(numRuns, 1)))
+    values[stepRun:] += 100. * step
+    return detect_regressions(values[:0], values, np.zeros(1), np.zeros(1))
+#### End of function get_flags
+
+def test_cusum_flags_persistent_step():
+    # A 3 sigma step is under the threshold of the MAD test but above
+    # minChange, so the CUSUM flags it soon after the step
+    flags = get_flags(0.03)
+    assert any(flag[4] == "cusum" and flag[5] == "increase" and
+            40 <= flag[0] < 46 for flag in flags)
+    assert not any(flag[0] < 40 for flag in flags)
+#### End of function test_cusum_flags_persistent_step
+
+def test_identical_runs_are_not_flagged():
+    values = np.full((40, 2), 5.)
+    assert detect_regressions(values[:0], values, np.zeros(2),
+            np.zeros(2)) == []
+#### End of function test_identical_runs_are_not_flagged
+
+def test_older_run_is_only_inserted():
+    history = RegressionHistory()
+    history.add_runs([("b", 2., {"x" : 1.}), ("c", 3., {"x" : 2.})])
+    with pytest.raises(ValueError):
+        history.add_runs([("a", 1., {"x" : 3., "y" : 4.})])
+    assert [run["id"] for run in history.runs] == ["b", "c"]
+    history.insert_runs([("a", 1., {"x" : 3., "y" : 4.})])
+    assert [run["id"] for run in history.runs] == ["a", "b", "c"]
+    assert history.columns == ["x", "y"]
+    assert history.values[:, 0].tolist() == [3., 1., 2.]
+    assert np.isnan(history.values[1:, 1]).all()
+#### End of function test_older_run_is_only_inserted